@@ -0,0 +1,116 @@
+from typing import Annotated, Literal, Union
+import struct
+import time
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from models.tower import TARGETING_POLICIES
+
+TowerTypeName = Literal["basic", "sniper", "cannon", "aoe"]
+UpgradePath = Literal["damage", "range", "speed"]
+TargetingPolicy = Literal[TARGETING_POLICIES]
+Coordinate = Annotated[int, Field(ge=0, lt=256)]
+TowerId = Annotated[str, Field(min_length=1, max_length=64)]
+
+
+class ActionModel(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class PlaceTower(ActionModel):
+    action: Literal["place_tower"]
+    x: Coordinate
+    y: Coordinate
+    tower_type: TowerTypeName
+
+
+class UpgradeTower(ActionModel):
+    action: Literal["upgrade_tower"]
+    tower_id: TowerId
+    upgrade_path: UpgradePath = "damage"
+
+
+class SetTargeting(ActionModel):
+    action: Literal["set_targeting"]
+    tower_id: TowerId
+    targeting: TargetingPolicy = "first"
+
+
+class StartWave(ActionModel):
+    action: Literal["start_wave"]
+
+
+class GetState(ActionModel):
+    action: Literal["get_state"]
+
+
+Action = Annotated[Union[PlaceTower, UpgradeTower, SetTargeting, StartWave, GetState],
+                   Field(discriminator="action")]
+
+# Built once; parses and validates JSON in one pass without an intermediate dict
+ACTION_ADAPTER: TypeAdapter = TypeAdapter(Action)
+
+# Compact binary frames: one opcode byte, then the fields below; tower ids are
+# the UTF-8 remainder of the frame. Enumerations are sent as their index
+OPCODES = {"place_tower": 1, "upgrade_tower": 2, "set_targeting": 3, "start_wave": 4, "get_state": 5}
+ACTIONS_BY_OPCODE = {opcode: action for action, opcode in OPCODES.items()}
+TOWER_TYPES = TowerTypeName.__args__
+UPGRADE_PATHS = UpgradePath.__args__
+
+
+def decode_action(frame: Union[str, bytes]) -> Action:
+    """Validate a JSON text frame or compact binary frame; raises ValueError on bad input"""
+    if isinstance(frame, str):
+        return ACTION_ADAPTER.validate_json(frame)
+    return ACTION_ADAPTER.validate_python(_unpack(frame))
+
+
+def _unpack(frame: bytes) -> dict:
+    if not frame or frame[0] not in ACTIONS_BY_OPCODE:
+        raise ValueError("Unknown binary action")
+    action = ACTIONS_BY_OPCODE[frame[0]]
+    try:
+        if action == "place_tower":
+            x, y, tower_type = struct.unpack_from("<BBB", frame, 1)
+            return {"action": action, "x": x, "y": y, "tower_type": TOWER_TYPES[tower_type]}
+        if action == "upgrade_tower":
+            return {"action": action, "upgrade_path": UPGRADE_PATHS[frame[1]], "tower_id": frame[2:].decode("utf-8")}
+        if action == "set_targeting":
+            return {"action": action, "targeting": TARGETING_POLICIES[frame[1]], "tower_id": frame[2:].decode("utf-8")}
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed {action} frame") from e
+    return {"action": action}
+
+
+def encode_binary(message: dict) -> bytes:
+    """Pack an action dict into the compact binary form (for clients and load tests)"""
+    action = message["action"]
+    opcode = OPCODES[action]
+    if action == "place_tower":
+        return struct.pack("<BBBB", opcode, message["x"], message["y"], TOWER_TYPES.index(message["tower_type"]))
+    if action == "upgrade_tower":
+        path = UPGRADE_PATHS.index(message.get("upgrade_path", "damage"))
+        return struct.pack("<BB", opcode, path) + message["tower_id"].encode("utf-8")
+    if action == "set_targeting":
+        policy = TARGETING_POLICIES.index(message.get("targeting", "first"))
+        return struct.pack("<BB", opcode, policy) + message["tower_id"].encode("utf-8")
+    return bytes([opcode])
+
+
+class TokenBucket:
+    """Allows rate actions per second on average, with bursts of up to burst"""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def take(self, cost: float = 1.0) -> bool:
+        """Spend cost tokens if there are enough"""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
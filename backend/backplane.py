@@ -0,0 +1,330 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import secrets
+import struct
+
+logger = logging.getLogger(__name__)
+
+# (header, payload) -> None; the header holds the publisher's fields plus "channel"
+Handler = Callable[[Dict, str], Awaitable[None]]
+
+# Every node hears on this channel when another node leaves the backplane
+NODES_CHANNEL = "nodes"
+
+
+def room_channel(room_id: str) -> str:
+    """Frames the owner of a room publishes for the nodes relaying it"""
+    return f"rooms/{room_id}"
+
+
+def node_channel(node_id: str) -> str:
+    """Messages for connections on one node"""
+    return f"nodes/{node_id}"
+
+
+class Backplane(ABC):
+    """
+    Pub/sub between server processes, plus the directory of which node owns each room
+    A room is hosted by the first node to claim it; the others relay its
+    frames to their own sockets. Messages on a channel arrive in the order
+    they were published, and a handler runs to completion before the next one
+    """
+
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id or secrets.token_hex(4)
+
+    async def start(self):
+        """Connect to the other nodes"""
+
+    async def stop(self):
+        """Leave the backplane; the other nodes drop this node's rooms and connections"""
+
+    @abstractmethod
+    async def publish(self, channel: str, header: Dict, payload: str = ""):
+        """Send a message to every node subscribed to channel"""
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: Handler):
+        """Run handler for every message on channel; replaces this node's previous handler"""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        """Stop receiving messages on channel"""
+
+    @abstractmethod
+    async def claim(self, room_id: str) -> str:
+        """Become the owner of room_id unless it has one; returns the owner's node id"""
+
+    @abstractmethod
+    async def release(self, room_id: str):
+        """Give up ownership of room_id, if this node has it"""
+
+
+class MemoryHub:
+    """Subscriptions and room directory shared by the MemoryBackplanes of one process"""
+
+    def __init__(self):
+        self.owners: Dict[str, str] = {}
+        self.subscribers: Dict[str, Dict[str, Handler]] = {}
+
+
+class MemoryBackplane(Backplane):
+    """
+    In-process backplane, for tests and for several RoomManagers in one process
+    Handlers run in the publisher's task, in subscription order
+    """
+
+    def __init__(self, hub: Optional[MemoryHub] = None, node_id: Optional[str] = None):
+        super().__init__(node_id)
+        self.hub = hub or MemoryHub()
+
+    async def stop(self):
+        for subscribers in self.hub.subscribers.values():
+            subscribers.pop(self.node_id, None)
+        for room_id in [room_id for room_id, owner in self.hub.owners.items() if owner == self.node_id]:
+            del self.hub.owners[room_id]
+        await self.publish(NODES_CHANNEL, {"kind": "node_lost", "node": self.node_id})
+
+    async def publish(self, channel: str, header: Dict, payload: str = ""):
+        header = {**header, "channel": channel}
+        for node_id, handler in list(self.hub.subscribers.get(channel, {}).items()):
+            try:
+                await handler(header, payload)
+            except Exception as e:
+                logger.error(f"Error handling {channel} message on node {node_id}: {e}")
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self.hub.subscribers.setdefault(channel, {})[self.node_id] = handler
+
+    async def unsubscribe(self, channel: str):
+        subscribers = self.hub.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.pop(self.node_id, None)
+            if not subscribers:
+                del self.hub.subscribers[channel]
+
+    async def claim(self, room_id: str) -> str:
+        return self.hub.owners.setdefault(room_id, self.node_id)
+
+    async def release(self, room_id: str):
+        if self.hub.owners.get(room_id) == self.node_id:
+            del self.hub.owners[room_id]
+
+
+# Wire format of the Unix socket backplane: header and payload lengths, then
+# the JSON header (its "op" says what the message is) and the UTF-8 payload
+FRAME_HEADER = struct.Struct("<II")
+
+
+def pack_message(header: Dict, payload: str = "") -> bytes:
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    payload_bytes = payload.encode("utf-8")
+    return FRAME_HEADER.pack(len(header_bytes), len(payload_bytes)) + header_bytes + payload_bytes
+
+
+async def read_message(reader: asyncio.StreamReader) -> Tuple[Dict, bytes, bytes]:
+    """(header, raw message, payload bytes); raises IncompleteReadError once the peer is gone"""
+    prefix = await reader.readexactly(FRAME_HEADER.size)
+    header_size, payload_size = FRAME_HEADER.unpack(prefix)
+    body = await reader.readexactly(header_size + payload_size)
+    return json.loads(body[:header_size]), prefix + body, body[header_size:]
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Client of a BackplaneBroker listening on a Unix socket
+    Requests that expect an answer (claim) are answered in order, so the
+    pending futures are kept in a queue. The reader task only resolves those
+    and queues messages; handlers run one at a time on a separate task, so a
+    handler waiting for a room that is being claimed never holds up the reply
+    """
+
+    def __init__(self, path: str, node_id: Optional[str] = None):
+        super().__init__(node_id)
+        self.path = path
+        self.handlers: Dict[str, Handler] = {}
+        self._replies: Deque[asyncio.Future] = deque()
+        self._messages: "asyncio.Queue[Tuple[Dict, bytes]]" = asyncio.Queue()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._tasks = [asyncio.create_task(self._read_loop(reader)), asyncio.create_task(self._dispatch_loop())]
+        await self._send({"op": "hello", "node": self.node_id})
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+    async def publish(self, channel: str, header: Dict, payload: str = ""):
+        await self._send({**header, "op": "pub", "channel": channel}, payload)
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel] = handler
+        await self._send({"op": "sub", "channel": channel})
+
+    async def unsubscribe(self, channel: str):
+        if self.handlers.pop(channel, None) is not None:
+            await self._send({"op": "unsub", "channel": channel})
+
+    async def claim(self, room_id: str) -> str:
+        reply = asyncio.get_running_loop().create_future()
+        self._replies.append(reply)
+        try:
+            await self._send({"op": "claim", "room": room_id})
+        except ConnectionError:
+            self._replies.remove(reply)
+            raise
+        return await reply
+
+    async def release(self, room_id: str):
+        await self._send({"op": "release", "room": room_id})
+
+    async def _send(self, header: Dict, payload: str = ""):
+        if self._writer is None:
+            raise ConnectionError("Backplane is not connected")
+        self._writer.write(pack_message(header, payload))
+        await self._writer.drain()
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                header, _, payload = await read_message(reader)
+                if header["op"] != "reply":
+                    self._messages.put_nowait((header, payload))
+                    continue
+                reply = self._replies.popleft()
+                if not reply.done():  # The claim may have been cancelled meanwhile
+                    reply.set_result(header["owner"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.IncompleteReadError):
+                logger.error("Lost the connection to the backplane broker")
+            else:
+                logger.error(f"Error reading from the backplane broker: {e}")
+            # Later requests fail at once instead of waiting for a reply that cannot come
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for reply in self._replies:
+                if not reply.done():
+                    reply.set_exception(ConnectionError("Backplane broker is gone"))
+            self._replies.clear()
+
+    async def _dispatch_loop(self):
+        while True:
+            header, payload = await self._messages.get()
+            handler = self.handlers.get(header.get("channel"))
+            if handler is None:
+                continue
+            try:
+                await handler(header, payload.decode("utf-8"))
+            except Exception as e:
+                logger.error(f"Error handling {header.get('channel')} message: {e}")
+
+
+class BackplaneBroker:
+    """
+    Routes messages between the UnixSocketBackplanes of one host
+    Published messages are forwarded byte for byte to every subscriber, so a
+    frame is serialized once however many nodes relay it. A node that lets
+    more than max_buffer bytes pile up unread is disconnected rather than
+    buffered without limit. When a node disconnects, its rooms become free
+    to claim and the others are told
+    """
+
+    def __init__(self, path: str, max_buffer: int = 16 * 1024 * 1024):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.owners: Dict[str, str] = {}
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        logger.info(f"Backplane broker listening on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        node_id = None
+        try:
+            while True:
+                header, raw, _ = await read_message(reader)
+                op = header["op"]
+                if op == "pub":
+                    for subscriber in list(self.subscribers.get(header["channel"], ())):
+                        self._deliver(subscriber, raw)
+                elif op == "sub":
+                    self.subscribers.setdefault(header["channel"], set()).add(writer)
+                elif op == "unsub":
+                    self.subscribers.get(header["channel"], set()).discard(writer)
+                elif op == "claim":
+                    owner = self.owners.setdefault(header["room"], node_id)
+                    writer.write(pack_message({"op": "reply", "owner": owner}))
+                elif op == "release":
+                    if self.owners.get(header["room"]) == node_id:
+                        del self.owners[header["room"]]
+                elif op == "hello":
+                    node_id = header["node"]
+                    logger.info(f"Node {node_id} joined the backplane")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+            if node_id is not None:
+                self.owners = {room_id: owner for room_id, owner in self.owners.items() if owner != node_id}
+                lost = pack_message({"op": "pub", "channel": NODES_CHANNEL, "kind": "node_lost", "node": node_id})
+                for subscriber in list(self.subscribers.get(NODES_CHANNEL, ())):
+                    self._deliver(subscriber, lost)
+                logger.info(f"Node {node_id} left the backplane")
+
+    def _deliver(self, subscriber: asyncio.StreamWriter, raw: bytes):
+        """Queue a message for a subscriber, dropping the subscriber if it stopped reading"""
+        if subscriber.transport.get_write_buffer_size() > self.max_buffer:
+            logger.error(f"Disconnecting a node that fell {self.max_buffer} bytes behind")
+            for subscribers in self.subscribers.values():
+                subscribers.discard(subscriber)
+            subscriber.transport.abort()
+            return
+        subscriber.write(raw)
+
+
+async def serve(path: str):
+    broker = BackplaneBroker(path)
+    await broker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backplane broker for several servers on one host")
+    parser.add_argument("path", help="Unix socket path the servers connect to (TD_BACKPLANE)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.path))
@@ -0,0 +1,103 @@
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
+
+# Top-level state keys holding entity maps keyed by id
+ENTITY_KEYS = ("players", "towers", "enemies")
+
+
+def diff_entities(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict:
+    """Upserts (new entities whole, changed ones as their changed fields) and removed ids"""
+    upsert: Dict[str, Dict] = {}
+    for entity_id, entity in new.items():
+        before = old.get(entity_id)
+        if before is None:
+            upsert[entity_id] = entity
+        elif before != entity:
+            upsert[entity_id] = {key: value for key, value in entity.items() if before.get(key) != value}
+
+    removed: List[str] = [entity_id for entity_id in old if entity_id not in new]
+
+    diff: Dict = {}
+    if upsert:
+        diff["upsert"] = upsert
+    if removed:
+        diff["remove"] = removed
+    return diff
+
+
+def diff_state(old: Dict, new: Dict) -> Dict:
+    """Changed top-level values plus per-entity diffs between two Game.to_dict() states"""
+    changes: Dict = {}
+    entities: Dict = {}
+    for key, value in new.items():
+        if key in ENTITY_KEYS:
+            diff = diff_entities(old.get(key, {}), value)
+            if diff:
+                entities[key] = diff
+        elif old.get(key) != value:
+            changes[key] = value
+    return {"changes": changes, "entities": entities}
+
+
+class DeltaEncoder:
+    """
+    Turns the successive states sent to a room's players into deltas
+    The base is the last state every player holds; deltas name it by tick so
+    clients can tell when they are out of sync. A full keyframe goes out
+    periodically so a client never stays out of sync for long
+    """
+
+    def __init__(self, keyframe_every: int = 50):
+        self.keyframe_every = keyframe_every
+        self.base: Optional[Dict] = None
+        self.since_keyframe = 0
+
+    def reset(self, state: Dict):
+        """All players were just sent this full state"""
+        self.base = state
+        self.since_keyframe = 0
+
+    def encode(self, state: Dict) -> Optional[Dict]:
+        """Delta from the previous state, or None when a full keyframe is due"""
+        base = self.base
+        self.base = state
+        if base is None or self.since_keyframe >= self.keyframe_every:
+            self.since_keyframe = 0
+            return None
+
+        self.since_keyframe += 1
+        return {"base_tick": base.get("tick"), **diff_state(base, state)}
+
+
+class FrameHistory:
+    """
+    Ring buffer of the last frames broadcast to a room's players
+    Each frame keeps the tick its delta applies to (None for a full state)
+    and the tick it brings clients to, so a reconnecting client that reports
+    the last tick it holds can be sent just the frames it missed
+    """
+
+    def __init__(self, size: int = 150):
+        self.frames: Deque[Tuple[int, Optional[int], int, str]] = deque(maxlen=size)  # (seq, base tick, tick, text)
+        self.seq = 0
+
+    def append(self, base_tick: Optional[int], tick: int, text: str):
+        self.seq += 1
+        self.frames.append((self.seq, base_tick, tick, text))
+
+    def since(self, tick: int) -> Optional[List[Tuple[int, str]]]:
+        """(seq, text) of the frames a client holding the state of tick needs; None if they are gone"""
+        for i, (_, base_tick, frame_tick, _) in enumerate(self.frames):
+            if base_tick == tick or (base_tick is None and frame_tick >= tick):
+                return [(seq, text) for seq, _, _, text in list(self.frames)[i:]]
+        if self.frames and self.frames[-1][2] == tick:
+            return []
+        return None
+
+    def after(self, seq: int) -> Optional[List[Tuple[int, str]]]:
+        """(seq, text) of the frames appended after seq; None if some of them are gone"""
+        if not self.frames or self.frames[-1][0] == seq:
+            return []
+        if self.frames[0][0] > seq + 1:
+            return None
+        return [(frame_seq, text) for frame_seq, _, _, text in self.frames if frame_seq > seq]
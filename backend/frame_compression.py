@@ -0,0 +1,206 @@
+"""
+Compression of the frames sent to clients.
+
+Two options, chosen per connection:
+- permessage-deflate, negotiated by the WebSocket handshake. With context
+  takeover each frame compresses against the previous ones on the same
+  socket, which suits the repeated keys of game frames, but it costs one
+  compression per socket and message and a compressor per connection.
+  deflate_protocol() tunes it; run the server with `python main.py` to use it.
+- zstd with a dictionary trained on game frames, asked for by the client with
+  ?compression=zstd&dictionary=<id>. Frames are compressed on their own, so
+  each broadcast is compressed once per room and the same bytes go to every
+  socket. Needs the optional zstandard package (the zstd extra).
+
+Train a dictionary from headless matches (and see how it does):
+    python frame_compression.py -o frames.dict --matches 20 --waves 8
+"""
+import argparse
+import time
+import weakref
+import zlib
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from metrics import CompressionStats
+
+try:
+    import zstandard
+except ImportError:  # Optional; zstd is then not offered
+    zstandard = None
+
+try:
+    from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+    from websockets.frames import DATA_OPCODES
+except ImportError:  # Older uvicorn; its own deflate settings apply
+    WebSocketsSansIOProtocol = None
+
+# Compressed frames a room keeps, so a frame sent to many sockets is compressed once
+RECENT_FRAMES = 4
+
+
+class ZstdCodec:
+    """
+    zstd with an optional trained dictionary, shared by every room
+    Each frame is compressed on its own, without context from the ones before,
+    so one compressed frame can go to every socket of a room that asked for
+    zstd. Rooms remember their last few frames by identity: a broadcast hands
+    the same string to all its sockets and is compressed only for the first
+    """
+
+    def __init__(self, stats: CompressionStats, dictionary: Optional[bytes] = None, level: int = 3):
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        self.stats = stats
+        self.dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self.dictionary_id = self.dictionary.dict_id() if self.dictionary is not None else 0
+        self._compressor = zstandard.ZstdCompressor(level=level, dict_data=self.dictionary)
+        self._recent: "weakref.WeakKeyDictionary[object, Deque[Tuple[str, bytes]]]" = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def load(cls, stats: CompressionStats, path: Optional[str] = None, level: int = 3) -> "ZstdCodec":
+        """A codec with the dictionary stored at path, or without one"""
+        dictionary = None
+        if path:
+            with open(path, "rb") as f:
+                dictionary = f.read()
+        return cls(stats, dictionary, level)
+
+    def accepts(self, dictionary_id: int) -> bool:
+        """Whether a client holding this dictionary can read our frames"""
+        return dictionary_id == self.dictionary_id
+
+    def compress(self, room: object, text: str) -> bytes:
+        recent = self._recent.get(room)
+        if recent is None:
+            recent = self._recent[room] = deque(maxlen=RECENT_FRAMES)
+        for seen, data in recent:
+            if seen is text:
+                return data
+        raw = text.encode("utf-8")
+        start = time.thread_time()
+        data = self._compressor.compress(raw)
+        self.stats.record(len(raw), len(data), time.thread_time() - start)
+        recent.append((text, data))
+        return data
+
+    def wrap(self, websocket, room: object) -> "ZstdSocket":
+        return ZstdSocket(websocket, self, room)
+
+
+class ZstdSocket:
+    """A client's WebSocket that gets every message as a zstd compressed binary frame"""
+
+    def __init__(self, websocket, codec: ZstdCodec, room: object):
+        self.websocket = websocket
+        self.codec = codec
+        self.room = room
+
+    async def send_text(self, text: str):
+        await self.websocket.send_bytes(self.codec.compress(self.room, text))
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
+
+
+def deflate_protocol(stats: CompressionStats, window_bits: int = 15, mem_level: int = 8, level: int = 6):
+    """
+    uvicorn WebSocket protocol class offering permessage-deflate with these
+    settings and context takeover, recording what it compresses into stats.
+    A connection's compressor takes about 2 ** (window_bits + 2) + 2 ** (mem_level + 9)
+    bytes; uvicorn's own defaults are 12 and 5. None if this uvicorn cannot be tuned
+    """
+    if WebSocketsSansIOProtocol is None:
+        return None
+
+    class TimedDeflateFactory(ServerPerMessageDeflateFactory):
+        def process_request_params(self, params, accepted_extensions):
+            response_params, extension = super().process_request_params(params, accepted_extensions)
+            encode = extension.encode
+
+            def timed_encode(frame):
+                if frame.opcode not in DATA_OPCODES:
+                    return encode(frame)
+                start = time.thread_time()
+                encoded = encode(frame)
+                stats.record(len(frame.data), len(encoded.data), time.thread_time() - start)
+                return encoded
+
+            extension.encode = timed_encode
+            return response_params, extension
+
+    factory = TimedDeflateFactory(server_max_window_bits=window_bits,
+                                  compress_settings={"memLevel": mem_level, "level": level})
+
+    class DeflateProtocol(WebSocketsSansIOProtocol):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # uvicorn keeps the websockets connection internal; where it looks
+            # different, the connection keeps uvicorn's own deflate settings
+            conn = getattr(self, "conn", None)
+            if self.config.ws_per_message_deflate and hasattr(conn, "available_extensions"):
+                conn.available_extensions = [factory]
+
+    return DeflateProtocol
+
+
+def sample_frames(matches: int, waves: int, first_seed: int = 0) -> List[bytes]:
+    """Encoded player frames (keyframes and deltas) of headless matches, as they would be broadcast"""
+    from delta import DeltaEncoder
+    from models.game import Game
+    from rooms import encode
+    from simulate import SimulationClock, play_match
+
+    frames = []
+    for seed in range(first_seed, first_seed + matches):
+        game = Game(seed=seed, clock=SimulationClock())
+        deltas = DeltaEncoder()
+        for ticks, _ in enumerate(play_match(game, ["basic", "sniper", "cannon", "aoe"]), 1):
+            if ticks % 2 == 0:
+                full = game.to_dict()
+                game.attack_log.reset()
+                delta = deltas.encode(full)
+                if delta is None:
+                    message = {"type": "game_update", "server_time": game.clock.now, "state": full}
+                else:
+                    message = {"type": "game_delta", "server_time": game.clock.now, **delta}
+                frames.append(encode(message).encode("utf-8"))
+            if game.current_wave > waves:
+                break
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary for game frames")
+    parser.add_argument("-o", "--output", default="frames.dict", help="dictionary file (TD_ZSTD_DICT)")
+    parser.add_argument("--matches", type=int, default=20, help="headless matches to sample frames from")
+    parser.add_argument("--waves", type=int, default=8, help="waves per match")
+    parser.add_argument("--size", type=int, default=16384, help="dictionary size in bytes")
+    parser.add_argument("--level", type=int, default=3, help="zstd level to evaluate with")
+    args = parser.parse_args()
+    if zstandard is None:
+        raise SystemExit("Training a dictionary needs the zstandard package")
+
+    samples = sample_frames(args.matches, args.waves)
+    held_out = sample_frames(max(1, args.matches // 4), args.waves, first_seed=args.matches)
+    dictionary = zstandard.train_dictionary(args.size, samples)
+    with open(args.output, "wb") as f:
+        f.write(dictionary.as_bytes())
+    print(f"Trained dictionary {dictionary.dict_id()} ({args.size} bytes) on {len(samples)} frames: {args.output}")
+
+    # How held-out frames fare, each compressed on its own as zstd frames are
+    raw = sum(len(frame) for frame in held_out)
+    plain = zstandard.ZstdCompressor(level=args.level)
+    trained = zstandard.ZstdCompressor(level=args.level, dict_data=dictionary)
+    for name, compress in (("zlib", lambda frame: zlib.compress(frame, 6)),
+                           ("zstd", plain.compress),
+                           ("zstd + dictionary", trained.compress)):
+        start = time.perf_counter()
+        size = sum(len(compress(frame)) for frame in held_out)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>18}: ratio {raw / size:5.2f}, {elapsed / len(held_out) * 1e6:6.1f} us per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import asyncio
+import logging
+import secrets
+from typing import Deque, Dict, Iterable, Optional, Tuple
+from models.game import Game
+
+logger = logging.getLogger(__name__)
+
+OptionsKey = Tuple[Tuple[str, object], ...]
+
+
+def build_game(options: Dict) -> Game:
+    """A new Game with its own map seed, paused until a room takes it"""
+    game = Game(**{"seed": secrets.randbits(32), **options})
+    game.pause()
+    return game
+
+
+class GamePool:
+    """
+    Games generated ahead of time, off the event loop
+    Keeps size idle games ready for every option set in warm, refilled by a
+    background task on a worker thread. take() pops a ready game, or builds
+    one on the worker when a burst of joins emptied the pool, so creating a
+    room never generates a map on the event loop. Games wait paused, so their
+    clocks start when a room resumes them
+    """
+
+    def __init__(self, size: int = 4, warm: Iterable[Dict] = ({},)):
+        self.size = size
+        self.warm = [dict(options) for options in warm]
+        self.ready: Dict[OptionsKey, Deque[Game]] = {self._key(options): deque() for options in self.warm}
+        self.hits = 0
+        self.misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="game-pool")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(games) for games in self.ready.values())
+
+    @staticmethod
+    def _key(options: Dict) -> OptionsKey:
+        return tuple(sorted(options.items()))
+
+    async def start(self):
+        """Start filling the pool in the background"""
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task = asyncio.create_task(self._fill_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+    async def take(self, **options) -> Game:
+        """A game for these options: a ready one if the pool has it, otherwise built on the worker"""
+        games = self.ready.get(self._key(options))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if games:
+            self.hits += 1
+            return games.popleft()
+        self.misses += 1
+        return await self._build(options)
+
+    def to_dict(self) -> Dict:
+        return {"ready": len(self), "hits": self.hits, "misses": self.misses}
+
+    async def _build(self, options: Dict) -> Game:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, build_game, options)
+
+    async def _fill_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # One game at a time, round robin, so every option set refills evenly
+            while True:
+                missing = [options for options in self.warm if len(self.ready[self._key(options)]) < self.size]
+                if not missing:
+                    break
+                for options in missing:
+                    try:
+                        game = await self._build(options)
+                    except Exception as e:
+                        logger.error(f"Error pre-generating a game with {options}: {e}")
+                        await asyncio.sleep(1)
+                        continue
+                    self.ready[self._key(options)].append(game)
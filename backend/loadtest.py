@@ -0,0 +1,297 @@
+"""
+Load-testing harness with simulated WebSocket clients.
+
+Ramps simulated players against /ws/{player_id} in steps, and per step reports
+message latency, bytes per client per second and the server's own tick timing
+(from /api/metrics), flagging the first step where the server saturates.
+Runs entirely offline against a local uvicorn, optionally started for you.
+
+Usage:
+    python loadtest.py --spawn-server --steps 50,100,250,500,1000 --step-duration 20 --processes 4
+
+With --compression zstd clients ask for zstd frames with the server's
+dictionary, and KB/s counts the compressed bytes; permessage-deflate
+(the default) is undone by the WebSocket layer, so compare its effect
+through the server's compression counters printed at the end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from websockets.asyncio.client import connect
+
+from actions import encode_binary
+from frame_compression import zstandard
+
+TOWER_TYPES = ["basic", "sniper", "cannon", "aoe"]
+MAX_LATENCY_SAMPLES = 20000  # Per worker per step
+
+# Frames start with {"type":...,"server_time":...}; reading it from the prefix
+# keeps the load generator from spending its CPU decoding full game states
+SERVER_TIME_RE = re.compile(r'"server_time":([0-9.]+)')
+
+
+class StepStats:
+    """Client-side counters for one ramp step"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.failed = 0  # Clients that could not connect or lost their connection during the step
+        self.latencies: List[float] = []
+
+    def record(self, raw, now: float, text: Optional[str] = None):
+        """Count a received frame; text is its decompressed content when raw is compressed"""
+        self.messages += 1
+        self.bytes += len(raw)
+        if text is not None:
+            head = text[:96]
+        else:
+            head = raw[:96] if isinstance(raw, str) else raw[:96].decode("utf-8", "ignore")
+        match = SERVER_TIME_RE.search(head)
+        if match and len(self.latencies) < MAX_LATENCY_SAMPLES:
+            self.latencies.append(now - float(match.group(1)))
+
+
+class LoadWorker:
+    """Runs a share of the simulated clients in one process"""
+
+    def __init__(self, url: str, worker_id: int, action_interval: float, wave_interval: float,
+                 binary: bool = False, compression: str = "deflate", dictionary: Optional[bytes] = None,
+                 dictionary_id: int = 0):
+        self.url = url
+        self.worker_id = worker_id
+        self.action_interval = action_interval
+        self.wave_interval = wave_interval
+        self.encode = encode_binary if binary else json.dumps  # Action frame format
+        self.compression = compression
+        self.query = f"?compression=zstd&dictionary={dictionary_id}" if compression == "zstd" else ""
+        self.decompressor = None
+        if compression == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        self.current: StepStats = StepStats()
+        self.connected = 0
+        self.stop = asyncio.Event()
+
+    async def client(self, client_id: str, rng: random.Random, start_game: bool = False):
+        try:
+            async with connect(f"{self.url}/ws/{client_id}{self.query}", max_size=None, open_timeout=30,
+                               compression="deflate" if self.compression == "deflate" else None) as ws:
+                self.connected += 1
+                if start_game:
+                    await ws.send(self.encode({"action": "start_wave"}))
+                sender = asyncio.create_task(self.act(ws, rng))
+                try:
+                    async for raw in ws:
+                        text = None
+                        if isinstance(raw, bytes) and self.decompressor is not None:
+                            text = self.decompressor.decompress(raw).decode("utf-8")
+                        self.current.record(raw, time.time(), text)
+                        if self.stop.is_set():
+                            break
+                finally:
+                    sender.cancel()
+                    self.connected -= 1
+        except Exception:
+            self.current.failed += 1
+
+    async def act(self, ws, rng: random.Random):
+        """Place towers at random and occasionally start a wave"""
+        last_wave = time.monotonic()
+        while not self.stop.is_set():
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * self.action_interval)
+            if time.monotonic() - last_wave >= self.wave_interval and rng.random() < 0.1:
+                await ws.send(self.encode({"action": "start_wave"}))
+                last_wave = time.monotonic()
+            else:
+                await ws.send(self.encode({
+                    "action": "place_tower",
+                    "x": rng.randrange(20),
+                    "y": rng.randrange(20),
+                    "tower_type": rng.choice(TOWER_TYPES)
+                }))
+
+    async def run(self, targets: List[int], step_duration: float, start_at: float) -> List[Dict]:
+        rng = random.Random(self.worker_id)
+        clients = []
+        results = []
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+
+        for step, target in enumerate(targets):
+            step_start = start_at + step * step_duration
+            while len(clients) < target:
+                client_id = f"load-{self.worker_id}-{len(clients)}"
+                start_game = self.worker_id == 0 and not clients
+                clients.append(asyncio.create_task(
+                    self.client(client_id, random.Random(rng.random()), start_game)))
+            self.current = StepStats()
+            await asyncio.sleep(max(0.0, step_start + step_duration - time.time()))
+            stats = self.current
+            results.append({
+                "connected": self.connected,
+                "failed": stats.failed,
+                "messages": stats.messages,
+                "bytes": stats.bytes,
+                "latencies": stats.latencies
+            })
+
+        self.stop.set()
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        return results
+
+
+def run_worker(job) -> List[Dict]:
+    (url, worker_id, targets, step_duration, start_at, action_interval, wave_interval, binary,
+     compression, dictionary, dictionary_id) = job
+    worker = LoadWorker(url, worker_id, action_interval, wave_interval, binary,
+                        compression, dictionary, dictionary_id)
+    return asyncio.run(worker.run(targets, step_duration, start_at))
+
+
+def fetch_metrics(http_url: str, window: int) -> Dict:
+    with urllib.request.urlopen(f"{http_url}/api/metrics?window={window}", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def fetch_dictionary(http_url: str) -> tuple:
+    """(dictionary bytes or None, dictionary id) the server compresses zstd frames with"""
+    with urllib.request.urlopen(f"{http_url}/api/compression", timeout=10) as response:
+        zstd = json.loads(response.read())["zstd"]
+    if zstd is None:
+        raise SystemExit("The server does not offer zstd (is zstandard installed there?)")
+    if not zstd["dictionary_id"]:
+        return None, 0
+    with urllib.request.urlopen(f"{http_url}/api/compression/dictionary", timeout=10) as response:
+        return response.read(), zstd["dictionary_id"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Start a local uvicorn with a throwaway database and wait until it answers"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, TD_DB_PATH=os.path.join(workdir, "loadtest.db"),
+               TD_HOST="127.0.0.1", TD_PORT=str(port))
+    log_path = os.path.join(workdir, "server.log")
+    print(f"Server log: {log_path}")
+    # Started through main.py so the server runs with its tuned permessage-deflate
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=backend_dir, env=env, stdout=open(log_path, "w"), stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            fetch_metrics(f"http://127.0.0.1:{port}", 1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("Server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the tower defense WebSocket server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--spawn-server", action="store_true", help="start a local uvicorn for the test")
+    parser.add_argument("--steps", default="10,50,100,250,500", help="comma separated total client counts")
+    parser.add_argument("--step-duration", type=float, default=15.0, help="seconds per step")
+    parser.add_argument("--processes", type=int, default=1, help="load generator processes")
+    parser.add_argument("--action-interval", type=float, default=5.0, help="mean seconds between client actions")
+    parser.add_argument("--wave-interval", type=float, default=30.0, help="minimum seconds between a client's start_wave")
+    parser.add_argument("--binary", action="store_true", help="send actions as compact binary frames")
+    parser.add_argument("--compression", choices=["deflate", "zstd", "none"], default="deflate",
+                        help="frame compression the clients ask for")
+    parser.add_argument("--latency-budget", type=float, default=0.25, help="p95 message latency that counts as saturated")
+    args = parser.parse_args()
+
+    steps = [int(n) for n in args.steps.split(",")]
+    http_url = f"http://{args.host}:{args.port}"
+    ws_url = f"ws://{args.host}:{args.port}"
+    if args.compression == "zstd" and zstandard is None:
+        raise SystemExit("--compression zstd needs the zstandard package")
+    server = spawn_server(args.port) if args.spawn_server else None
+
+    try:
+        baseline = fetch_metrics(http_url, 1)
+        dictionary, dictionary_id = fetch_dictionary(http_url) if args.compression == "zstd" else (None, 0)
+        tick_interval = baseline["tick_interval"]
+        window = int(args.step_duration / tick_interval)
+
+        start_at = time.time() + 1.0
+        jobs = []
+        for worker_id in range(args.processes):
+            targets = [n // args.processes + (1 if worker_id < n % args.processes else 0) for n in steps]
+            jobs.append((ws_url, worker_id, targets, args.step_duration, start_at,
+                         args.action_interval, args.wave_interval, args.binary,
+                         args.compression, dictionary, dictionary_id))
+
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [pool.submit(run_worker, job) for job in jobs]
+            server_steps = []
+            for step in range(len(steps)):
+                time.sleep(max(0.0, start_at + (step + 1) * args.step_duration - time.time()))
+                server_steps.append(fetch_metrics(http_url, window))
+            worker_results = [f.result() for f in futures]
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(f"{'clients':>7} {'conn':>5} {'fail':>4} {'msg/s/cl':>8} {'KB/s/cl':>8} "
+          f"{'lat p50':>8} {'lat p95':>8} {'lat p99':>8} {'tick p95':>8} {'lag p95':>8}")
+    saturated_at: Optional[int] = None
+    for step, target in enumerate(steps):
+        parts = [results[step] for results in worker_results]
+        connected = sum(p["connected"] for p in parts)
+        failed = sum(p["failed"] for p in parts)
+        latencies = [lat for p in parts for lat in p["latencies"]]
+        per_client = max(connected, 1) * args.step_duration
+        msg_rate = sum(p["messages"] for p in parts) / per_client
+        kb_rate = sum(p["bytes"] for p in parts) / per_client / 1024
+        lat50, lat95, lat99 = (percentile(latencies, q) for q in (0.5, 0.95, 0.99))
+        tick95 = server_steps[step]["tick_duration"]["p95"]
+        lag95 = server_steps[step]["tick_lag"]["p95"]
+
+        print(f"{target:>7} {connected:>5} {failed:>4} {msg_rate:>8.1f} {kb_rate:>8.1f} "
+              f"{lat50 * 1000:>6.0f}ms {lat95 * 1000:>6.0f}ms {lat99 * 1000:>6.0f}ms "
+              f"{tick95 * 1000:>6.1f}ms {lag95 * 1000:>6.1f}ms")
+
+        overloaded = (tick95 > tick_interval or lag95 > tick_interval / 2
+                      or lat95 > args.latency_budget or failed > 0.01 * target)
+        if overloaded and saturated_at is None:
+            saturated_at = target
+
+    if saturated_at is None:
+        print("\nServer kept up at every step")
+    else:
+        print(f"\nServer saturated at {saturated_at} clients")
+
+    for name, stats in server_steps[-1].get("compression", {}).items():
+        if stats["frames"]:
+            print(f"Server {name}: ratio {stats['ratio']:.2f}, {stats['frames']} frames compressed, "
+                  f"{stats['cpu_us_per_frame']:.1f} us CPU each, {stats['cpu_seconds']:.2f} s in total")
+
+
+if __name__ == "__main__":
+    main()
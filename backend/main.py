@@ -1,10 +1,21 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import asyncio
-import json
 import logging
-from typing import Dict
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
 from models.game import Game
+from persistence.service import PersistenceService
+from persistence.store import SQLiteStore
+from metrics import ServerMetrics
+from rooms import DEFAULT_ROOM, RemoteRoom, Room, RoomCapacityError, RoomElsewhereError, RoomManager, encode
+from actions import Action, GetState, PlaceTower, SetTargeting, TokenBucket, UpgradeTower, decode_action
+from snapshots import SnapshotStore
+from game_pool import GamePool
+from backplane import UnixSocketBackplane
+from frame_compression import ZstdCodec, deflate_protocol, zstandard
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -21,156 +32,341 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global game instance
-game = Game()
-
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, player_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[player_id] = websocket
-        logger.info(f"Player {player_id} connected. Total players: {len(self.active_connections)}")
-
-    def disconnect(self, player_id: str):
-        if player_id in self.active_connections:
-            del self.active_connections[player_id]
-            logger.info(f"Player {player_id} disconnected. Total players: {len(self.active_connections)}")
-
-    async def send_to_player(self, player_id: str, message: dict):
-        if player_id in self.active_connections:
-            try:
-                await self.active_connections[player_id].send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending to {player_id}: {e}")
-                self.disconnect(player_id)
-
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected players"""
-        disconnected = []
-        for player_id, connection in self.active_connections.items():
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to {player_id}: {e}")
-                disconnected.append(player_id)
-        
-        for player_id in disconnected:
-            self.disconnect(player_id)
+TICK_INTERVAL = 0.1  # 10 ticks per second
+ACTION_RATE = 10.0  # Actions per second a player may send on average
+ACTION_BURST = 20.0  # ... and in a burst
+metrics = ServerMetrics(TICK_INTERVAL)
+
+# Rooms hosted by this process; clients without a room join the default one.
+# Idle rooms are paused, then hibernated to disk until someone comes back;
+# dropped players keep their place for a grace period. New rooms take a game
+# pre-generated for the default options connecting players send.
+# With TD_BACKPLANE set to the socket of a backplane broker, several servers
+# share their rooms and relay each other's, so any of them can take any client
+max_memory_mb = os.environ.get("TD_MAX_MEMORY_MB")
+backplane_path = os.environ.get("TD_BACKPLANE")
+game_pool = GamePool(size=int(os.environ.get("TD_POOL_SIZE", "4")),
+                     warm=[{"roads": 1, "maze": False, "endless": False}])
+rooms = RoomManager(
+    metrics,
+    snapshots=SnapshotStore(os.environ.get("TD_SNAPSHOT_DIR", "snapshots")),
+    hibernate_after=float(os.environ.get("TD_HIBERNATE_AFTER", "300")),
+    max_rooms=int(os.environ.get("TD_MAX_ROOMS", "1000")),
+    max_memory=int(max_memory_mb) * 1024 * 1024 if max_memory_mb else None,
+    grace_period=float(os.environ.get("TD_GRACE_PERIOD", "30")),
+    pool=game_pool,
+    backplane=UnixSocketBackplane(backplane_path, os.environ.get("TD_NODE_ID")) if backplane_path else None
+)
+
+# Frames for clients asking for zstd are compressed once per room with the
+# dictionary at TD_ZSTD_DICT (see frame_compression.py); other clients get
+# permessage-deflate from the WebSocket layer
+zstd_codec = (ZstdCodec.load(metrics.compression["zstd"], os.environ.get("TD_ZSTD_DICT"),
+                             int(os.environ.get("TD_ZSTD_LEVEL", "3")))
+              if zstandard is not None else None)
+
+# Player stats and match history, written behind the game loop
+persistence = PersistenceService(SQLiteStore(os.environ.get("TD_DB_PATH", "tower_defense.db")))
 
-manager = ConnectionManager()
+
+@app.exception_handler(RoomCapacityError)
+async def room_capacity_handler(request: Request, exc: RoomCapacityError):
+    return JSONResponse(status_code=503, content={"error": str(exc)})
+
+
+@app.exception_handler(RoomElsewhereError)
+async def room_elsewhere_handler(request: Request, exc: RoomElsewhereError):
+    return JSONResponse(status_code=421, content={"error": str(exc), "node": exc.owner})
 
 
 @app.get("/")
 async def root():
+    try:
+        room = rooms.find(DEFAULT_ROOM)
+    except RoomElsewhereError as e:
+        return {"message": "Tower Defense Game API", "rooms": len(rooms), "default_room_node": e.owner}
+    if room is None:
+        return {"message": "Tower Defense Game API", "rooms": len(rooms)}
+    game = room.game
     return {
         "message": "Tower Defense Game API",
         "players": len(game.players),
         "towers": len(game.towers),
         "enemies": len(game.enemies),
-        "wave": game.current_wave
+        "wave": game.current_wave,
+        "rooms": len(rooms)
     }
 
 
-@app.websocket("/ws/{player_id}")
-async def websocket_endpoint(websocket: WebSocket, player_id: str):
-    await manager.connect(player_id, websocket)
-    
-    # Add player to game
-    game.add_player(player_id)
-    
-    # Send initial game state
-    await manager.send_to_player(player_id, {
-        "type": "init",
-        "state": game.to_dict()
+@app.get("/api/metrics")
+async def server_metrics(window: Optional[int] = None):
+    """Tick timing and traffic counters; window limits percentiles to the last N ticks"""
+    return {
+        **metrics.to_dict(window),
+        "rooms": len(rooms),
+        "rooms_paused": sum(1 for room in rooms if room.paused),
+        "rooms_hibernated": await rooms.hibernated_count(),
+        "game_pool": game_pool.to_dict(),
+        "connections": sum(len(room.players.active_connections) for room in rooms),
+        "rooms_relayed": len(rooms.remote),
+        "relayed_connections": sum(remote.connection_count for remote in rooms.relayed()),
+        "spectators": sum(len(room.spectators) for room in rooms),
+        "enemies": sum(len(room.game.enemies) for room in rooms),
+        "towers": sum(len(room.game.towers) for room in rooms)
+    }
+
+
+@app.get("/api/compression")
+async def compression_options():
+    """Frame compression a client may ask for with ?compression=zstd&dictionary=<id>"""
+    return {"zstd": {"dictionary_id": zstd_codec.dictionary_id} if zstd_codec is not None else None}
+
+
+@app.get("/api/compression/dictionary")
+async def compression_dictionary():
+    """The zstd dictionary clients need to read compressed frames"""
+    if zstd_codec is None or zstd_codec.dictionary is None:
+        return JSONResponse(status_code=404, content={"error": "No zstd dictionary"})
+    return Response(zstd_codec.dictionary.as_bytes(), media_type="application/octet-stream",
+                    headers={"X-Dictionary-Id": str(zstd_codec.dictionary_id)})
+
+
+def negotiate_compression(websocket: WebSocket, room, compression: Optional[str], dictionary: int):
+    """The socket to send through: compressing with zstd if the client asked for it with our dictionary"""
+    if compression == "zstd" and zstd_codec is not None and zstd_codec.accepts(dictionary):
+        return zstd_codec.wrap(websocket, room)
+    return websocket
+
+
+@app.get("/api/leaderboard")
+async def leaderboard(limit: int = 10):
+    """Top players by total points, served from the persistence cache"""
+    return {"leaderboard": persistence.leaderboard(limit)}
+
+
+@app.get("/api/players/{player_id}/history")
+async def player_history(player_id: str, limit: int = 20):
+    """A player's most recent matches"""
+    return {"player_id": player_id, "matches": await persistence.player_history(player_id, limit)}
+
+
+def save_player_result(room: Room, player_id: str):
+    """Queue a player's stats for this match before they leave the game"""
+    game = room.game
+    player = game.players.get(player_id)
+    if player:
+        persistence.record_player(game.match_id, player, game.current_wave)
+
+
+async def player_left(room: Room, player_id: str):
+    """A disconnected player did not come back in time: record their match and remove them"""
+    if not room.game.game_over:  # Everyone was recorded when the match ended
+        save_player_result(room, player_id)
+    room.game.remove_player(player_id)
+    await room.broadcast_state({
+        "type": "player_disconnected",
+        "player_id": player_id,
+        "state": room.game.to_dict()
     })
+
+
+rooms.on_player_left = player_left
+
+
+@app.get("/api/map/coverage/{tower_type}")
+async def map_coverage(tower_type: str, x: Optional[int] = None, y: Optional[int] = None,
+                       room: str = DEFAULT_ROOM):
+    """Road coverage preview for a tower type, for one cell or the whole grid of a room in play"""
+    current_room = rooms.find(room)
+    if current_room is None:
+        return JSONResponse(status_code=404, content={"error": f"Room {room} not found"})
+    game = current_room.game
+    if x is not None and y is not None:
+        return game.get_placement_coverage(x, y, tower_type)
+    return {
+        "tower_type": tower_type,
+        "path_length": game.game_map.path_length,
+        "coverage": game.get_coverage_table(tower_type)
+    }
+
+
+@app.websocket("/ws/spectate/{spectator_id}")
+async def spectator_endpoint(websocket: WebSocket, spectator_id: str, room: str = DEFAULT_ROOM,
+                             compression: Optional[str] = None, dictionary: int = 0):
+    """Read-only connection to a room in play: never joins the game, receives the shared low-rate stream"""
+    # Spectators neither create rooms nor wake paused ones up
+    current_room = rooms.find(room, relay=True)
+    if current_room is None or (isinstance(current_room, Room) and current_room.paused):
+        await websocket.close(code=1013)  # Try again later
+        return
+    websocket = negotiate_compression(websocket, current_room, compression, dictionary)
+    spectators = current_room.spectators
+    if isinstance(current_room, RemoteRoom):
+        # The init frame comes from the node hosting the room
+        if not await current_room.spectate(spectator_id, websocket):
+            await websocket.close(code=1013)
+            return
+    else:
+        init_frame = encode({**current_room.state_message("init"), "spectator": True})
+        await spectators.connect(spectator_id, websocket, init_frame)
     
     try:
         while True:
-            # Receive messages from client
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            response = await handle_player_action(player_id, message)
-            
-            # Broadcast state update to all players
-            if response.get("broadcast", True):
-                await manager.broadcast({
-                    "type": "state_update",
-                    "state": game.to_dict(),
-                    "events": response.get("events", {})
-                })
-            else:
-                # Send response only to requesting player
-                await manager.send_to_player(player_id, response)
+            # Spectators cannot act; keep reading only to notice the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        spectators.disconnect(spectator_id)
+    except Exception as e:
+        logger.error(f"WebSocket error for spectator {spectator_id}: {e}")
+        spectators.disconnect(spectator_id)
+    if isinstance(current_room, RemoteRoom):
+        await current_room.unspectate(spectator_id)
+    else:
+        rooms.release(current_room)
+
+
+@app.websocket("/ws/{player_id}")
+async def websocket_endpoint(websocket: WebSocket, player_id: str, room: str = DEFAULT_ROOM,
+                             roads: int = 1, maze: bool = False, endless: bool = False,
+                             token: Optional[str] = None, last_tick: Optional[int] = None,
+                             compression: Optional[str] = None, dictionary: int = 0):
+    # Map and wave options only apply when this connection creates the room
+    try:
+        current_room = await rooms.open(room, relay=True, roads=max(1, min(roads, 4)), maze=maze, endless=endless)
+    except RoomCapacityError:
+        await websocket.close(code=1013)  # Try again later
+        return
+    websocket = negotiate_compression(websocket, current_room, compression, dictionary)
+    if isinstance(current_room, RemoteRoom):
+        await relay_player(current_room, websocket, player_id, token, last_tick)
+        return
+    
+    # A returning player must present the token they got with init
+    token = current_room.claim(player_id, token)
+    if token is None:
+        await websocket.close(code=1008)
+        return
+    manager = current_room.players
+    
+    try:
+        # Join the game (or get back in) and receive the initial state or the missed frames
+        await current_room.join(player_id, websocket, token, last_tick)
+        current_room.resume()
+        
+        async for action in receive_actions(websocket, lambda message: manager.send_to_player(player_id, message)):
+            await apply_action(current_room, player_id, action)
     
     except WebSocketDisconnect:
-        manager.disconnect(player_id)
-        game.remove_player(player_id)
-        await manager.broadcast({
-            "type": "player_disconnected",
-            "player_id": player_id,
-            "state": game.to_dict()
-        })
+        manager.disconnect(player_id, websocket)
+        current_room.hold(player_id)
     except Exception as e:
         logger.error(f"WebSocket error for {player_id}: {e}")
-        manager.disconnect(player_id)
-        game.remove_player(player_id)
+        manager.disconnect(player_id, websocket)
+        current_room.hold(player_id)
+    rooms.release(current_room)
+
+
+async def relay_player(current_room: RemoteRoom, websocket: WebSocket, player_id: str,
+                       token: Optional[str], last_tick: Optional[int]):
+    """A player of a room hosted by another node: the owner joins them and gets their actions"""
+    try:
+        await current_room.join(player_id, websocket, token, last_tick)
+        send_error = lambda message: current_room.players.send_to_player(player_id, message)
+        async for action in receive_actions(websocket, send_error):
+            await current_room.act(player_id, action)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error for {player_id}: {e}")
+    await current_room.leave(player_id, websocket)
+
+
+async def receive_actions(websocket: WebSocket,
+                          send_error: Callable[[dict], Awaitable[None]]) -> AsyncIterator[Action]:
+    """Valid actions from a player, as JSON text or compact binary frames, within the rate limit"""
+    bucket = TokenBucket(ACTION_RATE, ACTION_BURST)
+    throttled = False
+    while True:
+        frame = await websocket.receive()
+        if frame["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(frame.get("code", 1000))
+        
+        if not bucket.take():
+            # Drop the action; tell the client once per burst of excess
+            if not throttled:
+                throttled = True
+                await send_error({"type": "error", "error": "Rate limit exceeded"})
+            continue
+        throttled = False
+        
+        try:
+            action = decode_action(frame["text"] if frame.get("text") is not None else frame.get("bytes") or b"")
+        except ValueError as e:
+            await send_error({"type": "error", "error": f"Invalid action: {e}"})
+            continue
+        yield action
 
 
-async def handle_player_action(player_id: str, message: dict) -> dict:
-    """Handle player actions"""
-    action = message.get("action")
+async def apply_action(room: Room, player_id: str, action: Action):
+    """Carry out a player's action in their room, wherever the player is connected"""
+    if isinstance(action, GetState):
+        # Coalesced: repeated requests within a tick cost one to_dict at most
+        await room.send_current_state(player_id)
+        return
     
-    if action == "place_tower":
-        result = game.place_tower(
-            player_id,
-            message.get("x"),
-            message.get("y"),
-            message.get("tower_type")
-        )
+    game = room.game
+    response = await handle_player_action(game, player_id, action)
+    
+    # Broadcast state update to all players
+    if response.get("broadcast", True):
+        await room.broadcast_state({
+            "type": "state_update",
+            "state": game.to_dict(),
+            "events": response.get("events", {})
+        })
+    else:
+        # Send response only to requesting player
+        await room.players.send_to_player(player_id, response)
+
+
+rooms.on_action = apply_action
+
+
+async def handle_player_action(game: Game, player_id: str, action: Action) -> dict:
+    """Handle a decoded player action (get_state is answered by the room)"""
+    if isinstance(action, PlaceTower):
+        result = game.place_tower(player_id, action.x, action.y, action.tower_type)
         return {
             "type": "tower_placed",
             "result": result,
             "broadcast": result.get("success", False)
         }
     
-    elif action == "upgrade_tower":
-        result = game.upgrade_tower(
-            player_id,
-            message.get("tower_id"),
-            message.get("upgrade_path", "damage")
-        )
+    elif isinstance(action, UpgradeTower):
+        result = game.upgrade_tower(player_id, action.tower_id, action.upgrade_path)
         return {
             "type": "tower_upgraded",
             "result": result,
             "broadcast": result.get("success", False)
         }
     
-    elif action == "start_wave":
-        if not game.game_started:
-            game.start_game()
-        else:
-            game.start_next_wave()
+    elif isinstance(action, SetTargeting):
+        result = game.set_tower_targeting(player_id, action.tower_id, action.targeting)
         return {
-            "type": "wave_started",
-            "result": {"success": True, "wave": game.current_wave},
-            "broadcast": True
-        }
-    
-    elif action == "get_state":
-        return {
-            "type": "state",
-            "state": game.to_dict(),
-            "broadcast": False
+            "type": "tower_targeting",
+            "result": result,
+            "broadcast": result.get("success", False)
         }
     
+    # StartWave, the only action left: decode_action only produces the ones above and GetState
+    if not game.game_started:
+        game.start_game()
+    else:
+        game.start_next_wave()
     return {
-        "type": "error",
-        "error": f"Unknown action: {action}",
-        "broadcast": False
+        "type": "wave_started",
+        "result": {"success": True, "wave": game.current_wave},
+        "broadcast": True
     }
 
 
@@ -178,33 +374,61 @@ async def handle_player_action(player_id: str, message: dict) -> dict:
 @app.on_event("startup")
 async def startup_event():
     """Start background game loop"""
+    await persistence.start()
+    await rooms.start()
     asyncio.create_task(game_loop())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Snapshot rooms and flush queued stats before exiting"""
+    await rooms.stop()
+    await persistence.stop()
+
+
 async def game_loop():
-    """Main game loop that updates game state"""
+    """Main game loop that updates game state at a fixed rate"""
     logger.info("Game loop started")
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
     
     while True:
         try:
-            # Update game state
-            game.update()
+            tick_start = loop.time()
+            lag = max(0.0, tick_start - next_tick)
+            
+            server_time = time.time()
+            for room in rooms.active():
+                # Update game state
+                was_over = room.game.game_over
+                room.game.update()
+                
+                # Record results once, when the match is lost
+                if room.game.game_over and not was_over:
+                    for player_id in list(room.game.players):
+                        save_player_result(room, player_id)
+                
+                # Broadcast updates to players and spectators
+                await room.broadcast_tick(server_time)
             
-            # Broadcast updates if game is running
-            if game.game_started and manager.active_connections:
-                await manager.broadcast({
-                    "type": "game_update",
-                    "state": game.to_dict()
-                })
+            metrics.record_tick(loop.time() - tick_start, lag)
             
-            # Sleep for 100ms (10 ticks per second)
-            await asyncio.sleep(0.1)
+            # Sleep until the next tick; skip ahead if we fell behind
+            next_tick = max(next_tick + TICK_INTERVAL, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
         
         except Exception as e:
             logger.error(f"Error in game loop: {e}")
             await asyncio.sleep(1)
+            next_tick = loop.time()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # permessage-deflate tuned for the repeated keys of game frames; uvicorn's CLI keeps its own settings
+    ws_protocol = deflate_protocol(metrics.compression["deflate"],
+                                   window_bits=int(os.environ.get("TD_WS_DEFLATE_WINDOW_BITS", "15")),
+                                   mem_level=int(os.environ.get("TD_WS_DEFLATE_MEM_LEVEL", "8")))
+    uvicorn.run(app, host=os.environ.get("TD_HOST", "0.0.0.0"), port=int(os.environ.get("TD_PORT", "8000")),
+                ws=ws_protocol or "auto",
+                ws_per_message_deflate=os.environ.get("TD_WS_DEFLATE", "1") != "0")
@@ -0,0 +1,104 @@
+from typing import Dict, Optional
+from collections import deque
+from itertools import islice
+import os
+import time
+
+
+def resident_memory() -> Optional[int]:
+    """Resident set size of this process in bytes, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RollingStats:
+    """Percentiles over the most recent samples"""
+
+    def __init__(self, window: int = 600):
+        self.samples: deque = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.samples.append(value)
+
+    def summary(self, last: Optional[int] = None) -> Dict:
+        """count, mean, p50, p95, p99 and max of the window, or of its last samples"""
+        if last is not None and last < len(self.samples):
+            samples = list(islice(self.samples, len(self.samples) - last, None))
+        else:
+            samples = self.samples
+        if not samples:
+            return {"count": 0, "mean": 0, "p50": 0, "p95": 0, "p99": 0, "max": 0}
+        ordered = sorted(samples)
+        n = len(ordered)
+        return {
+            "count": n,
+            "mean": sum(ordered) / n,
+            "p50": ordered[int(n * 0.50)],
+            "p95": ordered[min(n - 1, int(n * 0.95))],
+            "p99": ordered[min(n - 1, int(n * 0.99))],
+            "max": ordered[-1]
+        }
+
+
+class CompressionStats:
+    """What a compressor took in and put out, and the CPU time it spent"""
+
+    def __init__(self):
+        self.frames = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.cpu_time = 0.0
+
+    def record(self, raw_size: int, compressed_size: int, cpu_time: float):
+        self.frames += 1
+        self.raw_bytes += raw_size
+        self.compressed_bytes += compressed_size
+        self.cpu_time += cpu_time
+
+    def to_dict(self) -> Dict:
+        return {
+            "frames": self.frames,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0,
+            "cpu_seconds": self.cpu_time,
+            "cpu_us_per_frame": self.cpu_time / self.frames * 1e6 if self.frames else 0
+        }
+
+
+class ServerMetrics:
+    """Server-side counters for load testing and monitoring"""
+
+    def __init__(self, tick_interval: float):
+        self.tick_interval = tick_interval
+        self.started_at = time.time()
+        self.tick_duration = RollingStats()  # Seconds spent updating and broadcasting per tick
+        self.tick_lag = RollingStats()  # Seconds a tick started later than scheduled
+        self.messages_sent = 0
+        self.bytes_sent = 0  # Before compression
+        # zstd frames are compressed once per room; permessage-deflate once per socket
+        self.compression = {"zstd": CompressionStats(), "deflate": CompressionStats()}
+
+    def record_tick(self, duration: float, lag: float):
+        self.tick_duration.add(duration)
+        self.tick_lag.add(lag)
+
+    def record_send(self, size: int, count: int = 1):
+        self.messages_sent += count
+        self.bytes_sent += size * count
+
+    def to_dict(self, window: Optional[int] = None) -> Dict:
+        """Convert metrics to dictionary for serialization; window limits percentiles to the last ticks"""
+        return {
+            "uptime": time.time() - self.started_at,
+            "tick_interval": self.tick_interval,
+            "tick_duration": self.tick_duration.summary(window),
+            "tick_lag": self.tick_lag.summary(window),
+            "messages_sent": self.messages_sent,
+            "bytes_sent": self.bytes_sent,
+            "compression": {name: stats.to_dict() for name, stats in self.compression.items()},
+            "resident_memory": resident_memory()
+        }
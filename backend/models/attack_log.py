@@ -0,0 +1,95 @@
+from typing import Dict, Iterator, List
+
+
+class AttackRecord:
+    """A reusable attack event slot (for client animations)"""
+
+    __slots__ = ("tower_id", "type", "damage", "target_x", "target_y", "enemy_id",
+                 "center_x", "center_y", "radius", "hits")
+
+    def __init__(self):
+        self.hits: List = []  # Flat [x, y, enemy_id, x, y, enemy_id, ...] for multi-hit attacks
+        self.clear()
+
+    def clear(self):
+        """Reset the slot without dropping the hits list's storage"""
+        self.tower_id = None
+        self.type = None
+        self.damage = 0.0
+        self.target_x = self.target_y = 0.0
+        self.enemy_id = None
+        self.center_x = self.center_y = 0.0
+        self.radius = 0.0
+        del self.hits[:]
+
+    def set_target(self, tower_id: str, attack_type: str, damage: float, enemy):
+        """Fill the slot for a single-target attack"""
+        self.tower_id = tower_id
+        self.type = attack_type
+        self.damage = damage
+        self.target_x = enemy.x
+        self.target_y = enemy.y
+        self.enemy_id = enemy.id
+
+    def add_hit(self, enemy):
+        """Record one enemy hit by a multi-target attack"""
+        self.hits.extend((enemy.x, enemy.y, enemy.id))
+
+    def to_dict(self) -> Dict:
+        """Convert record to dictionary for serialization"""
+        if self.type == "aoe":
+            hits = self.hits
+            return {
+                "tower_id": self.tower_id,
+                "type": self.type,
+                "center": {"x": self.center_x, "y": self.center_y},
+                "targets": [{"x": hits[i], "y": hits[i + 1], "enemy_id": hits[i + 2]}
+                            for i in range(0, len(hits), 3)],
+                "damage": self.damage,
+                "radius": self.radius
+            }
+        return {
+            "tower_id": self.tower_id,
+            "type": self.type,
+            "target": {"x": self.target_x, "y": self.target_y, "enemy_id": self.enemy_id},
+            "damage": self.damage
+        }
+
+
+class AttackLog:
+    """
+    Preallocated ring buffer of the attack events since the last frame
+    Reset once a frame carrying them is built, so attacks of ticks between
+    broadcasts still reach clients; if more than capacity attacks pile up
+    the oldest are overwritten, which only drops animations
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._records = [AttackRecord() for _ in range(capacity)]
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def __iter__(self) -> Iterator[AttackRecord]:
+        """Iterate live records oldest first"""
+        if self._count <= self.capacity:
+            return iter(self._records[:self._count])
+        start = self._count % self.capacity
+        return iter(self._records[start:] + self._records[:start])
+
+    def reset(self):
+        """The attacks so far went out in a frame; start collecting for the next"""
+        self._count = 0
+
+    def next_record(self) -> AttackRecord:
+        """Claim the next slot, cleared and ready to fill"""
+        record = self._records[self._count % self.capacity]
+        self._count += 1
+        record.clear()
+        return record
+
+    def to_list(self) -> List[Dict]:
+        """Serialize the attacks since the last reset"""
+        return [record.to_dict() for record in self]
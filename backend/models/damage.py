@@ -0,0 +1,54 @@
+from typing import List
+from array import array
+from models.enemy import Enemy, DAMAGE_TYPE_INDEX
+
+
+class DamageResolver:
+    """
+    Collects every hit of a tick and applies them in one pass
+    Towers only record (enemy, tower type, amount); resistances and death
+    checks run once per tick here. Towers firing in the same tick all see
+    enemies as alive, so a little overkill within one tick is expected.
+    """
+
+    def __init__(self):
+        self.enemies: List[Enemy] = []  # Hit enemy handles
+        self.damage_types = array("b")  # Column in Enemy.damage_multipliers, -1 = unresisted
+        self.amounts = array("d")
+
+    def __len__(self) -> int:
+        return len(self.enemies)
+
+    def add_hit(self, enemy: Enemy, tower_type: str, amount: float):
+        """Queue a hit to be applied when the tick resolves"""
+        self.enemies.append(enemy)
+        self.damage_types.append(DAMAGE_TYPE_INDEX.get(tower_type, -1))
+        self.amounts.append(amount)
+
+    def resolve(self):
+        """
+        Apply all queued hits and clear the queue
+        Enemies brought to 0 health die; the game counts and rewards them on its next update
+        """
+        enemies = self.enemies
+        damage_types = self.damage_types
+        amounts = self.amounts
+
+        for i in range(len(enemies)):
+            enemy = enemies[i]
+            if not enemy.is_alive:
+                continue
+            type_index = damage_types[i]
+            if type_index >= 0:
+                enemy.current_health -= amounts[i] * enemy.damage_multipliers[type_index]
+            else:
+                enemy.current_health -= amounts[i]
+
+        for enemy in enemies:
+            if enemy.is_alive and enemy.current_health <= 0:
+                enemy.is_alive = False
+                enemy.current_health = 0
+
+        self.enemies = []
+        del self.damage_types[:]
+        del self.amounts[:]
@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from enum import Enum
 import math
 
@@ -9,33 +9,65 @@ class EnemyType(Enum):
     FLYING = "flying"
 
 
+# Tower types in the column order of Enemy.damage_multipliers
+DAMAGE_TYPES = ("basic", "sniper", "cannon", "aoe")
+DAMAGE_TYPE_INDEX = {damage_type: i for i, damage_type in enumerate(DAMAGE_TYPES)}
+
+
+def _damage_multipliers(resistances: Dict[str, float]) -> Tuple[float, ...]:
+    """Turn a resistance dict into a row of damage multipliers aligned with DAMAGE_TYPES"""
+    return tuple(1 - resistances.get(damage_type, 0) for damage_type in DAMAGE_TYPES)
+
+
 class Enemy:
     """Base enemy class"""
     
+    # Resistances (0-1, where 1 = immune, 0 = normal damage), shared by all instances of a type
+    resistances = {
+        "basic": 0,
+        "sniper": 0,
+        "cannon": 0,
+        "aoe": 0
+    }
+    damage_multipliers = _damage_multipliers(resistances)
+    
+    # Base stats, overridden per type
+    base_health = 100
+    speed = 1.0  # cells per second
+    reward = 10  # Money earned when defeated
+    damage = 1  # Damage to player if reaches end
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.damage_multipliers = _damage_multipliers(cls.resistances)
+    
     def __init__(self, enemy_id: str, path: List[Dict[str, float]], spawn_time: float):
+        self.reset(enemy_id, path, spawn_time)
+    
+    def reset(self, enemy_id: str, path: List[Dict[str, float]], spawn_time: float):
+        """Reinitialize per-life state so a pooled instance can be spawned again"""
         self.id = enemy_id
-        self.path = path  # List of waypoints [{x, y}, ...]
+        self.path = path  # List of waypoints [{x, y}, ...], shared, never mutated
         self.current_waypoint_index = 0
         self.x = path[0]["x"] if path else 0
         self.y = path[0]["y"] if path else 0
         self.spawn_time = spawn_time
         self.is_alive = True
         self.distance_traveled = 0
-        
-        # Base stats
-        self.max_health = 100
+        self.max_health = self.base_health
         self.current_health = self.max_health
-        self.speed = 1.0  # cells per second
-        self.reward = 10  # Money earned when defeated
-        self.damage = 1  # Damage to player if reaches end
-        
-        # Resistances (0-1, where 1 = immune, 0 = normal damage)
-        self.resistances = {
-            "basic": 0,
-            "sniper": 0,
-            "cannon": 0,
-            "aoe": 0
-        }
+        self.route_id = 0
+        self.route_offset = 0.0  # Start of the route in the map's progress space
+    
+    def scale_health(self, factor: float):
+        """Toughen this life of the enemy, e.g. for late endless waves"""
+        self.max_health = self.base_health * factor
+        self.current_health = self.max_health
+    
+    def set_route(self, route_id: int, offset: float):
+        """Record which map route the path belongs to"""
+        self.route_id = route_id
+        self.route_offset = offset
     
     @property
     def health_percentage(self) -> float:
@@ -51,8 +83,8 @@ class Enemy:
             return False
         
         # Apply resistance
-        resistance = self.resistances.get(tower_type, 0)
-        actual_damage = damage * (1 - resistance)
+        type_index = DAMAGE_TYPE_INDEX.get(tower_type)
+        actual_damage = damage * self.damage_multipliers[type_index] if type_index is not None else damage
         
         self.current_health -= actual_damage
         
@@ -100,8 +132,21 @@ class Enemy:
         
         return False
     
+    def get_velocity(self) -> Tuple[float, float]:
+        """Current velocity (cells per second) towards the next waypoint"""
+        if not self.is_alive or self.current_waypoint_index >= len(self.path):
+            return 0.0, 0.0
+        target = self.path[self.current_waypoint_index]
+        dx = target["x"] - self.x
+        dy = target["y"] - self.y
+        distance = math.sqrt(dx ** 2 + dy ** 2)
+        if distance == 0:
+            return 0.0, 0.0
+        return dx / distance * self.speed, dy / distance * self.speed
+    
     def to_dict(self) -> Dict:
         """Convert enemy to dictionary for serialization"""
+        vx, vy = self.get_velocity()
         return {
             "id": self.id,
             "type": self.__class__.__name__.lower().replace("enemy", ""),
@@ -112,77 +157,101 @@ class Enemy:
             "health_percentage": self.health_percentage,
             "is_alive": self.is_alive,
             "speed": self.speed,
-            "distance_traveled": self.distance_traveled
+            "vx": vx,
+            "vy": vy,
+            "route": self.route_id,
+            "distance_traveled": self.distance_traveled  # Path progress, used for client interpolation
         }
 
 
 class FastEnemy(Enemy):
     """Low health, high speed enemy"""
     
-    def __init__(self, enemy_id: str, path: List[Dict[str, float]], spawn_time: float):
-        super().__init__(enemy_id, path, spawn_time)
-        self.max_health = 50
-        self.current_health = self.max_health
-        self.speed = 2.5
-        self.reward = 8
-        self.damage = 1
-        
-        # Weak to AoE, resistant to sniper
-        self.resistances = {
-            "basic": 0,
-            "sniper": 0.3,
-            "cannon": 0,
-            "aoe": -0.2  # Takes extra damage
-        }
+    # Weak to AoE, resistant to sniper
+    resistances = {
+        "basic": 0,
+        "sniper": 0.3,
+        "cannon": 0,
+        "aoe": -0.2  # Takes extra damage
+    }
+    
+    base_health = 50
+    speed = 2.5
+    reward = 8
+    damage = 1
 
 
 class TankEnemy(Enemy):
     """High health, slow speed enemy"""
     
-    def __init__(self, enemy_id: str, path: List[Dict[str, float]], spawn_time: float):
-        super().__init__(enemy_id, path, spawn_time)
-        self.max_health = 300
-        self.current_health = self.max_health
-        self.speed = 0.6
-        self.reward = 25
-        self.damage = 3
-        
-        # Resistant to basic, weak to cannon
-        self.resistances = {
-            "basic": 0.3,
-            "sniper": 0.1,
-            "cannon": -0.3,  # Takes extra damage
-            "aoe": 0.2
-        }
+    # Resistant to basic, weak to cannon
+    resistances = {
+        "basic": 0.3,
+        "sniper": 0.1,
+        "cannon": -0.3,  # Takes extra damage
+        "aoe": 0.2
+    }
+    
+    base_health = 300
+    speed = 0.6
+    reward = 25
+    damage = 3
 
 
 class FlyingEnemy(Enemy):
     """Flying enemy - special properties"""
     
-    def __init__(self, enemy_id: str, path: List[Dict[str, float]], spawn_time: float):
-        super().__init__(enemy_id, path, spawn_time)
-        self.max_health = 80
-        self.current_health = self.max_health
-        self.speed = 1.8
-        self.reward = 15
-        self.damage = 2
-        
-        # Takes reduced damage from all towers except sniper
-        self.resistances = {
-            "basic": 0.5,
-            "sniper": 0,  # Sniper is good against flying
-            "cannon": 0.6,
-            "aoe": 0.4
-        }
+    # Takes reduced damage from all towers except sniper
+    resistances = {
+        "basic": 0.5,
+        "sniper": 0,  # Sniper is good against flying
+        "cannon": 0.6,
+        "aoe": 0.4
+    }
+    
+    base_health = 80
+    speed = 1.8
+    reward = 15
+    damage = 2
+
+
+ENEMY_CLASSES = {
+    "fast": FastEnemy,
+    "tank": TankEnemy,
+    "flying": FlyingEnemy
+}
 
 
 def create_enemy(enemy_type: str, enemy_id: str, path: List[Dict[str, float]], spawn_time: float) -> Enemy:
     """Factory function to create enemies"""
-    enemy_classes = {
-        "fast": FastEnemy,
-        "tank": TankEnemy,
-        "flying": FlyingEnemy
-    }
-    
-    enemy_class = enemy_classes.get(enemy_type.lower(), Enemy)
+    enemy_class = ENEMY_CLASSES.get(enemy_type.lower(), Enemy)
     return enemy_class(enemy_id, path, spawn_time)
+
+
+class EnemyPool:
+    """
+    Recycles Enemy instances per type
+    Long endless runs spawn and kill enemies constantly; reusing instances
+    keeps that churn away from the garbage collector
+    """
+    
+    def __init__(self):
+        self._free: Dict[type, List[Enemy]] = {}
+    
+    def acquire(self, enemy_type: str, enemy_id: str, path: List[Dict[str, float]], spawn_time: float) -> Enemy:
+        """Get a ready enemy, reusing a released one when available"""
+        enemy_class = ENEMY_CLASSES.get(enemy_type.lower(), Enemy)
+        free = self._free.get(enemy_class)
+        if free:
+            enemy = free.pop()
+            enemy.reset(enemy_id, path, spawn_time)
+            return enemy
+        return enemy_class(enemy_id, path, spawn_time)
+    
+    def release(self, enemy: Enemy):
+        """Return a removed enemy to the pool"""
+        self._free.setdefault(type(enemy), []).append(enemy)
+    
+    def free_count(self) -> int:
+        """Number of idle pooled instances"""
+        return sum(len(free) for free in self._free.values())
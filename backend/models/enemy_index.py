@@ -0,0 +1,70 @@
+from typing import Iterator, List, Optional, Set
+from bisect import bisect_left, bisect_right
+from models.enemy import Enemy
+from models.game_map import GameMap
+
+
+class ProgressIndex:
+    """
+    Living enemies kept sorted by path progress (route offset + distance_traveled)
+    Towers query it with bisect over their path coverage intervals
+    """
+
+    def __init__(self, game_map: Optional[GameMap] = None):
+        self.game_map = game_map  # Needed for within()
+        self.enemies: List[Enemy] = []
+        self.progress: List[float] = []  # Progress of enemies, same order
+
+    def __len__(self) -> int:
+        return len(self.enemies)
+
+    def add(self, enemy: Enemy):
+        """Insert a newly spawned enemy at its sorted position"""
+        key = enemy.route_offset + enemy.distance_traveled
+        i = bisect_right(self.progress, key)
+        self.enemies.insert(i, enemy)
+        self.progress.insert(i, key)
+
+    def remove_many(self, enemy_ids: Set[str]):
+        """Drop dead or finished enemies in one pass"""
+        if not enemy_ids:
+            return
+        kept = [e for e in self.enemies if e.id not in enemy_ids]
+        self.enemies = kept
+        self.progress = [e.route_offset + e.distance_traveled for e in kept]
+
+    def refresh(self):
+        """
+        Re-read progress after enemies moved and restore the order
+        Enemies only overtake each other when a fast one passes a slow one,
+        so an insertion pass moves few entries and stays close to O(n)
+        """
+        enemies = self.enemies
+        progress = self.progress
+        for i, enemy in enumerate(enemies):
+            progress[i] = enemy.route_offset + enemy.distance_traveled
+
+        for i in range(1, len(enemies)):
+            key = progress[i]
+            if key >= progress[i - 1]:
+                continue
+            enemy = enemies[i]
+            j = i - 1
+            while j >= 0 and progress[j] > key:
+                progress[j + 1] = progress[j]
+                enemies[j + 1] = enemies[j]
+                j -= 1
+            progress[j + 1] = key
+            enemies[j + 1] = enemy
+
+    def span(self, start: float, end: float) -> range:
+        """Get index positions of enemies with start <= progress <= end"""
+        return range(bisect_left(self.progress, start), bisect_right(self.progress, end))
+
+    def within(self, x: float, y: float, radius: float) -> Iterator[Enemy]:
+        """Yield living enemies within radius of (x, y), via the road coverage of that circle"""
+        enemies = self.enemies
+        for start, end in self.game_map.compute_path_coverage(x, y, radius):
+            for i in self.span(start, end):
+                if enemies[i].is_alive:
+                    yield enemies[i]
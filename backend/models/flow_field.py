@@ -0,0 +1,109 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+
+Cell = Tuple[int, int]
+Neighbors = Callable[[Cell], Iterable[Tuple[Cell, float]]]
+
+
+class FlowField:
+    """
+    Distance to the nearest exit and the next step towards it, for every cell
+    Computed once per map change with a multi-source Dijkstra from the exits,
+    so any number of enemies and spawns share one field. neighbors(cell) gives
+    the passable neighbours with the (symmetric) cost of stepping between them.
+    Blocking a cell only recomputes the cells whose way out went through it
+    """
+
+    def __init__(self, exits: Iterable[Cell], neighbors: Neighbors):
+        self.exits: List[Cell] = list(exits)
+        self.neighbors = neighbors
+        self.distance: Dict[Cell, float] = {}
+        self.next_cell: Dict[Cell, Optional[Cell]] = {}
+        self.blocked: Set[Cell] = set()
+        self.compute()
+
+    def compute(self):
+        """Rebuild the whole field"""
+        self.distance = {}
+        self.next_cell = {}
+        heap = []
+        for cell in self.exits:
+            if cell not in self.blocked:
+                self.distance[cell] = 0.0
+                self.next_cell[cell] = None
+                heap.append((0.0, cell))
+        heapq.heapify(heap)
+        self._expand(heap)
+
+    def _expand(self, heap: List[Tuple[float, Cell]]):
+        """Dijkstra from the cells already on the heap"""
+        distance = self.distance
+        while heap:
+            dist, cell = heapq.heappop(heap)
+            if dist > distance.get(cell, math.inf):
+                continue
+            for neighbor, cost in self.neighbors(cell):
+                if neighbor in self.blocked:
+                    continue
+                candidate = dist + cost
+                if candidate < distance.get(neighbor, math.inf):
+                    distance[neighbor] = candidate
+                    self.next_cell[neighbor] = cell
+                    heapq.heappush(heap, (candidate, neighbor))
+
+    def is_reachable(self, cell: Cell) -> bool:
+        """Whether an exit can be reached from cell"""
+        return cell in self.distance
+
+    def block(self, cell: Cell):
+        """Make a cell impassable and repair the part of the field that routed through it"""
+        if cell in self.blocked:
+            return
+        self.blocked.add(cell)
+        if cell not in self.distance:
+            return
+
+        # Cells whose path to an exit passes through the blocked one
+        children: Dict[Cell, List[Cell]] = {}
+        for child, parent in self.next_cell.items():
+            if parent is not None:
+                children.setdefault(parent, []).append(child)
+        affected = []
+        stack = [cell]
+        while stack:
+            current = stack.pop()
+            affected.append(current)
+            stack.extend(children.get(current, ()))
+
+        for current in affected:
+            del self.distance[current]
+            del self.next_cell[current]
+
+        # Re-enter the affected region from its still valid border
+        heap = []
+        for current in affected:
+            if current in self.blocked:
+                continue
+            best, best_next = math.inf, None
+            for neighbor, cost in self.neighbors(current):
+                dist = self.distance.get(neighbor)
+                if dist is not None and neighbor not in self.blocked and dist + cost < best:
+                    best, best_next = dist + cost, neighbor
+            if best_next is not None:
+                self.distance[current] = best
+                self.next_cell[current] = best_next
+                heap.append((best, current))
+        heapq.heapify(heap)
+        self._expand(heap)
+
+    def trace(self, start: Cell) -> List[Cell]:
+        """Cells from start to an exit following the field; empty if no exit is reachable"""
+        if start not in self.distance:
+            return []
+        path = [start]
+        cell = self.next_cell[start]
+        while cell is not None:
+            path.append(cell)
+            cell = self.next_cell[cell]
+        return path
@@ -1,40 +1,66 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import time
 import uuid
 from models.game_map import GameMap, TerrainType
 from models.player import Player
 from models.tower import create_tower, Tower
-from models.enemy import create_enemy, Enemy
+from models.enemy import Enemy, EnemyPool
+from models.enemy_index import ProgressIndex
+from models.damage import DamageResolver
+from models.attack_log import AttackLog
+from models.ledger import TeamLedger
+from models.scheduler import TowerScheduler
+from models.waves import EndlessWaves, ScriptedWaves
 
 
 class Game:
     """Main game class managing all game logic"""
     
-    def __init__(self):
-        self.game_map = GameMap(grid_size=20, cell_size=30)
+    def __init__(self, seed: Optional[int] = None, clock: Callable[[], float] = time.time,
+                 roads: int = 1, maze: bool = False, endless: bool = False):
+        # The clock is injectable so headless simulations can run faster than real time
+        self.clock = clock
+        self.match_id = str(uuid.uuid4())
+        self.game_map = GameMap(grid_size=20, cell_size=30, seed=seed, roads=roads, maze=maze)
         self.players: Dict[str, Player] = {}
+        self.ledger = TeamLedger()  # Shared rewards/damage, settled into players each tick
         self.towers: Dict[str, Tower] = {}
+        self.tower_scheduler = TowerScheduler()  # Towers by the time they can fire next
         self.enemies: Dict[str, Enemy] = {}
+        self.enemy_pool = EnemyPool()  # Recycled enemy instances
+        self.enemy_index = ProgressIndex(self.game_map)  # Living enemies sorted by path progress
+        self.damage_resolver = DamageResolver()  # Hits of the current tick
         
         # Wave system
         self.current_wave = 0
         self.wave_in_progress = False
         self.wave_start_time = 0
         self.time_between_waves = 10.0  # seconds
-        self.last_wave_end_time = time.time()
+        self.last_wave_end_time = self.clock()
         
         # Enemy spawning
-        self.enemies_to_spawn: List[Dict] = []
+        self.endless = endless
+        self.wave_director = EndlessWaves(seed) if endless else ScriptedWaves()
         self.last_spawn_time = 0
         self.spawn_interval = 1.0  # seconds between spawns
+        self.spawn_count = 0  # Spawns rotate over the map's routes
+        self.max_spawns_per_tick = 20  # Due spawns beyond this wait for the next tick
+        self._wave_killed_before = 0
+        self._wave_leaked_before = 0
         
         # Game state
         self.game_started = False
         self.game_over = False
-        self.last_update_time = time.time()
+        self.paused_at: Optional[float] = None  # Set while the room has nobody connected
+        self.last_update_time = self.clock()
+        self.tick = 0  # Simulation steps since the game started
         
-        # Attacks (for animation)
-        self.recent_attacks: List[Dict] = []
+        # Statistics
+        self.enemies_killed = 0
+        self.enemies_leaked = 0
+        
+        # Attacks (for animation) since the last frame sent to clients, who reset it
+        self.attack_log = AttackLog()
     
     def add_player(self, player_id: str):
         """Add a player to the game"""
@@ -46,51 +72,55 @@ class Game:
         if player_id in self.players:
             del self.players[player_id]
     
+    def __getstate__(self):
+        # Snapshots only carry live state; pooled enemies are just a cache
+        state = self.__dict__.copy()
+        state["enemy_pool"] = EnemyPool()
+        return state
+    
+    def pause(self):
+        """Freeze the game clock; update() does nothing until resume()"""
+        if self.paused_at is None:
+            self.paused_at = self.clock()
+    
+    def resume(self):
+        """Continue from where pause() stopped, shifting every timestamp past the pause"""
+        if self.paused_at is None:
+            return
+        offset = self.clock() - self.paused_at
+        self.paused_at = None
+        self.last_update_time += offset
+        self.wave_start_time += offset
+        self.last_wave_end_time += offset
+        self.last_spawn_time += offset
+        for tower in self.towers.values():
+            tower.last_attack_time += offset
+        self.tower_scheduler.reschedule_all()
+        for enemy in self.enemies.values():
+            enemy.spawn_time += offset
+    
     def start_game(self):
         """Start the game"""
         if not self.game_started:
             self.game_started = True
-            self.last_update_time = time.time()
+            self.last_update_time = self.clock()
             self.start_next_wave()
     
     def start_next_wave(self):
         """Start the next wave of enemies"""
         self.current_wave += 1
         self.wave_in_progress = True
-        self.wave_start_time = time.time()
+        self.wave_start_time = self.clock()
         
-        # Generate enemies for this wave
-        self.enemies_to_spawn = self._generate_wave_enemies()
-        self.last_spawn_time = time.time()
+        # Stream this wave's enemies
+        self.wave_director.start_wave(self.current_wave, self.get_team_strength())
+        self._wave_killed_before = self.enemies_killed
+        self._wave_leaked_before = self.enemies_leaked
+        self.last_spawn_time = self.clock()
     
-    def _generate_wave_enemies(self) -> List[Dict]:
-        """Generate enemy spawn queue for current wave"""
-        enemies_queue = []
-        base_count = 5 + self.current_wave * 2
-        
-        # Determine enemy composition based on wave number
-        for i in range(base_count):
-            spawn_time = i * 1.5  # 1.5 seconds between spawns
-            
-            # Enemy type distribution changes with waves
-            if self.current_wave <= 2:
-                # Early waves: mostly fast enemies
-                enemy_type = "fast" if i % 3 != 0 else "tank"
-            elif self.current_wave <= 5:
-                # Mid waves: mix of all types
-                types = ["fast", "fast", "tank", "flying"]
-                enemy_type = types[i % len(types)]
-            else:
-                # Late waves: more tanks and flying
-                types = ["fast", "tank", "tank", "flying", "flying"]
-                enemy_type = types[i % len(types)]
-            
-            enemies_queue.append({
-                "type": enemy_type,
-                "spawn_time": spawn_time
-            })
-        
-        return enemies_queue
+    def get_team_strength(self) -> float:
+        """Combined damage per second of all towers"""
+        return sum(tower.damage * tower.attack_speed for tower in self.towers.values())
     
     def place_tower(self, player_id: str, x: int, y: int, tower_type: str) -> Dict:
         """
@@ -102,15 +132,19 @@ class Game:
         
         player = self.players[player_id]
         
-        # Check if position is valid
-        if not self.game_map.can_place_tower(x, y):
-            return {"success": False, "message": "Cannot place tower on road"}
-        
         # Check if tower already exists at position
         for tower in self.towers.values():
             if tower.x == x and tower.y == y:
                 return {"success": False, "message": "Tower already exists here"}
         
+        # Check if position is valid
+        if self.game_map.maze and self.enemies:
+            return {"success": False, "message": "Cannot change the maze while enemies are on it"}
+        if not self.game_map.can_place_tower(x, y):
+            if self.game_map.maze:
+                return {"success": False, "message": "Tower would block the way to the exit"}
+            return {"success": False, "message": "Cannot place tower on road"}
+        
         # Get terrain type
         terrain = self.game_map.get_terrain(x, y)
         
@@ -124,7 +158,15 @@ class Game:
         
         # Place tower
         self.towers[tower_id] = tower
+        self.tower_scheduler.add(tower)
         player.build_tower()
+        if self.game_map.block_cell(x, y):
+            # Enemies now take other routes; every tower covers a different stretch
+            for other in self.towers.values():
+                other.path_intervals = self.game_map.get_path_coverage(other.x, other.y, other.range)
+            self.tower_scheduler.reschedule_all()
+        else:
+            tower.path_intervals = self.game_map.get_path_coverage(x, y, tower.range)
         
         return {
             "success": True,
@@ -151,33 +193,57 @@ class Game:
         if not player.spend_money(upgrade_cost):
             return {"success": False, "message": f"Not enough money (need {upgrade_cost})"}
         
+        old_range = tower.range
         if not tower.upgrade(upgrade_path):
             return {"success": False, "message": "Cannot upgrade further"}
         
+        if tower.range != old_range:
+            tower.path_intervals = self.game_map.get_path_coverage(tower.x, tower.y, tower.range)
+        self.tower_scheduler.reschedule(tower)  # New cooldown, maybe new coverage
+        
         return {
             "success": True,
             "message": "Tower upgraded",
             "tower": tower.to_dict()
         }
     
+    def set_tower_targeting(self, player_id: str, tower_id: str, policy: str) -> Dict:
+        """
+        Change a tower's targeting policy
+        Returns result dict with success status
+        """
+        if player_id not in self.players:
+            return {"success": False, "message": "Player not found"}
+        
+        if tower_id not in self.towers:
+            return {"success": False, "message": "Tower not found"}
+        
+        tower = self.towers[tower_id]
+        if not tower.set_targeting(policy):
+            return {"success": False, "message": f"Unknown targeting policy: {policy}"}
+        
+        return {
+            "success": True,
+            "message": "Targeting changed",
+            "tower": tower.to_dict()
+        }
+    
     def update(self, delta_time: float = None):
         """
         Update game state
         Called regularly to advance game logic
         """
-        if not self.game_started or self.game_over:
+        if not self.game_started or self.game_over or self.paused_at is not None:
             return
         
-        current_time = time.time()
+        current_time = self.clock()
         if delta_time is None:
             delta_time = current_time - self.last_update_time
         self.last_update_time = current_time
-        
-        # Clear old attacks
-        self.recent_attacks = []
+        self.tick += 1
         
         # Spawn enemies
-        if self.wave_in_progress and self.enemies_to_spawn:
+        if self.wave_in_progress and self.wave_director.pending:
             self._spawn_enemies(current_time)
         
         # Move enemies
@@ -187,7 +253,7 @@ class Game:
         self._update_towers(current_time)
         
         # Check wave completion
-        if self.wave_in_progress and not self.enemies_to_spawn and not self.enemies:
+        if self.wave_in_progress and not self.wave_director.pending and not self.enemies:
             self._end_wave()
         
         # Start next wave if ready
@@ -196,25 +262,27 @@ class Game:
             if time_since_wave >= self.time_between_waves:
                 self.start_next_wave()
         
+        # Settle shared rewards and damage into every player once per tick
+        self.ledger.settle(self.players.values())
+        
         # Check game over
         self._check_game_over()
     
     def _spawn_enemies(self, current_time: float):
-        """Spawn enemies from the queue"""
+        """Spawn the enemies that are due, at most max_spawns_per_tick"""
         wave_time = current_time - self.wave_start_time
-        
-        # Spawn enemies whose time has come
-        enemies_to_remove = []
-        for enemy_data in self.enemies_to_spawn:
-            if wave_time >= enemy_data["spawn_time"]:
-                enemy_id = str(uuid.uuid4())
-                path = self.game_map.get_enemy_path_coords()
-                enemy = create_enemy(enemy_data["type"], enemy_id, path, current_time)
-                self.enemies[enemy_id] = enemy
-                enemies_to_remove.append(enemy_data)
-        
-        for enemy_data in enemies_to_remove:
-            self.enemies_to_spawn.remove(enemy_data)
+        routes = self.game_map.routes
+        
+        for enemy_type, health in self.wave_director.due(wave_time, self.max_spawns_per_tick):
+            enemy_id = str(uuid.uuid4())
+            route = routes[self.spawn_count % len(routes)]
+            self.spawn_count += 1
+            enemy = self.enemy_pool.acquire(enemy_type, enemy_id, route.waypoints, current_time)
+            enemy.set_route(route.id, route.offset)
+            if health != 1.0:
+                enemy.scale_health(health)
+            self.enemies[enemy_id] = enemy
+            self.enemy_index.add(enemy)
     
     def _update_enemies(self, delta_time: float, current_time: float):
         """Update all enemies"""
@@ -223,9 +291,9 @@ class Game:
         for enemy_id, enemy in self.enemies.items():
             if not enemy.is_alive:
                 enemies_to_remove.append(enemy_id)
+                self.enemies_killed += 1
                 # Reward all players
-                for player in self.players.values():
-                    player.defeat_enemy(enemy.reward)
+                self.ledger.record_kill(enemy.reward)
                 continue
             
             # Move enemy
@@ -233,45 +301,86 @@ class Game:
             
             if reached_end:
                 enemies_to_remove.append(enemy_id)
+                self.enemies_leaked += 1
                 # Enemy reached end - damage all players
-                for player in self.players.values():
-                    player.lose_life(enemy.damage)
+                self.ledger.record_leak(enemy.damage)
         
         # Remove dead/finished enemies
         for enemy_id in enemies_to_remove:
             if enemy_id in self.enemies:
-                del self.enemies[enemy_id]
+                self.enemy_pool.release(self.enemies.pop(enemy_id))
+        self.enemy_index.remove_many(set(enemies_to_remove))
+        self.enemy_index.refresh()
     
     def _update_towers(self, current_time: float):
         """Update all towers and handle attacks"""
-        enemies_list = [e for e in self.enemies.values() if e.is_alive]
+        index = self.enemy_index
+        if not index:
+            return
         
-        for tower in self.towers.values():
-            attack_result = tower.attack(enemies_list, current_time)
-            if attack_result:
-                self.recent_attacks.append(attack_result)
+        resolver = self.damage_resolver
+        log = self.attack_log
+        scheduler = self.tower_scheduler
+        spawn_points = [route.offset for route in self.game_map.routes]
+        # Only towers that can fire are visited: after a shot a tower waits out its
+        # cooldown, without a target it sleeps until an enemy could reach its coverage
+        for tower in scheduler.due(current_time):
+            if tower.attack(index.enemies, current_time, index, resolver, log):
+                scheduler.reschedule(tower)
+            else:
+                scheduler.idle(tower, current_time, index, spawn_points)
+        
+        # Apply every hit of this tick at once; dead enemies are rewarded next update
+        resolver.resolve()
     
     def _end_wave(self):
         """End the current wave"""
         self.wave_in_progress = False
-        self.last_wave_end_time = time.time()
+        self.last_wave_end_time = self.clock()
+        self.wave_director.end_wave(self.enemies_killed - self._wave_killed_before,
+                                    self.enemies_leaked - self._wave_leaked_before)
         
         # Bonus money for completing wave
-        for player in self.players.values():
-            player.add_money(50 + self.current_wave * 10)
-            player.add_points(100)
+        self.ledger.add_bonus(50 + self.current_wave * 10, 100)
     
     def _check_game_over(self):
         """Check if game is over"""
         if all(not player.is_active for player in self.players.values()):
             self.game_over = True
     
+    def get_placement_coverage(self, x: int, y: int, tower_type: str) -> Dict:
+        """Get how much road a tower of this type would cover if placed at (x, y)"""
+        probe = create_tower(tower_type, x, y, self.game_map.get_terrain(x, y), "preview")
+        intervals = self.game_map.get_path_coverage(x, y, probe.range)
+        return {
+            "x": x,
+            "y": y,
+            "tower_type": tower_type,
+            "range": probe.range,
+            "covered_length": sum(end - start for start, end in intervals),
+            "path_length": self.game_map.path_length,
+            "intervals": intervals
+        }
+    
+    def get_coverage_table(self, tower_type: str) -> List[List[float]]:
+        """Get covered road length for every buildable cell (0 for road cells)"""
+        table = []
+        for y in range(self.game_map.grid_size):
+            row = []
+            for x in range(self.game_map.grid_size):
+                if self.game_map.can_place_tower(x, y):
+                    row.append(self.get_placement_coverage(x, y, tower_type)["covered_length"])
+                else:
+                    row.append(0.0)
+            table.append(row)
+        return table
+    
     def get_time_to_next_wave(self) -> float:
         """Get seconds until next wave"""
         if self.wave_in_progress:
             return 0
         
-        current_time = time.time()
+        current_time = self.paused_at if self.paused_at is not None else self.clock()
         time_since_wave = current_time - self.last_wave_end_time
         return max(0, self.time_between_waves - time_since_wave)
     
@@ -287,5 +396,8 @@ class Game:
             "time_to_next_wave": self.get_time_to_next_wave(),
             "game_started": self.game_started,
             "game_over": self.game_over,
-            "recent_attacks": self.recent_attacks
+            "endless": self.endless,
+            "tick": self.tick,
+            "sim_time": self.last_update_time,  # Simulation timestamp of this state
+            "recent_attacks": self.attack_log.to_list()
         }
@@ -1,6 +1,8 @@
-from typing import List, Dict, Tuple, Set
+from typing import Iterator, List, Dict, Tuple, Set, Optional
+import math
 import random
 from enum import Enum
+from models.flow_field import FlowField
 
 
 class TerrainType(Enum):
@@ -10,57 +12,234 @@ class TerrainType(Enum):
     ROAD = "road"
 
 
+# Step cost multipliers when enemies walk off-road in maze mode; None is impassable
+MAZE_TERRAIN_COST = {
+    TerrainType.ROAD: 1.0,
+    TerrainType.PLAINS: 1.5,
+    TerrainType.MOUNTAIN: None,
+    TerrainType.LAKE: None,
+}
+
+ROUTE_GAP = 1.0  # Space between routes in the shared progress space
+
+
+class Route:
+    """
+    One way from a spawn to an exit, shared by every enemy spawned there
+    Enemy.distance_traveled is measured along it; offset places the route in
+    the map-wide progress space so enemies of all routes fit in one sorted index
+    """
+    
+    def __init__(self, route_id: int, cells: List[Tuple[int, int]], offset: float = 0.0):
+        self.id = route_id
+        self.cells = cells
+        self.cell_set = set(cells)
+        self.offset = offset
+        self.waypoints: List[Dict[str, float]] = [{"x": x + 0.5, "y": y + 0.5} for x, y in cells]  # Never mutated
+        self.arc_lengths: List[float] = [0.0]
+        for prev, cur in zip(self.waypoints, self.waypoints[1:]):
+            segment = math.hypot(cur["x"] - prev["x"], cur["y"] - prev["y"])
+            self.arc_lengths.append(self.arc_lengths[-1] + segment)
+        self.length = self.arc_lengths[-1]
+    
+    def compute_coverage(self, x: float, y: float, radius: float) -> List[Tuple[float, float]]:
+        """
+        Get the arc-length intervals of the route within radius of (x, y)
+        An enemy on this route is in range exactly when its distance_traveled
+        lies in one of the returned sorted, non-overlapping [start, end] intervals
+        """
+        waypoints = self.waypoints
+        lengths = self.arc_lengths
+        radius_sq = radius * radius
+        intervals: List[Tuple[float, float]] = []
+        
+        if len(waypoints) == 1:
+            dx = waypoints[0]["x"] - x
+            dy = waypoints[0]["y"] - y
+            if dx * dx + dy * dy <= radius_sq:
+                intervals.append((0.0, 0.0))
+        
+        for i in range(1, len(waypoints)):
+            segment = lengths[i] - lengths[i - 1]
+            if segment <= 0:
+                continue
+            x0, y0 = waypoints[i - 1]["x"], waypoints[i - 1]["y"]
+            ux = (waypoints[i]["x"] - x0) / segment
+            uy = (waypoints[i]["y"] - y0) / segment
+            fx, fy = x0 - x, y0 - y
+            
+            # Solve |p0 + u*t - c|^2 <= r^2 for t along the segment
+            b = fx * ux + fy * uy
+            discriminant = b * b - (fx * fx + fy * fy - radius_sq)
+            if discriminant < 0:
+                continue
+            root = math.sqrt(discriminant)
+            t_start = max(0.0, -b - root)
+            t_end = min(segment, -b + root)
+            if t_start > t_end:
+                continue
+            
+            start = lengths[i - 1] + t_start
+            end = lengths[i - 1] + t_end
+            if intervals and start <= intervals[-1][1] + 1e-9:
+                intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end))
+            else:
+                intervals.append((start, end))
+        
+        return intervals
+    
+    def to_dict(self) -> List[Dict[str, int]]:
+        return [{"x": x, "y": y} for x, y in self.cells]
+
+
 class GameMap:
-    """Manages the game map with terrain and pathfinding"""
+    """
+    Manages the game map with terrain and pathfinding
+    Enemies follow routes traced from a flow field towards the exits. Normally
+    the field runs along the generated roads only; in maze mode enemies may
+    cross plains too and towers block cells, rerouting everyone around them
+    """
     
-    def __init__(self, grid_size: int = 20, cell_size: int = 30):
+    def __init__(self, grid_size: int = 20, cell_size: int = 30, seed: Optional[int] = None,
+                 roads: int = 1, maze: bool = False):
         self.grid_size = grid_size
         self.cell_size = cell_size
+        self.seed = seed
+        self.roads = roads
+        self.maze = maze
+        self.rng = random.Random(seed)  # Seeded maps are reproducible
         self.terrain: List[List[TerrainType]] = []
-        self.road_path: List[Tuple[int, int]] = []
+        self.road_paths: List[List[Tuple[int, int]]] = []  # One per road, spawn first
+        self.road_path: List[Tuple[int, int]] = []  # The first road
         self.start_pos: Tuple[int, int] = (0, 0)
         self.end_pos: Tuple[int, int] = (0, 0)
+        self.spawns: List[Tuple[int, int]] = []
+        self.exits: List[Tuple[int, int]] = []
+        
+        # Pathing: one shared field, one route per spawn, geometry in the same
+        # units as Enemy.distance_traveled
+        self.flow_field: Optional[FlowField] = None
+        self._road_graph: Dict[Tuple[int, int], List[Tuple[Tuple[int, int], float]]] = {}
+        self.routes: List[Route] = []
+        self.path_length = 0.0  # Total length of all routes
+        self._coverage_cache: Dict[Tuple[int, int, float], List[Tuple[float, float]]] = {}
         
         self._generate_map()
     
+    def __getstate__(self):
+        # The coverage cache is rebuilt on demand, no need to snapshot it
+        state = self.__dict__.copy()
+        state["_coverage_cache"] = {}
+        return state
+    
     def _generate_map(self):
         """Generate the entire map with road, mountains, and lakes"""
         # Initialize with plains
         self.terrain = [[TerrainType.PLAINS for _ in range(self.grid_size)] 
                        for _ in range(self.grid_size)]
         
-        # Generate road
-        self._generate_road()
+        # Generate roads
+        for _ in range(max(1, self.roads)):
+            self._generate_road()
+        self.road_path = self.road_paths[0]
+        self.start_pos = self.road_path[0]
+        self.end_pos = self.road_path[-1]
         
         # Add mountains and lakes
         self._generate_terrain_features()
+        
+        self.spawns = list(dict.fromkeys(path[0] for path in self.road_paths))
+        self.exits = list(dict.fromkeys(path[-1] for path in self.road_paths))
+        self._build_road_graph()
+        self.flow_field = FlowField(self.exits, self._maze_neighbors if self.maze else self._road_neighbors)
+        self._build_routes()
+    
+    def _build_road_graph(self):
+        """Adjacency between consecutive road cells, which may be diagonal"""
+        graph = self._road_graph = {}
+        for path in self.road_paths:
+            for a, b in zip(path, path[1:]):
+                if a == b:
+                    continue
+                cost = math.hypot(b[0] - a[0], b[1] - a[1])
+                graph.setdefault(a, []).append((b, cost))
+                graph.setdefault(b, []).append((a, cost))
+    
+    def _road_neighbors(self, cell: Tuple[int, int]) -> List[Tuple[Tuple[int, int], float]]:
+        """Neighbour function walking only along the generated roads"""
+        return self._road_graph.get(cell, [])
+    
+    def _maze_neighbors(self, cell: Tuple[int, int]) -> Iterator[Tuple[Tuple[int, int], float]]:
+        """Neighbour function for maze mode: the roads plus any passable cell, roads being cheaper"""
+        yield from self._road_graph.get(cell, ())
+        x, y = cell
+        here = MAZE_TERRAIN_COST[self.terrain[y][x]]
+        if here is None:
+            return
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
+                there = MAZE_TERRAIN_COST[self.terrain[ny][nx]]
+                if there is not None:
+                    yield (nx, ny), (here + there) / 2
+    
+    def _build_routes(self):
+        """Trace one route per spawn through the flow field and lay them out in progress space"""
+        self.routes = []
+        offset = 0.0
+        for route_id, spawn in enumerate(self.spawns):
+            route = Route(route_id, self.flow_field.trace(spawn) or [spawn], offset)
+            self.routes.append(route)
+            offset += route.length + ROUTE_GAP
+        self.path_length = sum(route.length for route in self.routes)
+        self._coverage_cache = {}
     
     def _generate_road(self):
         """Generate a random road from one side to another"""
         # Randomly choose start and end sides
         sides = ["top", "bottom", "left", "right"]
-        start_side = random.choice(sides)
+        start_side = self.rng.choice(sides)
         
         # Remove opposite side from end choices for variety
         opposite = {"top": "bottom", "bottom": "top", "left": "right", "right": "left"}
-        end_side = random.choice([s for s in sides if s != start_side])
+        end_side = self.rng.choice([s for s in sides if s != start_side])
         
         # Get start and end positions
-        self.start_pos = self._get_edge_position(start_side)
-        self.end_pos = self._get_edge_position(end_side)
+        start_pos = self._get_edge_position(start_side)
+        end_pos = self._get_edge_position(end_side)
+        
+        # Extra roads keep their spawn far from every exit and vice versa,
+        # falling back to the first road's exit
+        if self.road_paths:
+            spawns = [path[0] for path in self.road_paths]
+            exits = [path[-1] for path in self.road_paths]
+            for _ in range(50):
+                if (self._far_from(start_pos, exits + [end_pos]) and self._far_from(end_pos, spawns)
+                        and start_pos not in spawns and end_pos not in exits):
+                    break
+                start_side = self.rng.choice(sides)
+                end_side = self.rng.choice([s for s in sides if s != start_side])
+                start_pos = self._get_edge_position(start_side)
+                end_pos = self._get_edge_position(end_side)
+            else:
+                end_pos = exits[0]
         
         # Generate path using A* or simple pathfinding
-        self.road_path = self._generate_path(self.start_pos, self.end_pos)
+        road_path = self._generate_path(start_pos, end_pos)
+        self.road_paths.append(road_path)
         
         # Mark road cells in terrain
-        for x, y in self.road_path:
+        for x, y in road_path:
             if 0 <= x < self.grid_size and 0 <= y < self.grid_size:
                 self.terrain[y][x] = TerrainType.ROAD
     
+    def _far_from(self, cell: Tuple[int, int], others: List[Tuple[int, int]]) -> bool:
+        """At least half the grid (Manhattan) away from all others"""
+        return all(abs(cell[0] - x) + abs(cell[1] - y) >= self.grid_size // 2 for x, y in others)
+    
     def _get_edge_position(self, side: str) -> Tuple[int, int]:
         """Get a random position on the specified edge"""
         mid = self.grid_size // 2
-        offset = random.randint(-3, 3)
+        offset = self.rng.randint(-3, 3)
         
         if side == "top":
             return (mid + offset, 0)
@@ -90,7 +269,7 @@ class GameMap:
             dy = 1 if ey > cy else (-1 if ey < cy else 0)
             
             # Randomly choose to move in x or y direction (with bias towards goal)
-            if random.random() < 0.7:  # 70% chance to move towards goal
+            if self.rng.random() < 0.7:  # 70% chance to move towards goal
                 if abs(ex - cx) > abs(ey - cy):
                     next_pos = (cx + dx, cy)
                 elif abs(ey - cy) > 0:
@@ -100,10 +279,10 @@ class GameMap:
             else:
                 # Random perpendicular movement for curves
                 if dx != 0:
-                    dy_rand = random.choice([-1, 0, 1])
+                    dy_rand = self.rng.choice([-1, 0, 1])
                     next_pos = (cx + dx, cy + dy_rand)
                 else:
-                    dx_rand = random.choice([-1, 0, 1])
+                    dx_rand = self.rng.choice([-1, 0, 1])
                     next_pos = (cx + dx_rand, cy + dy)
             
             # Validate position
@@ -129,12 +308,12 @@ class GameMap:
                     available_cells.append((x, y))
         
         # Add 3-5 mountain clusters
-        num_mountain_clusters = random.randint(3, 5)
+        num_mountain_clusters = self.rng.randint(3, 5)
         for _ in range(num_mountain_clusters):
             self._add_terrain_cluster(TerrainType.MOUNTAIN, available_cells, cluster_size=3)
         
         # Add 2-4 lake clusters
-        num_lake_clusters = random.randint(2, 4)
+        num_lake_clusters = self.rng.randint(2, 4)
         for _ in range(num_lake_clusters):
             self._add_terrain_cluster(TerrainType.LAKE, available_cells, cluster_size=2)
     
@@ -144,7 +323,7 @@ class GameMap:
             return
         
         # Pick a random starting point
-        center = random.choice(available_cells)
+        center = self.rng.choice(available_cells)
         cx, cy = center
         
         # Add center
@@ -156,7 +335,7 @@ class GameMap:
             for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]:
                 nx, ny = cx + dx, cy + dy
                 if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
-                    if self.terrain[ny][nx] != TerrainType.ROAD and random.random() < 0.4:
+                    if self.terrain[ny][nx] != TerrainType.ROAD and self.rng.random() < 0.4:
                         self.terrain[ny][nx] = terrain_type
     
     def get_terrain(self, x: int, y: int) -> TerrainType:
@@ -169,20 +348,72 @@ class GameMap:
         """Check if a tower can be placed at this position"""
         if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
             return False
-        return self.terrain[y][x] != TerrainType.ROAD
+        if not self.maze:
+            return self.terrain[y][x] != TerrainType.ROAD
+        
+        # In maze mode towers go anywhere that leaves every spawn a way out
+        cell = (x, y)
+        if cell in self.spawns or cell in self.exits or cell in self.flow_field.blocked:
+            return False
+        # Cells off every route can go without touching the routes
+        if all(cell not in route.cell_set for route in self.routes):
+            return True
+        return self._spawns_connected_without(cell)
     
-    def get_enemy_path_coords(self) -> List[Dict[str, float]]:
+    def _spawns_connected_without(self, blocked: Tuple[int, int]) -> bool:
+        """Whether every spawn could still reach an exit if blocked were impassable"""
+        field = self.flow_field
+        seen = {cell for cell in self.exits if cell not in field.blocked}
+        stack = list(seen)
+        while stack:
+            for neighbor, _ in self._maze_neighbors(stack.pop()):
+                if neighbor not in seen and neighbor != blocked and neighbor not in field.blocked:
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        return all(spawn in seen for spawn in self.spawns)
+    
+    def block_cell(self, x: int, y: int) -> bool:
         """
-        Get the path coordinates for enemies to follow
-        Returns list of waypoints with pixel coordinates
+        Mark a maze cell as taken by a tower and reroute
+        Returns True if the routes changed (tower coverage must be recomputed)
         """
-        waypoints = []
-        for x, y in self.road_path:
-            waypoints.append({
-                "x": x + 0.5,  # Center of cell
-                "y": y + 0.5
-            })
-        return waypoints
+        if not self.maze:
+            return False
+        field = self.flow_field
+        was_walkable = field.is_reachable((x, y))
+        field.block((x, y))
+        if not was_walkable:
+            return False
+        
+        old_cells = [route.cells for route in self.routes]
+        self._build_routes()
+        return [route.cells for route in self.routes] != old_cells
+    
+    def get_path_coverage(self, x: float, y: float, radius: float) -> List[Tuple[float, float]]:
+        """Cached compute_path_coverage, for fixed positions such as tower cells"""
+        key = (x, y, radius)
+        cached = self._coverage_cache.get(key)
+        if cached is None:
+            cached = self.compute_path_coverage(x, y, radius)
+            self._coverage_cache[key] = cached
+        return cached
+    
+    def compute_path_coverage(self, x: float, y: float, radius: float) -> List[Tuple[float, float]]:
+        """
+        Get the intervals of all routes within radius of (x, y), in progress space
+        (route offset + distance_traveled). Intervals are ordered by how far their
+        end is from the route's exit, closest last; on a single route that is
+        simply ascending
+        """
+        if len(self.routes) == 1:
+            return self.routes[0].compute_coverage(x, y, radius)
+        
+        keyed = []
+        for route in self.routes:
+            for start, end in route.compute_coverage(x, y, radius):
+                keyed.append((route.length - end, route.offset + start, route.offset + end))
+        keyed.sort(key=lambda item: -item[0])
+        return [(start, end) for _, start, end in keyed]
     
     def to_dict(self) -> Dict:
         """Convert map to dictionary for serialization"""
@@ -192,5 +423,8 @@ class GameMap:
             "terrain": [[cell.value for cell in row] for row in self.terrain],
             "road_path": [{"x": x, "y": y} for x, y in self.road_path],
             "start_pos": {"x": self.start_pos[0], "y": self.start_pos[1]},
-            "end_pos": {"x": self.end_pos[0], "y": self.end_pos[1]}
+            "end_pos": {"x": self.end_pos[0], "y": self.end_pos[1]},
+            "maze": self.maze,
+            "routes": [route.to_dict() for route in self.routes],
+            "blocked": [{"x": x, "y": y} for x, y in sorted(self.flow_field.blocked)]
         }
@@ -0,0 +1,45 @@
+from typing import Iterable
+from models.player import Player
+
+
+class TeamLedger:
+    """
+    Team-wide rewards and leak damage accumulated once per event
+    Every player in a room shares kills, leaks and wave bonuses, so the game
+    records each event here and settles the totals into players once per tick
+    """
+    
+    def __init__(self):
+        self.money = 0
+        self.points = 0
+        self.kills = 0
+        self.damage = 0
+    
+    def record_kill(self, reward: int, points: int = None):
+        """An enemy was defeated"""
+        self.money += reward
+        self.points += reward if points is None else points
+        self.kills += 1
+    
+    def record_leak(self, damage: int):
+        """An enemy reached the end of the road"""
+        self.damage += damage
+    
+    def add_bonus(self, money: int, points: int):
+        """Team-wide bonus, e.g. for completing a wave"""
+        self.money += money
+        self.points += points
+    
+    def has_pending(self) -> bool:
+        return bool(self.money or self.points or self.kills or self.damage)
+    
+    def settle(self, players: Iterable[Player]):
+        """Apply the accumulated totals to every player and start over"""
+        if not self.has_pending():
+            return
+        for player in players:
+            player.settle(self.money, self.points, self.kills, self.damage)
+        self.money = 0
+        self.points = 0
+        self.kills = 0
+        self.damage = 0
@@ -46,6 +46,14 @@ class Player:
         self.add_points(points)
         self.enemies_defeated += 1
     
+    def settle(self, money: int, points: int, kills: int, damage: int):
+        """Apply a tick's worth of shared team rewards and leak damage at once"""
+        self.add_money(money)
+        self.add_points(points)
+        self.enemies_defeated += kills
+        if damage:
+            self.lose_life(damage)
+    
     def build_tower(self):
         """Called when player builds a tower"""
         self.towers_built += 1
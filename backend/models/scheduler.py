@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List, Tuple
+from bisect import bisect_left
+import heapq
+from models.enemy import ENEMY_CLASSES, Enemy
+from models.enemy_index import ProgressIndex
+from models.tower import Tower
+
+# Slack when popping towers off the heap, so rounding never delays a shot;
+# Tower.attack still applies the exact cooldown check
+READY_EPSILON = 1e-6
+
+# No enemy gains progress faster than this (cells per second)
+MAX_ENEMY_SPEED = max(enemy_class.speed for enemy_class in (Enemy, *ENEMY_CLASSES.values()))
+
+
+class TowerScheduler:
+    """
+    Towers ordered by the time they can fire next
+    Towers on cooldown wait in a heap keyed by last_attack_time + attack_cooldown
+    and are not looked at until that time comes. A ready tower without a target
+    sleeps in the same heap until the nearest enemy (or a fresh spawn) could
+    reach its road coverage at full speed. Towers are handed out in placement
+    order so a tick plays out exactly as if every tower had been visited
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []  # (wake time, placement order, tower id)
+        self._ready_at: Dict[str, float] = {}  # Current heap key per waiting tower; older entries are stale
+        self._ready: Dict[str, Tower] = {}
+        self._towers: Dict[str, Tower] = {}
+        self._order: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._towers)
+
+    def add(self, tower: Tower):
+        """Schedule a newly placed tower"""
+        self._order[tower.id] = len(self._order)
+        self._towers[tower.id] = tower
+        self.reschedule(tower)
+
+    def reschedule(self, tower: Tower):
+        """Queue a tower for the end of its cooldown, after it fired or its stats or coverage changed"""
+        self._wait(tower, tower.last_attack_time + tower.stats.attack_cooldown)
+
+    def reschedule_all(self):
+        for tower in self._towers.values():
+            self.reschedule(tower)
+
+    def idle(self, tower: Tower, current_time: float, index: ProgressIndex, spawn_points: Iterable[float]):
+        """A ready tower found no target; let it sleep while nothing can enter its coverage"""
+        if tower.path_intervals is None:
+            return
+        gap = self._coverage_gap(tower.path_intervals, index.progress, spawn_points)
+        if gap > 0:
+            self._wait(tower, current_time + gap / MAX_ENEMY_SPEED)
+
+    def due(self, current_time: float) -> List[Tower]:
+        """Towers that may fire at current_time, in placement order"""
+        heap = self._heap
+        limit = current_time + READY_EPSILON
+        while heap and heap[0][0] <= limit:
+            ready_at, _, tower_id = heapq.heappop(heap)
+            if self._ready_at.get(tower_id) == ready_at:
+                del self._ready_at[tower_id]
+                self._ready[tower_id] = self._towers[tower_id]
+        if len(self._ready) > 1:
+            order = self._order
+            return sorted(self._ready.values(), key=lambda tower: order[tower.id])
+        return list(self._ready.values())
+
+    def _wait(self, tower: Tower, ready_at: float):
+        self._ready.pop(tower.id, None)
+        self._ready_at[tower.id] = ready_at
+        heapq.heappush(self._heap, (ready_at, self._order[tower.id], tower.id))
+
+    @staticmethod
+    def _coverage_gap(intervals: List[Tuple[float, float]], progress: List[float],
+                      spawn_points: Iterable[float]) -> float:
+        """Shortest road distance from an enemy or spawn point behind the coverage to its start; 0 if inside"""
+        gap = float("inf")
+        for start, end in intervals:
+            i = bisect_left(progress, start)
+            if i < len(progress) and progress[i] <= end:
+                return 0.0
+            if i > 0:
+                gap = min(gap, start - progress[i - 1])
+        for point in spawn_points:
+            for start, end in intervals:
+                if start <= point <= end:
+                    return 0.0
+                if point < start:
+                    gap = min(gap, start - point)
+        # Stay a hair early so rounding in enemy movement can never make the tower late
+        return max(0.0, gap - 1e-6)
@@ -1,6 +1,9 @@
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, NamedTuple, Optional, Tuple
 from enum import Enum
+from itertools import islice
+import heapq
 import math
+from models.attack_log import AttackRecord
 
 
 class TerrainType(Enum):
@@ -10,6 +13,18 @@ class TerrainType(Enum):
     ROAD = "road"
 
 
+TARGETING_POLICIES = ("first", "last", "strongest", "closest")
+
+
+class TowerStats(NamedTuple):
+    """Level-adjusted stats of a tower, rebuilt whenever its base stats or level change"""
+    damage: float
+    range: float
+    range_sq: float  # For distance checks without a square root
+    attack_speed: float  # Attacks per second
+    attack_cooldown: float  # Seconds between attacks
+
+
 class TowerType(Enum):
     BASIC = "basic"
     SNIPER = "sniper"
@@ -20,6 +35,8 @@ class TowerType(Enum):
 class Tower:
     """Base tower class"""
     
+    tower_type = "basic"  # Damage type matched against enemy resistances
+    
     def __init__(self, x: int, y: int, terrain: TerrainType, tower_id: str):
         self.id = tower_id
         self.x = x
@@ -30,14 +47,39 @@ class Tower:
         self.last_attack_time = 0
         self.target = None
         
+        # Arc-length intervals of the road within range, set by the game on placement/upgrade
+        self.path_intervals: Optional[List[Tuple[float, float]]] = None
+        
+        # Targeting
+        self.targeting = "first"  # One of TARGETING_POLICIES
+        self.max_targets = 1
+        
         # Base stats (will be modified by subclasses and terrain)
         self.base_damage = 10
         self.base_range = 3
         self.base_attack_speed = 1.0  # attacks per second
         self.cost = 100
+        self.stats: TowerStats = None
         
         self._apply_terrain_bonuses()
     
+    def __getstate__(self):
+        # Derived stats are rebuilt on load rather than stored in snapshots
+        state = self.__dict__.copy()
+        state["stats"] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._refresh_stats()
+    
+    def _refresh_stats(self):
+        """Recompute the derived stats; call after changing base stats or level"""
+        damage = self.base_damage * (1 + 0.2 * (self.level - 1))
+        tower_range = self.base_range * (1 + 0.1 * (self.level - 1))
+        attack_speed = self.base_attack_speed * (1 + 0.15 * (self.level - 1))
+        self.stats = TowerStats(damage, tower_range, tower_range * tower_range, attack_speed, 1.0 / attack_speed)
+    
     def _apply_terrain_bonuses(self):
         """Apply terrain-specific bonuses"""
         if self.terrain == TerrainType.MOUNTAIN:
@@ -46,27 +88,28 @@ class Tower:
         elif self.terrain == TerrainType.LAKE:
             self.base_damage *= 1.5  # High damage on lakes
             self.base_attack_speed *= 0.6  # Slower attack speed
+        self._refresh_stats()
     
     @property
     def damage(self) -> float:
-        return self.base_damage * (1 + 0.2 * (self.level - 1))
+        return self.stats.damage
     
     @property
     def range(self) -> float:
-        return self.base_range * (1 + 0.1 * (self.level - 1))
+        return self.stats.range
     
     @property
     def attack_speed(self) -> float:
-        return self.base_attack_speed * (1 + 0.15 * (self.level - 1))
+        return self.stats.attack_speed
     
     @property
     def attack_cooldown(self) -> float:
         """Time between attacks in seconds"""
-        return 1.0 / self.attack_speed
+        return self.stats.attack_cooldown
     
     def can_attack(self, current_time: float) -> bool:
         """Check if tower can attack based on cooldown"""
-        return (current_time - self.last_attack_time) >= self.attack_cooldown
+        return (current_time - self.last_attack_time) >= self.stats.attack_cooldown
     
     def get_distance(self, enemy_x: float, enemy_y: float) -> float:
         """Calculate distance to an enemy"""
@@ -74,41 +117,86 @@ class Tower:
     
     def is_in_range(self, enemy_x: float, enemy_y: float) -> bool:
         """Check if enemy is in range"""
-        return self.get_distance(enemy_x, enemy_y) <= self.range
+        dx = self.x - enemy_x
+        dy = self.y - enemy_y
+        return dx * dx + dy * dy <= self.stats.range_sq
     
-    def attack(self, enemies: List, current_time: float) -> Optional[Dict]:
+    def iter_targets(self, index, furthest_first: bool = True) -> Iterator:
+        """
+        Lazily yield living enemies inside the cached path coverage
+        index is the game's ProgressIndex of enemies sorted by distance_traveled
+        """
+        intervals = reversed(self.path_intervals) if furthest_first else self.path_intervals
+        enemies = index.enemies
+        for start, end in intervals:
+            span = index.span(start, end)
+            for i in (reversed(span) if furthest_first else span):
+                if enemies[i].is_alive:
+                    yield enemies[i]
+    
+    def select_targets(self, candidates: Iterator, count: int = 1) -> List:
+        """Pick up to count targets from furthest-first candidates using the targeting policy"""
+        if self.targeting == "first":
+            return list(islice(candidates, count))
+        if self.targeting == "last":
+            return list(candidates)[::-1][:count]
+        if self.targeting == "strongest":
+            return heapq.nlargest(count, candidates, key=lambda e: e.current_health)
+        if self.targeting == "closest":
+            return heapq.nsmallest(count, candidates, key=lambda e: self.get_distance(e.x, e.y))
+        return list(islice(candidates, count))
+    
+    def attack(self, enemies: List, current_time: float, index=None, resolver=None,
+               log=None) -> Optional[AttackRecord]:
         """
         Attack enemies in range
-        Returns attack info if attack happened, None otherwise
+        Pass the game's ProgressIndex to use the path coverage lookup, a
+        DamageResolver to queue hits for the end of the tick instead of applying
+        them now, and an AttackLog to record the attack in a reused slot
+        Returns attack record if attack happened, None otherwise
         """
         if not self.can_attack(current_time):
             return None
         
         # Find enemies in range
-        targets = [e for e in enemies if e.is_alive and self.is_in_range(e.x, e.y)]
+        if index is not None and self.path_intervals is not None:
+            if self.targeting == "last":
+                # Walk the coverage from the back instead of reversing every candidate
+                targets = list(islice(self.iter_targets(index, furthest_first=False), self.max_targets))
+            else:
+                targets = self.select_targets(self.iter_targets(index), self.max_targets)
+        else:
+            in_range = [e for e in enemies if e.is_alive and self.is_in_range(e.x, e.y)]
+            in_range.sort(key=lambda e: e.distance_traveled, reverse=True)
+            targets = self.select_targets(iter(in_range), self.max_targets)
         
         if not targets:
             return None
         
         # Attack logic (implemented by subclasses)
-        attack_result = self._perform_attack(targets, current_time)
+        record = log.next_record() if log is not None else AttackRecord()
+        attack_result = self._perform_attack(targets, current_time, record, index, resolver)
         
         if attack_result:
             self.last_attack_time = current_time
         
         return attack_result
     
-    def _perform_attack(self, targets: List, current_time: float) -> Optional[Dict]:
+    def _hit(self, enemy, resolver=None):
+        """Damage an enemy now, or queue the hit on the resolver"""
+        if resolver is not None:
+            resolver.add_hit(enemy, self.tower_type, self.stats.damage)
+        else:
+            enemy.take_damage(self.stats.damage, self.tower_type)
+    
+    def _perform_attack(self, targets: List, current_time: float, record: AttackRecord,
+                        index=None, resolver=None) -> Optional[AttackRecord]:
         """Override in subclasses"""
         if targets:
             target = targets[0]  # Attack first enemy
-            target.take_damage(self.damage)
-            return {
-                "tower_id": self.id,
-                "type": "single",
-                "target": {"x": target.x, "y": target.y, "enemy_id": target.id},
-                "damage": self.damage
-            }
+            self._hit(target, resolver)
+            record.set_target(self.id, "single", self.stats.damage, target)
+            return record
         return None
     
     def upgrade(self, path: str = "damage") -> bool:
@@ -126,26 +214,36 @@ class Tower:
             self.base_range *= 1.3
         elif path == "speed":
             self.base_attack_speed *= 1.3
+        self._refresh_stats()
         
         return True
     
+    def set_targeting(self, policy: str) -> bool:
+        """Change which enemy the tower prefers"""
+        if policy not in TARGETING_POLICIES:
+            return False
+        self.targeting = policy
+        return True
+    
     def get_upgrade_cost(self) -> int:
         """Calculate upgrade cost"""
         return int(self.cost * 0.5 * self.level)
     
     def to_dict(self) -> Dict:
         """Convert tower to dictionary for serialization"""
+        stats = self.stats
         return {
             "id": self.id,
-            "type": self.__class__.__name__.lower().replace("tower", ""),
+            "type": self.tower_type,
             "x": self.x,
             "y": self.y,
             "terrain": self.terrain.value,
             "level": self.level,
-            "damage": self.damage,
-            "range": self.range,
-            "attack_speed": self.attack_speed,
+            "damage": stats.damage,
+            "range": stats.range,
+            "attack_speed": stats.attack_speed,
             "upgrade_path": self.upgrade_path,
+            "targeting": self.targeting,
             "cost": self.cost
         }
 
@@ -165,6 +263,8 @@ class BasicTower(Tower):
 class SniperTower(Tower):
     """Long range, low damage tower (best on mountains)"""
     
+    tower_type = "sniper"
+    
     def __init__(self, x: int, y: int, terrain: TerrainType, tower_id: str):
         super().__init__(x, y, terrain, tower_id)
         self.base_damage = 8
@@ -173,24 +273,22 @@ class SniperTower(Tower):
         self.cost = 150
         self._apply_terrain_bonuses()
     
-    def _perform_attack(self, targets: List, current_time: float) -> Optional[Dict]:
-        """Sniper targets the furthest enemy"""
+    def _perform_attack(self, targets: List, current_time: float, record: AttackRecord,
+                        index=None, resolver=None) -> Optional[AttackRecord]:
+        """Sniper shoots the enemy picked by its targeting policy (furthest by default)"""
         if targets:
-            # Find enemy furthest along the path
-            target = max(targets, key=lambda e: e.distance_traveled)
-            target.take_damage(self.damage)
-            return {
-                "tower_id": self.id,
-                "type": "sniper",
-                "target": {"x": target.x, "y": target.y, "enemy_id": target.id},
-                "damage": self.damage
-            }
+            target = targets[0]
+            self._hit(target, resolver)
+            record.set_target(self.id, "sniper", self.stats.damage, target)
+            return record
         return None
 
 
 class CannonTower(Tower):
     """High damage, slow attack tower (best on lakes)"""
     
+    tower_type = "cannon"
+    
     def __init__(self, x: int, y: int, terrain: TerrainType, tower_id: str):
         super().__init__(x, y, terrain, tower_id)
         self.base_damage = 25
@@ -201,7 +299,9 @@ class CannonTower(Tower):
 
 
 class AoETower(Tower):
-    """Area of effect tower - attacks multiple enemies"""
+    """Area of effect tower - splashes every enemy around its target"""
+    
+    tower_type = "aoe"
     
     def __init__(self, x: int, y: int, terrain: TerrainType, tower_id: str):
         super().__init__(x, y, terrain, tower_id)
@@ -212,26 +312,27 @@ class AoETower(Tower):
         self.cost = 250
         self._apply_terrain_bonuses()
     
-    def _perform_attack(self, targets: List, current_time: float) -> Optional[Dict]:
-        """AoE attacks all enemies in range"""
+    def _perform_attack(self, targets: List, current_time: float, record: AttackRecord,
+                        index=None, resolver=None) -> Optional[AttackRecord]:
+        """AoE hits every enemy within aoe_radius of the chosen target"""
         if targets:
-            # Attack all targets in range
-            hit_enemies = []
-            for target in targets[:5]:  # Max 5 enemies
-                target.take_damage(self.damage)
-                hit_enemies.append({
-                    "x": target.x,
-                    "y": target.y,
-                    "enemy_id": target.id
-                })
+            center = targets[0]
+            if index is not None and index.game_map is not None:
+                splashed = index.within(center.x, center.y, self.aoe_radius)
+            else:
+                splashed = [e for e in targets
+                            if math.hypot(e.x - center.x, e.y - center.y) <= self.aoe_radius]
             
-            return {
-                "tower_id": self.id,
-                "type": "aoe",
-                "targets": hit_enemies,
-                "damage": self.damage,
-                "radius": self.aoe_radius
-            }
+            record.tower_id = self.id
+            record.type = "aoe"
+            record.damage = self.stats.damage
+            record.center_x = center.x
+            record.center_y = center.y
+            record.radius = self.aoe_radius
+            for target in splashed:
+                self._hit(target, resolver)
+                record.add_hit(target)
+            return record
         return None
 
 
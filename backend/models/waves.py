@@ -0,0 +1,173 @@
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional, Tuple
+import random
+
+# (spawn time in seconds since the wave started, enemy type, health multiplier)
+SpawnEvent = Tuple[float, str, float]
+
+# Threat of each enemy type in endless budget units
+ENEMY_COSTS = {
+    "fast": 1.0,
+    "flying": 2.0,
+    "tank": 3.0
+}
+
+# Most enemies an endless wave spawns; budget beyond what they cost makes them tougher
+MAX_WAVE_ENEMIES = 60
+
+
+class WaveDirector(ABC):
+    """
+    Streams the spawn events of the current wave
+    Events come from a generator and are pulled only when due, so a wave
+    never exists as a list and memory stays flat however many waves are played
+    """
+
+    def __init__(self):
+        self.wave = 0
+        self._strength = 0.0
+        self._pulled = 0  # Events taken from the current wave so far
+        self._events: Iterator[SpawnEvent] = iter(())
+        self._next: Optional[SpawnEvent] = None
+
+    def __getstate__(self):
+        # Generators cannot be pickled; the wave is replayed up to the same point instead
+        state = self.__dict__.copy()
+        state["_events"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rewind()
+        self._events = self._wave_events(self.wave, self._strength)
+        for _ in range(self._pulled):
+            next(self._events, None)
+
+    @property
+    def pending(self) -> bool:
+        """Whether the current wave still has enemies to spawn"""
+        return self._next is not None
+
+    def start_wave(self, wave: int, strength: float = 0.0):
+        """Begin streaming a wave; strength is the team's current damage per second"""
+        self.wave = wave
+        self._strength = strength
+        self._pulled = 0
+        self._events = self._wave_events(wave, strength)
+        self._pull()
+
+    def end_wave(self, killed: int, leaked: int):
+        """Feedback on how the team handled the wave that just ended"""
+
+    def due(self, wave_time: float, limit: int) -> List[Tuple[str, float]]:
+        """Pop up to limit (enemy type, health multiplier) pairs whose spawn time has come"""
+        spawns = []
+        while self._next is not None and self._next[0] <= wave_time and len(spawns) < limit:
+            spawns.append((self._next[1], self._next[2]))
+            self._pull()
+        return spawns
+
+    def _pull(self):
+        self._next = next(self._events, None)
+        if self._next is not None:
+            self._pulled += 1
+
+    def _rewind(self):
+        """Restore whatever _wave_events depends on to its state at the start of the wave"""
+
+    @abstractmethod
+    def _wave_events(self, wave: int, strength: float) -> Iterator[SpawnEvent]:
+        """Spawn events of a wave in time order; replayed from the start when a snapshot is restored"""
+
+
+class ScriptedWaves(WaveDirector):
+    """The classic waves: 5 + 2 * wave enemies in fixed tiers of composition"""
+
+    def _wave_events(self, wave: int, strength: float) -> Iterator[SpawnEvent]:
+        for i in range(5 + wave * 2):
+            spawn_time = i * 1.5  # 1.5 seconds between spawns
+
+            # Enemy type distribution changes with waves
+            if wave <= 2:
+                # Early waves: mostly fast enemies
+                enemy_type = "fast" if i % 3 != 0 else "tank"
+            elif wave <= 5:
+                # Mid waves: mix of all types
+                types = ["fast", "fast", "tank", "flying"]
+                enemy_type = types[i % len(types)]
+            else:
+                # Late waves: more tanks and flying
+                types = ["fast", "tank", "tank", "flying", "flying"]
+                enemy_type = types[i % len(types)]
+
+            yield spawn_time, enemy_type, 1.0
+
+
+class EndlessWaves(WaveDirector):
+    """
+    Procedural waves without an end
+    Each wave gets a threat budget that grows with the wave number and is
+    scaled by the team's damage output and by how the previous waves went.
+    Past the scripted tiers enemies also get tougher with every wave. A wave
+    spawns at most MAX_WAVE_ENEMIES: when the budget would buy more, it goes
+    into their health instead, so the number of live enemies stays bounded
+    on long runs while the threat keeps growing
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.pressure = 1.0  # Raised while the team clears waves cleanly, lowered on leaks
+        self._wave_rng_state = self.rng.getstate()
+        self._wave_pressure = self.pressure  # end_wave changes pressure before the next wave starts
+
+    def start_wave(self, wave: int, strength: float = 0.0):
+        self._wave_rng_state = self.rng.getstate()
+        self._wave_pressure = self.pressure
+        super().start_wave(wave, strength)
+
+    def _rewind(self):
+        self.rng.setstate(self._wave_rng_state)
+
+    def budget(self, wave: int, strength: float, pressure: Optional[float] = None) -> float:
+        """Threat budget of a wave, in ENEMY_COSTS units; pressure defaults to the current one"""
+        if pressure is None:
+            pressure = self.pressure
+        expected = 15.0 + 10.0 * wave  # Damage per second a team keeping up would have
+        strength_factor = min(2.0, max(0.75, strength / expected))
+        return (8.0 + 3.0 * wave) * strength_factor * pressure
+
+    def health_multiplier(self, wave: int) -> float:
+        return 1.0 + 0.08 * max(0, wave - 5)
+
+    def end_wave(self, killed: int, leaked: int):
+        if leaked == 0:
+            self.pressure = min(2.0, self.pressure * 1.05)
+        else:
+            self.pressure = max(0.5, self.pressure * (1.0 - min(0.3, leaked / max(1, killed + leaked))))
+
+    def _wave_events(self, wave: int, strength: float) -> Iterator[SpawnEvent]:
+        remaining = self.budget(wave, strength, self._wave_pressure)
+        health = self.health_multiplier(wave)
+        gap = max(0.3, 15.0 / (10 + wave))  # Denser waves later on
+        weights = {
+            "fast": 3.0,
+            "flying": min(3.0, wave / 4),
+            "tank": min(3.0, wave / 3)
+        }
+
+        # Spend what MAX_WAVE_ENEMIES of the usual mix would not on their health
+        mean_cost = sum(weights[t] * ENEMY_COSTS[t] for t in weights) / sum(weights.values())
+        toughness = max(1.0, remaining / (MAX_WAVE_ENEMIES * mean_cost))
+        remaining /= toughness
+        health *= toughness
+
+        spawn_time = 0.0
+        for _ in range(MAX_WAVE_ENEMIES):
+            affordable = [t for t in weights if weights[t] > 0 and ENEMY_COSTS[t] <= remaining]
+            enemy_type = self.rng.choices(affordable, [weights[t] for t in affordable])[0] if affordable else "fast"
+            yield spawn_time, enemy_type, health
+            remaining -= ENEMY_COSTS[enemy_type]
+            if remaining <= 0:
+                return
+            spawn_time += gap
@@ -0,0 +1 @@
+# Persistence package
@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import asyncio
+import logging
+import time
+
+from models.player import Player
+from persistence.store import StatsStore
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceService:
+    """
+    Write-behind persistence for player stats and match history
+    The game loop only appends to an in-memory queue; a background task
+    flushes it to the store in batches on a single worker thread and then
+    refreshes the cached leaderboard that readers are served from.
+    A player recorded again for the same match before the flush replaces
+    their queued result; once flushed, a later result is a new record
+    """
+
+    def __init__(self, store: StatsStore, batch_size: int = 100, flush_interval: float = 2.0,
+                 leaderboard_size: int = 100):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.leaderboard_size = leaderboard_size
+
+        self._pending: Dict[Tuple[str, str], Dict] = {}  # (match_id, player_id) -> queued record, oldest first
+        self._leaderboard: List[Dict] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Load the leaderboard and start the background flusher"""
+        self._wakeup = asyncio.Event()
+        self._leaderboard = await self._run(self.store.top_players, self.leaderboard_size)
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Flush what is left and close the store"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self._run(self.store.close)
+        self._executor.shutdown(wait=True)
+
+    def record_player(self, match_id: str, player: Player, wave: int):
+        """Queue a player's result for a match; never blocks"""
+        self._pending[(match_id, player.id)] = {
+            "match_id": match_id,
+            "player_id": player.id,
+            "points": player.points,
+            "money": player.money,
+            "wave": wave,
+            "enemies_defeated": player.enemies_defeated,
+            "towers_built": player.towers_built,
+            "ended_at": time.time()
+        }
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def leaderboard(self, limit: int = 10) -> List[Dict]:
+        """Top players from the cache refreshed on every flush"""
+        return self._leaderboard[:limit]
+
+    async def player_history(self, player_id: str, limit: int = 20) -> List[Dict]:
+        """A player's recent matches, read off the event loop"""
+        return await self._run(self.store.player_history, player_id, limit)
+
+    async def flush(self):
+        """Write everything queued so far in batches"""
+        while self._pending:
+            batch = [self._pending.pop(key) for key in list(islice(self._pending, self.batch_size))]
+            try:
+                await self._run(self.store.write_batch, batch)
+            except Exception as e:
+                logger.error(f"Dropping {len(batch)} stats records after write error: {e}")
+                return
+        try:
+            self._leaderboard = await self._run(self.store.top_players, self.leaderboard_size)
+        except Exception as e:
+            logger.error(f"Error refreshing leaderboard: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                await self.flush()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
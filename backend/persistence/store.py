@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List
+import sqlite3
+import threading
+
+
+class StatsStore(ABC):
+    """
+    Storage backend for player stats and match history
+    Methods are blocking; PersistenceService calls them off the event loop
+    """
+
+    @abstractmethod
+    def write_batch(self, records: List[Dict]):
+        """Persist a batch of match records and fold them into player totals"""
+
+    @abstractmethod
+    def top_players(self, limit: int) -> List[Dict]:
+        """Get the leaderboard, best total points first"""
+
+    @abstractmethod
+    def player_history(self, player_id: str, limit: int) -> List[Dict]:
+        """Get a player's most recent matches"""
+
+    def close(self):
+        """Release any resources"""
+
+
+class MemoryStore(StatsStore):
+    """In-process store, for tests and servers that do not need durable stats"""
+
+    def __init__(self):
+        self.players: Dict[str, Dict] = {}
+        self.matches: List[Dict] = []
+
+    def write_batch(self, records: List[Dict]):
+        for record in records:
+            self.matches.append(dict(record))
+            totals = self.players.setdefault(record["player_id"], {
+                "player_id": record["player_id"],
+                "matches_played": 0,
+                "total_points": 0,
+                "best_points": 0,
+                "best_wave": 0,
+                "enemies_defeated": 0,
+                "towers_built": 0,
+            })
+            totals["matches_played"] += 1
+            totals["total_points"] += record["points"]
+            totals["best_points"] = max(totals["best_points"], record["points"])
+            totals["best_wave"] = max(totals["best_wave"], record["wave"])
+            totals["enemies_defeated"] += record["enemies_defeated"]
+            totals["towers_built"] += record["towers_built"]
+
+    def top_players(self, limit: int) -> List[Dict]:
+        ranked = sorted(self.players.values(), key=lambda p: p["total_points"], reverse=True)
+        return [dict(p) for p in ranked[:limit]]
+
+    def player_history(self, player_id: str, limit: int) -> List[Dict]:
+        history = [m for m in self.matches if m["player_id"] == player_id]
+        return history[-limit:][::-1]
+
+
+class SQLiteStore(StatsStore):
+    """SQLite-backed store for local deployments"""
+
+    def __init__(self, path: str = "tower_defense.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS player_stats (
+                player_id TEXT PRIMARY KEY,
+                matches_played INTEGER NOT NULL DEFAULT 0,
+                total_points INTEGER NOT NULL DEFAULT 0,
+                best_points INTEGER NOT NULL DEFAULT 0,
+                best_wave INTEGER NOT NULL DEFAULT 0,
+                enemies_defeated INTEGER NOT NULL DEFAULT 0,
+                towers_built INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_player_stats_points ON player_stats (total_points DESC);
+            CREATE TABLE IF NOT EXISTS match_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                match_id TEXT NOT NULL,
+                player_id TEXT NOT NULL,
+                points INTEGER NOT NULL,
+                money INTEGER NOT NULL,
+                wave INTEGER NOT NULL,
+                enemies_defeated INTEGER NOT NULL,
+                towers_built INTEGER NOT NULL,
+                ended_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_match_history_player ON match_history (player_id, id DESC);
+        """)
+        self._conn.commit()
+
+    def write_batch(self, records: List[Dict]):
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO match_history
+                    (match_id, player_id, points, money, wave, enemies_defeated, towers_built, ended_at)
+                VALUES
+                    (:match_id, :player_id, :points, :money, :wave, :enemies_defeated, :towers_built, :ended_at)
+            """, records)
+            self._conn.executemany("""
+                INSERT INTO player_stats
+                    (player_id, matches_played, total_points, best_points, best_wave, enemies_defeated, towers_built)
+                VALUES
+                    (:player_id, 1, :points, :points, :wave, :enemies_defeated, :towers_built)
+                ON CONFLICT (player_id) DO UPDATE SET
+                    matches_played = matches_played + 1,
+                    total_points = total_points + excluded.total_points,
+                    best_points = MAX(best_points, excluded.best_points),
+                    best_wave = MAX(best_wave, excluded.best_wave),
+                    enemies_defeated = enemies_defeated + excluded.enemies_defeated,
+                    towers_built = towers_built + excluded.towers_built
+            """, records)
+
+    def top_players(self, limit: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM player_stats ORDER BY total_points DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def player_history(self, player_id: str, limit: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM match_history WHERE player_id = ? ORDER BY id DESC LIMIT ?",
+                (player_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,924 @@
+from fastapi import WebSocket
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import logging
+import secrets
+import time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set
+from models.game import Game
+from metrics import ServerMetrics, resident_memory
+from delta import DeltaEncoder, FrameHistory
+from snapshots import SnapshotStore
+from game_pool import GamePool
+from backplane import NODES_CHANNEL, Backplane, node_channel, room_channel
+from actions import Action, decode_action
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOM = "default"
+
+
+def encode(message: dict) -> str:
+    """Encode an outgoing message the same way send_json would"""
+    return json.dumps(message, separators=(",", ":"))
+
+
+class RemoteSocket:
+    """
+    A connection on another node, as the room's owner sees it
+    Messages for this one connection go to that node, which passes them on;
+    broadcasts skip it and reach the node once per room through RoomRelay
+    """
+
+    def __init__(self, backplane: Backplane, node_id: str, room_id: str, player_id: str):
+        self.backplane = backplane
+        self.node_id = node_id
+        self.room_id = room_id
+        self.player_id = player_id
+
+    async def accept(self):
+        """The node accepted the connection before relaying it"""
+
+    async def send_text(self, text: str):
+        await self.backplane.publish(node_channel(self.node_id),
+                                     {"kind": "send", "room": self.room_id, "player": self.player_id}, text)
+
+    async def close(self, code: int = 1000):
+        await self.backplane.publish(node_channel(self.node_id),
+                                     {"kind": "close", "room": self.room_id, "player": self.player_id, "code": code})
+
+
+class RoomRelay:
+    """
+    The owner's side of a room that other nodes relay
+    Each player frame is published once for all relaying nodes, with the
+    keyframe and the remote players that need it, and with the players
+    attached since the previous frame so nodes know where their stream starts.
+    Spectator frames are only published while another node has spectators
+    """
+
+    def __init__(self, backplane: Backplane, room_id: str):
+        self.backplane = backplane
+        self.channel = room_channel(room_id)
+        self.attached: List[str] = []  # Remote players attached since the last frame
+        self.spectators: Dict[str, int] = {}  # Node id -> spectators watching from it
+
+    @property
+    def spectator_count(self) -> int:
+        return sum(self.spectators.values())
+
+    async def publish_frame(self, text: str, keyframe: Optional[str] = None, keyframe_for: List[str] = ()):
+        attached, self.attached = self.attached, []
+        header = {"kind": "frame", "split": len(text), "attach": attached, "keyframe_for": list(keyframe_for)}
+        await self.backplane.publish(self.channel, header, text if keyframe is None else text + keyframe)
+
+    async def publish_spectator_frame(self, text: str):
+        await self.backplane.publish(self.channel, {"kind": "spectators"}, text)
+
+    async def close(self):
+        """The room leaves this node; relaying nodes disconnect its clients so they reconnect to the next owner"""
+        await self.backplane.publish(self.channel, {"kind": "closed"})
+
+
+# WebSocket connection manager
+class ConnectionManager:
+    def __init__(self, metrics: ServerMetrics, relay: Optional[RoomRelay] = None):
+        self.metrics = metrics
+        self.relay = relay  # Where broadcasts for players on other nodes go
+        self.active_connections: Dict[str, WebSocket] = {}
+        self.needs_keyframe: Set[str] = set()  # Players whose state is not the delta base
+
+    async def connect(self, player_id: str, websocket: WebSocket):
+        await websocket.accept()
+        self.attach(player_id, websocket)
+
+    def attach(self, player_id: str, websocket: WebSocket):
+        """Start broadcasting to an already accepted connection"""
+        self.active_connections[player_id] = websocket
+        if isinstance(websocket, RemoteSocket):
+            self.relay.attached.append(player_id)
+        logger.info(f"Player {player_id} connected. Total players: {len(self.active_connections)}")
+
+    def disconnect(self, player_id: str, websocket: Optional[WebSocket] = None):
+        """Drop a player's connection; with websocket, only if a reconnect has not replaced it yet"""
+        if websocket is not None and self.active_connections.get(player_id) is not websocket:
+            return
+        self.needs_keyframe.discard(player_id)
+        if player_id in self.active_connections:
+            del self.active_connections[player_id]
+            logger.info(f"Player {player_id} disconnected. Total players: {len(self.active_connections)}")
+
+    async def send_to_player(self, player_id: str, message: dict):
+        await self.send_text_to_player(player_id, encode(message))
+
+    async def send_text_to_player(self, player_id: str, text: str):
+        if player_id in self.active_connections:
+            try:
+                await self.active_connections[player_id].send_text(text)
+                self.metrics.record_send(len(text))
+            except Exception as e:
+                logger.error(f"Error sending to {player_id}: {e}")
+                self.disconnect(player_id)
+
+    async def broadcast(self, message: dict) -> str:
+        """Broadcast message to all connected players, encoding it once; returns the encoded text"""
+        text = encode(message)
+        await self.broadcast_text(text)
+        return text
+
+    async def broadcast_text(self, text: str, keyframe: Optional[str] = None):
+        """Broadcast an already encoded message; players waiting for a keyframe get that instead"""
+        disconnected = []
+        relayed = False
+        remote_keyframes: List[str] = []
+        for player_id, connection in list(self.active_connections.items()):
+            if isinstance(connection, RemoteSocket):
+                relayed = True
+                if keyframe is not None and player_id in self.needs_keyframe:
+                    self.needs_keyframe.discard(player_id)
+                    remote_keyframes.append(player_id)
+                continue
+            try:
+                if keyframe is not None and player_id in self.needs_keyframe:
+                    self.needs_keyframe.discard(player_id)
+                    await connection.send_text(keyframe)
+                    self.metrics.record_send(len(keyframe))
+                    continue
+                await connection.send_text(text)
+                self.metrics.record_send(len(text))
+            except Exception as e:
+                logger.error(f"Error broadcasting to {player_id}: {e}")
+                disconnected.append(player_id)
+
+        for player_id in disconnected:
+            self.disconnect(player_id)
+
+        if relayed:
+            try:
+                await self.relay.publish_frame(text, keyframe if remote_keyframes else None, remote_keyframes)
+            except Exception as e:
+                logger.error(f"Error relaying a broadcast: {e}")
+
+
+class SpectatorFanout:
+    """
+    Read-only viewers of a room, fed from one shared, pre-encoded frame
+    The tick only swaps in the latest frame every few ticks; a separate task
+    delivers it to all spectators concurrently. Viewers that are still busy
+    with the previous frame simply skip to the newest one.
+    """
+
+    def __init__(self, metrics: ServerMetrics, every_n_ticks: int = 4, send_timeout: float = 2.0):
+        self.metrics = metrics
+        self.every_n_ticks = every_n_ticks
+        self.send_timeout = send_timeout
+        self.spectators: Dict[str, WebSocket] = {}
+        self.frame: Optional[str] = None
+        self._frame_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.spectators)
+
+    async def connect(self, spectator_id: str, websocket: WebSocket, init_frame: str):
+        await websocket.accept()
+        await websocket.send_text(init_frame)
+        self.spectators[spectator_id] = websocket
+        logger.info(f"Spectator {spectator_id} connected. Total spectators: {len(self.spectators)}")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._deliver_loop())
+
+    def disconnect(self, spectator_id: str):
+        if self.spectators.pop(spectator_id, None) is not None:
+            logger.info(f"Spectator {spectator_id} disconnected. Total spectators: {len(self.spectators)}")
+
+    def wants_frame(self, tick: int) -> bool:
+        """Whether this tick should feed the spectator stream"""
+        return bool(self.spectators) and tick % self.every_n_ticks == 0
+
+    def publish(self, text: str):
+        """Hand over the newest encoded frame; never waits on sockets"""
+        self.frame = text
+        self._frame_ready.set()
+
+    async def _deliver_loop(self):
+        while self.spectators:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            text = self.frame
+            await asyncio.gather(*(self._send(sid, ws, text) for sid, ws in list(self.spectators.items())))
+
+    async def _send(self, spectator_id: str, websocket: WebSocket, text: str):
+        try:
+            await asyncio.wait_for(websocket.send_text(text), timeout=self.send_timeout)
+            self.metrics.record_send(len(text))
+        except Exception as e:
+            logger.error(f"Dropping spectator {spectator_id}: {e}")
+            self.disconnect(spectator_id)
+
+
+class Room:
+    """
+    A game plus the players and spectators connected to it
+    Players get an update every broadcast_every ticks; clients interpolate
+    enemies along the road in between, so this can stay well below the tick rate.
+    Updates are game_delta messages against the previous one, with a full
+    game_update as keyframe; spectators may skip frames and always get full ones.
+    A player whose connection drops keeps their place in the game for
+    grace_period seconds and can come back with their resume token, getting
+    only the frames they missed from the room's frame history. With a relay,
+    players and spectators may also be connected through other nodes
+    """
+
+    def __init__(self, room_id: str, game: Game, metrics: ServerMetrics, broadcast_every: int = 2,
+                 grace_period: float = 30.0, relay: Optional[RoomRelay] = None,
+                 sessions: Optional[Dict[str, str]] = None):
+        self.room_id = room_id
+        self.game = game
+        self.relay = relay
+        self.broadcast_every = broadcast_every
+        self.grace_period = grace_period
+        self.deltas = DeltaEncoder()
+        self.history = FrameHistory()
+        self.state_version = 0  # Bumped by every change to the state outside of game ticks
+        self._state_reply: Optional[tuple] = None  # ((tick, version), encoded state reply)
+        self._state_replied: Set[str] = set()  # Players already sent the current reply
+        self.sessions: Dict[str, str] = dict(sessions or {})  # Player id -> resume token, kept in snapshots
+        # Players without a connection, kept in the game until this monotonic time;
+        # players of a rehydrated game get a grace period to come back too
+        self.away: Dict[str, float] = {player_id: time.monotonic() + grace_period for player_id in game.players}
+        self.players = ConnectionManager(metrics, relay)
+        self.spectators = SpectatorFanout(metrics)
+        self.tick = 0
+        # Monotonic time the room was paused at, None while it runs
+        self.paused_since: Optional[float] = time.monotonic() if game.paused_at is not None else None
+
+    @property
+    def connection_count(self) -> int:
+        remote_spectators = self.relay.spectator_count if self.relay is not None else 0
+        return len(self.players.active_connections) + len(self.spectators) + remote_spectators
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_since is not None
+
+    def pause(self):
+        """Stop ticking the game; broadcasts stop with it"""
+        if self.paused_since is None:
+            self.game.pause()
+            self.paused_since = time.monotonic()
+            logger.info(f"Room {self.room_id} paused")
+
+    def resume(self):
+        if self.paused_since is not None:
+            self.game.resume()
+            self.paused_since = None
+            logger.info(f"Room {self.room_id} resumed")
+
+    def claim(self, player_id: str, token: Optional[str]) -> Optional[str]:
+        """Resume token for a connecting player; None if the id belongs to a session with another token"""
+        current = self.sessions.get(player_id)
+        if current is not None and token != current:
+            return None
+        if current is None and player_id in self.away:
+            return None  # A held seat is only ever given back with its token
+        self.away.pop(player_id, None)
+        if current is None:
+            current = self.sessions[player_id] = secrets.token_urlsafe(16)
+        return current
+
+    def hold(self, player_id: str):
+        """A player's connection dropped; keep them in the game for the grace period"""
+        if player_id in self.game.players and player_id not in self.players.active_connections:
+            self.away[player_id] = time.monotonic() + self.grace_period
+
+    def expired_players(self, now: float) -> List[str]:
+        """Players whose grace period is over; they are forgotten by the room"""
+        expired = [player_id for player_id, deadline in self.away.items() if deadline <= now]
+        for player_id in expired:
+            del self.away[player_id]
+            self.sessions.pop(player_id, None)
+        return expired
+
+    async def join(self, player_id: str, websocket: WebSocket, token: str, last_tick: Optional[int] = None):
+        """
+        Accept a player's connection. A player still in the game who reports
+        the last tick they hold is sent the missed frames when the history
+        still has them; everyone else gets a full init
+        """
+        await websocket.accept()
+        if last_tick is not None and player_id in self.game.players:
+            frames = self.history.since(last_tick)
+            if frames is not None:
+                await websocket.send_text(encode({"type": "resumed", "room": self.room_id, "resume_token": token}))
+            # Keep going until nothing was broadcast during the last sends, then join the broadcasts
+            while frames:
+                for seq, text in frames:
+                    await websocket.send_text(text)
+                    self.players.metrics.record_send(len(text))
+                frames = self.history.after(seq)
+            if frames is not None:
+                self.players.attach(player_id, websocket)
+                logger.info(f"Player {player_id} resumed from tick {last_tick}")
+                return
+
+        self.players.attach(player_id, websocket)
+        self.game.add_player(player_id)
+        self.state_version += 1
+        await self.send_state(player_id, {**self.state_message("init"), "resume_token": token})
+
+    def state_message(self, message_type: str) -> dict:
+        return {
+            "type": message_type,
+            "room": self.room_id,
+            "state": self.game.to_dict()
+        }
+
+    async def send_state(self, player_id: str, message: dict):
+        """Send a full state to one player, who then needs a keyframe to follow the deltas"""
+        await self.players.send_to_player(player_id, message)
+        self.players.needs_keyframe.add(player_id)
+
+    async def send_current_state(self, player_id: str):
+        """
+        Answer a get_state. Requests within one tick share one encoded state,
+        and a player asking again before anything changed gets nothing new
+        """
+        key = (self.game.tick, self.state_version)
+        if self._state_reply is None or self._state_reply[0] != key:
+            self._state_reply = (key, encode({"type": "state", "state": self.game.to_dict()}))
+            self._state_replied.clear()
+        elif player_id in self._state_replied:
+            return
+        self._state_replied.add(player_id)
+        await self.players.send_text_to_player(player_id, self._state_reply[1])
+        self.players.needs_keyframe.add(player_id)
+
+    async def broadcast_state(self, message: dict):
+        """Send a full state to all players; it becomes the base of the next delta"""
+        text = encode(message)
+        self.state_version += 1
+        # Recorded before sending, so a player resuming meanwhile gets it exactly once
+        self.history.append(None, message["state"]["tick"], text)
+        await self.players.broadcast_text(text)
+        self.players.needs_keyframe.clear()
+        self.deltas.reset(message["state"])
+
+    async def broadcast_tick(self, server_time: float):
+        """Send this tick's update to players, and every few ticks to spectators"""
+        self.tick += 1
+        if not self.game.game_started:
+            return
+
+        state = None
+        full_text = None
+        if self.players.active_connections and self.tick % self.broadcast_every == 0:
+            state = self.game.to_dict()
+            delta = self.deltas.encode(state)
+            if delta is None or self.players.needs_keyframe:
+                full_text = encode({"type": "game_update", "server_time": server_time, "state": state})
+            if delta is None:
+                self.history.append(None, state["tick"], full_text)
+                await self.players.broadcast_text(full_text)
+                self.players.needs_keyframe.clear()
+            else:
+                delta_text = encode({"type": "game_delta", "server_time": server_time, **delta})
+                self.history.append(delta["base_tick"], state["tick"], delta_text)
+                await self.players.broadcast_text(delta_text, keyframe=full_text)
+
+        relay_spectators = (self.relay is not None and self.relay.spectator_count > 0
+                            and self.tick % self.spectators.every_n_ticks == 0)
+        if self.spectators.wants_frame(self.tick) or relay_spectators:
+            # Spectator ticks line up with player broadcasts, so the state is normally already built
+            if full_text is None:
+                full_text = encode({"type": "game_update", "server_time": server_time,
+                                    "state": state or self.game.to_dict()})
+            if self.spectators:
+                self.spectators.publish(full_text)
+            if relay_spectators:
+                try:
+                    await self.relay.publish_spectator_frame(full_text)
+                except Exception as e:
+                    logger.error(f"Error relaying spectator frame of room {self.room_id}: {e}")
+
+        if state is not None or full_text is not None:
+            # That frame carried every attack since the previous one
+            self.game.attack_log.reset()
+
+
+class RemoteRoom:
+    """
+    A room hosted by another node, as this node's connections see it
+    Players and spectators connect here as usual. Their joins and actions
+    go to the owner, which answers each connection through this node, and the
+    owner's frames are passed on to all local sockets of the room at once.
+    A joining player only gets broadcast frames from the first frame the
+    owner sent after attaching them, exactly like a local connection
+    """
+
+    def __init__(self, room_id: str, owner: str, backplane: Backplane, metrics: ServerMetrics,
+                 join_timeout: float = 5.0):
+        self.room_id = room_id
+        self.owner = owner
+        self.backplane = backplane
+        self.join_timeout = join_timeout
+        self.players = ConnectionManager(metrics)
+        self.joining: Dict[str, WebSocket] = {}  # Players the owner has not attached yet
+        self.spectators = SpectatorFanout(metrics)
+        self._spectator_inits: Dict[str, asyncio.Future] = {}
+        self.closed = False  # The owner gave the room up
+
+    @property
+    def connection_count(self) -> int:
+        return (len(self.players.active_connections) + len(self.joining)
+                + len(self.spectators) + len(self._spectator_inits))
+
+    async def _forward(self, kind: str, header: Dict, payload: str = ""):
+        await self.backplane.publish(node_channel(self.owner), {
+            "kind": kind,
+            "room": self.room_id,
+            "node": self.backplane.node_id,
+            **header
+        }, payload)
+
+    async def join(self, player_id: str, websocket: WebSocket, token: Optional[str], last_tick: Optional[int] = None):
+        """Accept a player's connection and have the owner join them, checking their token there"""
+        self.joining[player_id] = websocket
+        await websocket.accept()
+        await self._forward("join", {"player": player_id, "token": token, "last_tick": last_tick})
+
+    async def act(self, player_id: str, action: Action):
+        await self._forward("action", {"player": player_id}, action.model_dump_json())
+
+    async def leave(self, player_id: str, websocket: WebSocket):
+        """A player's connection dropped; the owner holds their place unless they already reconnected"""
+        if self.joining.get(player_id) is websocket:
+            del self.joining[player_id]
+        elif self.players.active_connections.get(player_id) is websocket:
+            self.players.disconnect(player_id)
+        else:
+            return
+        await self._forward("leave", {"player": player_id})
+
+    async def spectate(self, spectator_id: str, websocket: WebSocket) -> bool:
+        """Connect a spectator with the init frame from the owner; False if it did not come"""
+        init = asyncio.get_running_loop().create_future()
+        self._spectator_inits[spectator_id] = init
+        try:
+            await self._forward("spectate", {"spectator": spectator_id})
+            init_frame = await asyncio.wait_for(init, self.join_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            init_frame = None
+        finally:
+            del self._spectator_inits[spectator_id]
+        if init_frame is None:
+            return False
+        await self.spectators.connect(spectator_id, websocket, init_frame)
+        return True
+
+    async def unspectate(self, spectator_id: str):
+        self.spectators.disconnect(spectator_id)
+        await self._forward("unspectate", {"spectator": spectator_id})
+
+    async def deliver(self, header: Dict, payload: str):
+        """A message the owner published for every node relaying the room"""
+        kind = header["kind"]
+        if kind == "frame":
+            for player_id in header["attach"]:
+                websocket = self.joining.pop(player_id, None)
+                if websocket is not None:
+                    self.players.attach(player_id, websocket)
+            split = header["split"]
+            active = self.players.active_connections
+            self.players.needs_keyframe.update(p for p in header["keyframe_for"] if p in active)
+            await self.players.broadcast_text(payload[:split], payload[split:] or None)
+        elif kind == "spectators":
+            if self.spectators:
+                self.spectators.publish(payload)
+        elif kind == "closed":
+            await self.close()
+
+    async def receive(self, header: Dict, payload: str):
+        """A message the owner sent to one connection here"""
+        kind = header["kind"]
+        player_id = header.get("player")
+        if kind == "send":
+            websocket = self.joining.get(player_id)
+            if websocket is None:
+                await self.players.send_text_to_player(player_id, payload)
+                return
+            try:
+                await websocket.send_text(payload)
+                self.players.metrics.record_send(len(payload))
+            except Exception as e:
+                logger.error(f"Error sending to {player_id}: {e}")
+        elif kind == "spectator_init":
+            init = self._spectator_inits.get(header["spectator"])
+            if init is not None and not init.done():
+                init.set_result(payload or None)
+        elif kind == "close":
+            websocket = self.joining.pop(player_id, None) or self.players.active_connections.get(player_id)
+            if websocket is not None:
+                self.players.disconnect(player_id)
+                try:
+                    await websocket.close(code=header.get("code", 1000))
+                except Exception:
+                    pass
+
+    async def close(self, code: int = 1012):
+        """The owner is gone; close every connection so clients reconnect and find the next owner"""
+        self.closed = True
+        websockets = [*self.joining.values(), *self.players.active_connections.values(),
+                      *self.spectators.spectators.values()]
+        self.joining.clear()
+        for player_id in list(self.players.active_connections):
+            self.players.disconnect(player_id)
+        for spectator_id in list(self.spectators.spectators):
+            self.spectators.disconnect(spectator_id)
+        for websocket in websockets:
+            try:
+                await websocket.close(code=code)
+            except Exception:
+                pass
+
+
+class RoomCapacityError(Exception):
+    """The process holds as many rooms as its limits allow"""
+
+
+class RoomElsewhereError(Exception):
+    """The room is hosted by another node"""
+
+    def __init__(self, room_id: str, owner: str):
+        super().__init__(f"Room {room_id} is hosted by node {owner}")
+        self.owner = owner
+
+
+class RoomManager:
+    """
+    All rooms hosted by this process, and their lifecycle
+    A room nobody is connected to is paused and costs no tick time. After
+    hibernate_after seconds it is written to a compressed snapshot and dropped
+    from memory; open() brings it back where it stopped. Rooms with nothing to
+    resume, and all idle rooms when there is no snapshot store, are discarded.
+    max_rooms and max_memory cap what stays in memory: paused rooms are
+    hibernated early to stay under them, and new rooms are refused when only
+    rooms with connections are left.
+    Players who stay away past the grace period are handed to on_player_left,
+    or just removed from the game without it. New rooms take their game from
+    the warm pool when there is one.
+    With a backplane, nodes share a room directory: a room lives on the node
+    that claimed it first, and the others relay its connections as a
+    RemoteRoom, passing their actions to on_action on the owner. A room
+    leaving memory gives up its claim, so the snapshot directory must be
+    shared for another node to pick it up
+    """
+
+    def __init__(self, metrics: ServerMetrics, snapshots: Optional[SnapshotStore] = None,
+                 hibernate_after: float = 300.0, max_rooms: int = 1000,
+                 max_memory: Optional[int] = None, check_interval: float = 1.0,
+                 grace_period: float = 30.0,
+                 on_player_left: Optional[Callable[[Room, str], Awaitable[None]]] = None,
+                 pool: Optional[GamePool] = None, backplane: Optional[Backplane] = None,
+                 on_action: Optional[Callable[[Room, str, Action], Awaitable[None]]] = None):
+        self.metrics = metrics
+        self.snapshots = snapshots
+        self.pool = pool
+        self.backplane = backplane
+        self.on_action = on_action
+        self.hibernate_after = hibernate_after
+        self.grace_period = grace_period
+        self.on_player_left = on_player_left
+        self.max_rooms = max_rooms
+        self.max_memory = max_memory  # Resident bytes; None for no limit
+        self.check_interval = check_interval
+        self.rooms: Dict[str, Room] = {}
+        self.remote: Dict[str, RemoteRoom] = {}  # Rooms of other nodes with connections here
+        self._busy: Dict[str, asyncio.Future] = {}  # Rooms whose snapshot is being written or read
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshots")
+        self._task: Optional[asyncio.Task] = None
+
+    def __iter__(self) -> Iterator[Room]:
+        return iter(list(self.rooms.values()))
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self.rooms.get(room_id)
+
+    def find(self, room_id: str, relay: bool = False):
+        """
+        A room in memory here, without opening, rehydrating or claiming one.
+        A room this node relays from its owner is returned as its RemoteRoom
+        with relay, and raises RoomElsewhereError without
+        """
+        room = self.rooms.get(room_id)
+        if room is None:
+            remote = self.remote.get(room_id)
+            if remote is not None and not remote.closed:
+                if not relay:
+                    raise RoomElsewhereError(room_id, remote.owner)
+                return remote
+        return room
+
+    def active(self) -> Iterator[Room]:
+        """Rooms that are not paused, i.e. the ones the game loop ticks"""
+        return iter([room for room in self.rooms.values() if not room.paused])
+
+    def relayed(self) -> Iterator[RemoteRoom]:
+        return iter(list(self.remote.values()))
+
+    async def hibernated_count(self) -> int:
+        if self.snapshots is None:
+            return 0
+        return await self._run(len, self.snapshots)
+
+    async def start(self):
+        """Start the background task pausing and hibernating idle rooms, the warm pool and the backplane"""
+        if self.pool is not None:
+            await self.pool.start()
+        if self.backplane is not None:
+            await self.backplane.start()
+            await self.backplane.subscribe(node_channel(self.backplane.node_id), self._node_message)
+            await self.backplane.subscribe(NODES_CHANNEL, self._node_lost)
+        self._task = asyncio.create_task(self._maintain_loop())
+
+    async def stop(self):
+        """Snapshot every room that can still be resumed, so they survive a restart"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for room in self:
+            if self._resumable(room):
+                room.pause()
+                await self.hibernate(room)
+            else:
+                await self._discard(room)
+        self._executor.shutdown(wait=True)
+        if self.pool is not None:
+            await self.pool.stop()
+        if self.backplane is not None:
+            await self.backplane.stop()
+
+    async def open(self, room_id: str, relay: bool = False, **game_options):
+        """
+        Get a room, rehydrating it from its snapshot or creating it with a new
+        game for game_options if needed. The room stays paused until resumed by
+        a connection; raises RoomCapacityError when no room can be made for it.
+        A room owned by another node is returned as a RemoteRoom with relay,
+        and raises RoomElsewhereError without
+        """
+        while room_id in self._busy:
+            await self._busy[room_id]
+        room = self.rooms.get(room_id)
+        if room is not None:
+            if room.paused:
+                room.paused_since = time.monotonic()  # Not a candidate for hibernation while being joined
+            return room
+        remote = self.remote.get(room_id)
+        if remote is not None and not remote.closed:
+            if not relay:
+                raise RoomElsewhereError(room_id, remote.owner)
+            return remote
+
+        done = asyncio.get_running_loop().create_future()
+        self._busy[room_id] = done
+        try:
+            if self.backplane is not None:
+                owner = await self.backplane.claim(room_id)
+                if owner != self.backplane.node_id:
+                    if not relay:
+                        raise RoomElsewhereError(room_id, owner)
+                    remote = self.remote[room_id] = RemoteRoom(room_id, owner, self.backplane, self.metrics)
+                    await self.backplane.subscribe(room_channel(room_id), remote.deliver)
+                    logger.info(f"Relaying room {room_id} from node {owner}")
+                    return remote
+            try:
+                await self._make_capacity()
+            except RoomCapacityError:
+                if self.backplane is not None:
+                    await self.backplane.release(room_id)
+                raise
+            game = None
+            sessions = None
+            if self.snapshots is not None:
+                try:
+                    snapshot = await self._run(self.snapshots.take, room_id)
+                    if snapshot is not None:
+                        game, sessions = snapshot
+                except Exception as e:
+                    logger.error(f"Dropping unreadable snapshot of room {room_id}: {e}")
+                    await self._run(self.snapshots.delete, room_id)
+            if game is None:
+                game = await self.pool.take(**game_options) if self.pool is not None else Game(**game_options)
+                created = True
+            else:
+                created = False
+            self.remote.pop(room_id, None)  # A room this node relayed before its owner gave it up
+            relay = RoomRelay(self.backplane, room_id) if self.backplane is not None else None
+            room = Room(room_id, game, self.metrics, grace_period=self.grace_period, relay=relay, sessions=sessions)
+            self.rooms[room_id] = room
+            logger.info(f"Room {room_id} {'created' if created else 'rehydrated'}. Total rooms: {len(self.rooms)}")
+            return room
+        finally:
+            del self._busy[room_id]
+            done.set_result(None)
+
+    def release(self, room: Room):
+        """A connection left the room; pause it if it was the last one"""
+        if room.connection_count == 0:
+            room.pause()
+
+    async def _disown(self, room: Room):
+        """The room left memory; let another node take it"""
+        if room.relay is not None:
+            await room.relay.close()
+            await self.backplane.release(room.room_id)
+
+    async def hibernate(self, room: Room):
+        """Move a paused room out of memory into its snapshot"""
+        room_id = room.room_id
+        if self.rooms.get(room_id) is not room or room_id in self._busy:
+            return
+        del self.rooms[room_id]
+        if self.snapshots is None:
+            logger.info(f"Room {room_id} evicted. Total rooms: {len(self.rooms)}")
+            await self._disown(room)
+            return
+
+        done = asyncio.get_running_loop().create_future()
+        self._busy[room_id] = done
+        try:
+            # Resume tokens go along, so players can only take back their own seat
+            size = await self._run(self.snapshots.save, room_id, (room.game, room.sessions))
+            logger.info(f"Room {room_id} hibernated ({size} bytes). Total rooms: {len(self.rooms)}")
+            await self._disown(room)
+        except Exception as e:
+            logger.error(f"Error hibernating room {room_id}, keeping it in memory: {e}")
+            self.rooms[room_id] = room
+        finally:
+            del self._busy[room_id]
+            done.set_result(None)
+
+    @staticmethod
+    def _resumable(room: Room) -> bool:
+        """Whether there is anything to come back to: a running match, or towers placed before it"""
+        game = room.game
+        return not game.game_over and (game.game_started or bool(game.towers))
+
+    async def _discard(self, room: Room):
+        """Drop a room for good"""
+        if self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+            logger.info(f"Room {room.room_id} closed. Total rooms: {len(self.rooms)}")
+            await self._disown(room)
+
+    def _over_limits(self, extra_rooms: int = 0) -> bool:
+        if len(self.rooms) + extra_rooms > self.max_rooms:
+            return True
+        if self.max_memory is not None:
+            memory = resident_memory()
+            return memory is not None and memory > self.max_memory
+        return False
+
+    async def _make_capacity(self):
+        """Hibernate paused rooms, oldest first, until one more room fits"""
+        if not self._over_limits(extra_rooms=1):
+            return
+        for room in sorted((r for r in self.rooms.values() if r.paused), key=lambda r: r.paused_since):
+            await self.hibernate(room)
+            if not self._over_limits(extra_rooms=1):
+                return
+        raise RoomCapacityError(f"Room limit reached ({len(self.rooms)} rooms)")
+
+    async def maintain(self):
+        """Drop players past their grace period, pause rooms nobody is connected to, close finished ones and hibernate idle ones"""
+        now = time.monotonic()
+        for room in self:
+            for player_id in room.expired_players(now):
+                if self.on_player_left is not None:
+                    await self.on_player_left(room, player_id)
+                else:
+                    room.game.remove_player(player_id)
+
+            if not room.paused:
+                if room.connection_count == 0:
+                    room.pause()
+            elif now - room.paused_since < self.check_interval:
+                continue  # Just opened; its first connection may still be on the way
+            elif not self._resumable(room):
+                await self._discard(room)
+            elif now - room.paused_since >= self.hibernate_after:
+                await self.hibernate(room)
+
+        # Memory only shrinks once rooms are gone, so hibernate idle rooms early when over the cap
+        if self._over_limits():
+            for room in sorted((r for r in self if r.paused), key=lambda r: r.paused_since):
+                await self.hibernate(room)
+                if not self._over_limits():
+                    break
+
+        # Stop relaying rooms nobody here is connected to any more
+        for remote in self.relayed():
+            if remote.connection_count == 0 and self.remote.get(remote.room_id) is remote:
+                del self.remote[remote.room_id]
+                if remote.room_id not in self._busy:
+                    await self.backplane.unsubscribe(room_channel(remote.room_id))
+
+    async def _node_message(self, header: Dict, payload: str):
+        """A message for this node: from relaying nodes to a room hosted here, or from owners to connections here"""
+        if header["kind"] in ("join", "action", "leave", "spectate", "unspectate"):
+            await self._relayed_message(header, payload)
+            return
+        remote = self.remote.get(header["room"])
+        if remote is not None:
+            await remote.receive(header, payload)
+
+    async def _relayed_message(self, header: Dict, payload: str):
+        kind = header["kind"]
+        room_id = header["room"]
+        node_id = header["node"]
+        while room_id in self._busy:
+            await self._busy[room_id]
+        room = self.rooms.get(room_id)
+        if room is None or room.relay is None:
+            # The room moved on; make the connection come back through the directory
+            if kind == "join":
+                await RemoteSocket(self.backplane, node_id, room_id, header["player"]).close(1012)
+            elif kind == "spectate":
+                await self.backplane.publish(node_channel(node_id), {
+                    "kind": "spectator_init", "room": room_id, "spectator": header["spectator"]
+                })
+            return
+
+        if kind == "join":
+            player_id = header["player"]
+            websocket = RemoteSocket(self.backplane, node_id, room_id, player_id)
+            token = room.claim(player_id, header.get("token"))
+            if token is None:
+                await websocket.close(1008)
+                return
+            await room.join(player_id, websocket, token, header.get("last_tick"))
+            room.resume()
+        elif kind == "action":
+            try:
+                action = decode_action(payload)
+            except ValueError:
+                return  # Already validated by the relaying node
+            if self.on_action is not None:
+                await self.on_action(room, header["player"], action)
+        elif kind == "leave":
+            player_id = header["player"]
+            websocket = room.players.active_connections.get(player_id)
+            if isinstance(websocket, RemoteSocket) and websocket.node_id == node_id:
+                room.players.disconnect(player_id, websocket)
+                room.hold(player_id)
+                self.release(room)
+        elif kind == "spectate":
+            room.relay.spectators[node_id] = room.relay.spectators.get(node_id, 0) + 1
+            init_frame = encode({**room.state_message("init"), "spectator": True})
+            await self.backplane.publish(node_channel(node_id), {
+                "kind": "spectator_init", "room": room_id, "spectator": header["spectator"]
+            }, init_frame)
+            room.resume()
+        elif kind == "unspectate":
+            count = room.relay.spectators.get(node_id, 0) - 1
+            if count > 0:
+                room.relay.spectators[node_id] = count
+            else:
+                room.relay.spectators.pop(node_id, None)
+            self.release(room)
+
+    async def _node_lost(self, header: Dict, payload: str):
+        """Another node left the backplane: drop its connections, and close the rooms it hosted"""
+        node_id = header["node"]
+        for room in self:
+            if room.relay is None:
+                continue
+            for player_id, websocket in list(room.players.active_connections.items()):
+                if isinstance(websocket, RemoteSocket) and websocket.node_id == node_id:
+                    room.players.disconnect(player_id, websocket)
+                    room.hold(player_id)
+            room.relay.spectators.pop(node_id, None)
+            self.release(room)
+        for remote in self.relayed():
+            if remote.owner == node_id:
+                await remote.close()
+
+    async def _maintain_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"Error maintaining rooms: {e}")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
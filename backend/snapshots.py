@@ -0,0 +1,59 @@
+from typing import Any, Optional
+import hashlib
+import logging
+import os
+import pickle
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """
+    Compressed pickles of hibernated rooms, one file per room in a directory
+    Files are named after a hash of the room id so any id makes a safe name,
+    and are written to a temporary file first so a crash never leaves half a
+    snapshot behind. All methods block and are meant for a worker thread
+    """
+
+    SUFFIX = ".snap"
+
+    def __init__(self, directory: str, level: int = 6):
+        self.directory = directory
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(self.SUFFIX))
+
+    def _path(self, room_id: str) -> str:
+        name = hashlib.sha1(room_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + self.SUFFIX)
+
+    def save(self, room_id: str, obj: Any) -> int:
+        """Pickle and compress obj as the snapshot of room_id; returns its size in bytes"""
+        data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), self.level)
+        path = self._path(room_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def take(self, room_id: str) -> Optional[Any]:
+        """Load and remove the snapshot of room_id; None if there is none"""
+        path = self._path(room_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        obj = pickle.loads(zlib.decompress(data))
+        os.remove(path)
+        return obj
+
+    def delete(self, room_id: str):
+        try:
+            os.remove(self._path(room_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from actions import (GetState, PlaceTower, SetTargeting, StartWave, TokenBucket, UpgradeTower, decode_action,
+                     encode_binary)
+
+MESSAGES = [
+    {"action": "place_tower", "x": 3, "y": 17, "tower_type": "cannon"},
+    {"action": "upgrade_tower", "tower_id": "1b0e-tower", "upgrade_path": "range"},
+    {"action": "set_targeting", "tower_id": "t", "targeting": "strongest"},
+    {"action": "start_wave"},
+    {"action": "get_state"},
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda message: message["action"])
+def test_json_and_binary_frames_decode_to_the_same_action(message):
+    from_json = decode_action(json.dumps(message))
+    from_binary = decode_action(encode_binary(message))
+    assert from_json == from_binary
+    assert from_json.model_dump() == message
+
+
+def test_defaults_and_extra_fields():
+    assert decode_action('{"action": "upgrade_tower", "tower_id": "t"}') == UpgradeTower(
+        action="upgrade_tower", tower_id="t", upgrade_path="damage")
+    assert decode_action(encode_binary({"action": "set_targeting", "tower_id": "t"})) == SetTargeting(
+        action="set_targeting", tower_id="t", targeting="first")
+    assert decode_action('{"action": "start_wave", "player_id": "x"}') == StartWave(action="start_wave")
+    assert isinstance(decode_action(b"\x05"), GetState)
+    assert isinstance(decode_action(encode_binary(MESSAGES[0])), PlaceTower)
+
+
+@pytest.mark.parametrize("frame", [
+    "",
+    "not json",
+    "[]",
+    '{"action": "launch_missiles"}',
+    '{"x": 1}',
+    '{"action": "place_tower", "x": 1, "y": 2}',
+    '{"action": "place_tower", "x": -1, "y": 2, "tower_type": "basic"}',
+    '{"action": "place_tower", "x": 1, "y": 256, "tower_type": "basic"}',
+    '{"action": "place_tower", "x": 1, "y": 2, "tower_type": "laser"}',
+    '{"action": "place_tower", "x": "1", "y": 2.5, "tower_type": "basic"}',
+    '{"action": "upgrade_tower", "tower_id": ""}',
+    '{"action": "upgrade_tower", "tower_id": "t", "upgrade_path": "armor"}',
+    '{"action": "set_targeting", "tower_id": "t", "targeting": "random"}',
+    b"",
+    b"\x00",
+    b"\x09",
+    b"\x01\x03",  # place_tower without its tower type
+    b"\x01\x03\x04\x09",  # Unknown tower type
+    b"\x02",  # upgrade_tower without a path
+    b"\x02\x07t",  # Unknown upgrade path
+    b"\x02\x00",  # Empty tower id
+    b"\x02\x00\xff\xfe",  # Tower id is not UTF-8
+    b"\x03\x09t",  # Unknown targeting policy
+])
+def test_malformed_frames_raise_value_error(frame):
+    with pytest.raises(ValueError):
+        decode_action(frame)
+
+
+def test_token_bucket_allows_bursts_then_the_rate():
+    now = [0.0]
+    bucket = TokenBucket(rate=10, burst=20, clock=lambda: now[0])
+    assert sum(bucket.take() for _ in range(30)) == 20
+    now[0] += 0.5
+    assert sum(bucket.take() for _ in range(30)) == 5
+    now[0] += 60
+    assert sum(bucket.take() for _ in range(30)) == 20
@@ -0,0 +1,266 @@
+import asyncio
+import json
+
+import pytest
+
+from actions import decode_action
+from backplane import (BackplaneBroker, MemoryBackplane, MemoryHub, UnixSocketBackplane, node_channel,
+                       pack_message)
+from metrics import ServerMetrics
+from rooms import RemoteRoom, Room, RoomElsewhereError, RoomManager
+
+
+class FakeSocket:
+    """Records what a room sends to one client"""
+
+    def __init__(self):
+        self.accepted = False
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+    def types(self):
+        return [message["type"] for message in self.sent]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def start_nodes(actions=None):
+    """Two RoomManagers sharing one in-process hub, as nodes A and B"""
+    hub = MemoryHub()
+    nodes = []
+    for node_id in ("A", "B"):
+        manager = RoomManager(ServerMetrics(0.05), check_interval=3600,
+                              backplane=MemoryBackplane(hub, node_id))
+        if actions is not None:
+            async def on_action(room, player_id, action, node_id=node_id):
+                actions.append((node_id, room.room_id, player_id, action))
+            manager.on_action = on_action
+        await manager.start()
+        nodes.append(manager)
+    return hub, nodes
+
+
+async def broadcast(room: Room, ticks: int = 2):
+    room.game.update(0.05)
+    for _ in range(ticks):
+        await room.broadcast_tick(0.0)
+
+
+def test_first_node_to_open_a_room_owns_it():
+    async def scenario():
+        hub, (a, b) = await start_nodes()
+        room = await a.open("r", relay=True)
+        remote = await b.open("r", relay=True)
+        assert isinstance(room, Room)
+        assert isinstance(remote, RemoteRoom) and remote.owner == "A"
+        assert hub.owners == {"r": "A"}
+        with pytest.raises(RoomElsewhereError):
+            await b.open("r")
+        assert await b.open("r", relay=True) is remote
+        await a.stop()
+        await b.stop()
+
+    run(scenario())
+
+
+def test_find_never_opens_a_room():
+    async def scenario():
+        hub, (a, b) = await start_nodes()
+        assert a.find("r") is None
+        assert not a.rooms and not hub.owners
+        room = await a.open("r", relay=True)
+        assert a.find("r") is room
+        assert b.find("r") is None  # Not relayed here yet
+        remote = await b.open("r", relay=True)
+        with pytest.raises(RoomElsewhereError):
+            b.find("r")
+        assert b.find("r", relay=True) is remote
+        await a.stop()
+        await b.stop()
+
+    run(scenario())
+
+
+def test_relayed_player_joins_gets_frames_and_acts():
+    async def scenario():
+        actions = []
+        _, (a, b) = await start_nodes(actions)
+        room = await a.open("r", relay=True)
+        remote = await b.open("r", relay=True)
+        socket = FakeSocket()
+        await remote.join("p1", socket, None)
+
+        assert socket.accepted
+        assert socket.types() == ["init"]
+        assert "p1" in room.game.players and not room.paused
+        assert socket.sent[0]["resume_token"] == room.sessions["p1"]
+
+        room.game.start_game()
+        await broadcast(room)
+        assert socket.types() == ["init", "game_update"]
+        assert remote.players.active_connections == {"p1": socket}
+        assert not remote.joining
+
+        await remote.act("p1", decode_action('{"action": "start_wave"}'))
+        assert actions == [("A", "r", "p1", decode_action('{"action": "start_wave"}'))]
+        await a.stop()
+        await b.stop()
+
+    run(scenario())
+
+
+def test_relayed_player_leaving_is_held_and_can_resume():
+    async def scenario():
+        _, (a, b) = await start_nodes()
+        room = await a.open("r", relay=True)
+        remote = await b.open("r", relay=True)
+        socket = FakeSocket()
+        await remote.join("p1", socket, None)
+        token = socket.sent[0]["resume_token"]
+        room.game.start_game()
+        await broadcast(room)
+
+        await remote.leave("p1", socket)
+        assert "p1" not in room.players.active_connections
+        assert "p1" in room.away and "p1" in room.game.players
+        assert room.paused
+
+        intruder = FakeSocket()
+        await remote.join("p1", intruder, "wrong token")
+        assert intruder.close_code == 1008
+
+        again = FakeSocket()
+        await remote.join("p1", again, token, last_tick=room.game.tick)
+        assert again.types() == ["resumed", "game_update"]  # Replayed from the room's history, no new init
+        assert "p1" not in room.away
+        await a.stop()
+        await b.stop()
+
+    run(scenario())
+
+
+def test_lost_relaying_node_drops_its_players():
+    async def scenario():
+        _, (a, b) = await start_nodes()
+        room = await a.open("r", relay=True)
+        remote = await b.open("r", relay=True)
+        await remote.join("p1", FakeSocket(), None)
+
+        await b.backplane.stop()
+        assert not room.players.active_connections
+        assert "p1" in room.away
+        assert room.paused
+        await a.stop()
+        await b.stop()
+
+    run(scenario())
+
+
+def test_lost_owner_closes_relayed_connections():
+    async def scenario():
+        hub, (a, b) = await start_nodes()
+        await a.open("r", relay=True)
+        remote = await b.open("r", relay=True)
+        socket = FakeSocket()
+        await remote.join("p1", socket, None)
+
+        await a.backplane.stop()
+        assert remote.closed
+        assert socket.close_code == 1012
+        assert hub.owners == {}
+        # The next connection finds the room free and B takes it over
+        assert isinstance(await b.open("r", relay=True), Room)
+        assert hub.owners == {"r": "B"}
+        await a.stop()
+        await b.stop()
+
+    run(scenario())
+
+
+async def start_broker(tmp_path, *node_ids, **options):
+    """A broker on a socket in tmp_path, with a connected UnixSocketBackplane per node id"""
+    broker = BackplaneBroker(str(tmp_path / "backplane.sock"), **options)
+    await broker.start()
+    backplanes = []
+    for node_id in node_ids:
+        backplane = UnixSocketBackplane(broker.path, node_id)
+        await backplane.start()
+        backplanes.append(backplane)
+    return broker, backplanes
+
+
+def test_relayed_message_does_not_hold_up_claims(tmp_path):
+    async def scenario():
+        broker, (a_plane, b_plane) = await start_broker(tmp_path, "A", "B")
+        a = RoomManager(ServerMetrics(0.05), check_interval=3600, backplane=a_plane)
+        await a.backplane.subscribe(node_channel("A"), a._node_message)
+        await asyncio.sleep(0.05)  # Let the broker take the subscription
+        # The action reaches A while A is claiming the room, and waits for the claim's reply
+        await b_plane.publish(node_channel("A"), {"kind": "action", "room": "r", "node": "B", "player": "p1"},
+                              '{"action": "start_wave"}')
+        assert isinstance(await asyncio.wait_for(a.open("r", relay=True), 3), Room)
+        assert isinstance(await asyncio.wait_for(a.open("other", relay=True), 3), Room)
+        await a_plane.stop()
+        await b_plane.stop()
+        await broker.stop()
+
+    run(scenario())
+
+
+def test_cancelled_claim_leaves_the_connection_usable(tmp_path):
+    async def scenario():
+        broker, (backplane,) = await start_broker(tmp_path, "A")
+        claim = asyncio.create_task(backplane.claim("r"))
+        await asyncio.sleep(0)
+        claim.cancel()
+        assert await asyncio.wait_for(backplane.claim("s"), 3) == "A"
+        await backplane.stop()
+        await broker.stop()
+
+    run(scenario())
+
+
+def test_claims_fail_once_the_broker_is_gone(tmp_path):
+    async def scenario():
+        broker, (backplane,) = await start_broker(tmp_path, "A")
+        await backplane.subscribe("x", None)
+        await asyncio.sleep(0.05)
+        for writer in broker.subscribers["x"]:
+            writer.transport.abort()
+        await asyncio.sleep(0.05)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(backplane.claim("r"), 3)
+        await backplane.stop()
+        await broker.stop()
+
+    run(scenario())
+
+
+def test_broker_drops_a_subscriber_that_stops_reading(tmp_path):
+    async def scenario():
+        broker, (publisher,) = await start_broker(tmp_path, "P", max_buffer=64 * 1024)
+        _, stalled = await asyncio.open_unix_connection(broker.path)  # Never reads
+        stalled.write(pack_message({"op": "hello", "node": "S"}) + pack_message({"op": "sub", "channel": "x"}))
+        await stalled.drain()
+        await asyncio.sleep(0.05)
+        assert len(broker.subscribers["x"]) == 1
+        for _ in range(100):
+            await publisher.publish("x", {}, "f" * 100_000)
+        await asyncio.sleep(0.05)
+        assert not broker.subscribers["x"]
+        await publisher.stop()
+        stalled.close()
+        await broker.stop()
+
+    run(scenario())
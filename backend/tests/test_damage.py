@@ -0,0 +1,53 @@
+import random
+
+from models.damage import DamageResolver
+from models.enemy import DAMAGE_TYPES, create_enemy
+
+PATH = [{"x": 0.0, "y": 0.0}, {"x": 20.0, "y": 0.0}]
+
+
+def test_batched_hits_match_taking_them_one_by_one():
+    rng = random.Random(1)
+    for _ in range(200):
+        enemy_types = [rng.choice(("fast", "tank", "flying")) for _ in range(6)]
+        one_by_one = [create_enemy(t, f"e{i}", PATH, 0.0) for i, t in enumerate(enemy_types)]
+        batched = [create_enemy(t, f"e{i}", PATH, 0.0) for i, t in enumerate(enemy_types)]
+        batched[0].is_alive = one_by_one[0].is_alive = False  # Killed on an earlier tick
+        resolver = DamageResolver()
+        for _ in range(rng.randrange(1, 40)):
+            i = rng.randrange(len(enemy_types))
+            tower_type = rng.choice(DAMAGE_TYPES + ("unknown",))
+            amount = rng.choice((5.0, 12.5, 30.0, 75.0))
+            one_by_one[i].take_damage(amount, tower_type)
+            resolver.add_hit(batched[i], tower_type, amount)
+        resolver.resolve()
+        assert len(resolver) == 0
+        for expected, enemy in zip(one_by_one, batched):
+            assert (enemy.is_alive, enemy.current_health) == (expected.is_alive, expected.current_health)
+
+
+def test_resistances_scale_the_damage():
+    resolver = DamageResolver()
+    flying = create_enemy("flying", "f", PATH, 0.0)
+    tank = create_enemy("tank", "t", PATH, 0.0)
+    resolver.add_hit(flying, "cannon", 50.0)  # 60% resisted
+    resolver.add_hit(flying, "sniper", 10.0)
+    resolver.add_hit(tank, "cannon", 100.0)  # Weak to cannon: 30% extra
+    resolver.add_hit(tank, "laser", 10.0)  # Unknown types are not resisted
+    resolver.resolve()
+    assert flying.current_health == 80 - 50.0 * 0.4 - 10.0
+    assert tank.current_health == 300 - 100.0 * 1.3 - 10.0
+
+
+def test_hit_to_exactly_zero_kills():
+    resolver = DamageResolver()
+    fast = create_enemy("fast", "f", PATH, 0.0)
+    resolver.add_hit(fast, "basic", 20.0)
+    resolver.add_hit(fast, "cannon", 30.0)
+    resolver.resolve()
+    assert not fast.is_alive and fast.current_health == 0
+
+    survivor = create_enemy("fast", "s", PATH, 0.0)
+    resolver.add_hit(survivor, "basic", 49.0)
+    resolver.resolve()
+    assert survivor.is_alive and survivor.current_health == 1.0
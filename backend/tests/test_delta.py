@@ -0,0 +1,97 @@
+import copy
+import json
+from itertools import islice
+
+from delta import DeltaEncoder, FrameHistory, diff_entities, diff_state
+from models.game import Game
+from simulate import SimulationClock, play_match
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """Apply a delta the way clients do"""
+    state = copy.deepcopy(state)
+    state.update(delta["changes"])
+    for key, diff in delta["entities"].items():
+        entities = state[key]
+        for entity_id, fields in diff.get("upsert", {}).items():
+            entities[entity_id] = {**entities.get(entity_id, {}), **fields}
+        for entity_id in diff.get("remove", []):
+            del entities[entity_id]
+    return state
+
+
+def test_diff_entities_sends_changed_fields_only():
+    old = {"a": {"x": 1, "hp": 10}, "b": {"x": 2, "hp": 5}}
+    new = {"a": {"x": 1, "hp": 7}, "c": {"x": 0, "hp": 10}}
+    assert diff_entities(old, new) == {"upsert": {"a": {"hp": 7}, "c": {"x": 0, "hp": 10}}, "remove": ["b"]}
+    assert diff_entities(new, new) == {}
+
+
+def test_diff_state_splits_values_and_entities():
+    old = {"tick": 1, "current_wave": 1, "players": {}, "towers": {}, "enemies": {"e": {"x": 0}}}
+    new = {"tick": 2, "current_wave": 1, "players": {}, "towers": {}, "enemies": {"e": {"x": 1}}}
+    delta = diff_state(old, new)
+    assert delta == {"changes": {"tick": 2}, "entities": {"enemies": {"upsert": {"e": {"x": 1}}}}}
+    assert apply_delta(old, delta) == new
+
+
+def test_encoder_sends_keyframes_periodically():
+    encoder = DeltaEncoder(keyframe_every=3)
+    states = [{"tick": tick, "players": {}, "towers": {}, "enemies": {}} for tick in range(10)]
+    deltas = [encoder.encode(state) for state in states]
+    assert [delta is None for delta in deltas] == [True, False, False, False, True, False, False, False, True, False]
+    assert deltas[1] == {"base_tick": 0, "changes": {"tick": 1}, "entities": {}}
+
+    encoder.reset(states[0])
+    assert encoder.encode(states[1])["base_tick"] == 0
+
+
+def test_deltas_rebuild_every_state_of_a_match():
+    encoder = DeltaEncoder()
+    client = None
+    deltas = 0
+    for game in islice(play_match(Game(seed=3, clock=SimulationClock()), ["basic", "sniper", "cannon", "aoe"]), 600):
+        full = json.loads(json.dumps(game.to_dict()))  # As the client decodes it
+        delta = encoder.encode(full)
+        if delta is None:
+            client = full
+            continue
+        assert delta["base_tick"] == client["tick"]
+        client = apply_delta(client, json.loads(json.dumps(delta)))
+        assert client == full
+        deltas += 1
+    assert deltas > 500
+
+
+def history_of(size: int = 150):
+    """Keyframe at tick 2, then deltas up to tick 10"""
+    history = FrameHistory(size)
+    history.append(None, 2, "k2")
+    for tick in range(4, 12, 2):
+        history.append(tick - 2, tick, f"d{tick}")
+    return history
+
+
+def test_history_since_replays_the_missed_frames():
+    history = history_of()
+    assert history.since(6) == [(4, "d8"), (5, "d10")]
+    assert history.since(2) == [(1, "k2"), (2, "d4"), (3, "d6"), (4, "d8"), (5, "d10")]  # The keyframe comes first
+    assert history.since(10) == []  # Already up to date
+    assert history.since(1) == [(1, "k2"), (2, "d4"), (3, "d6"), (4, "d8"), (5, "d10")]  # From the keyframe
+    assert history.since(7) is None  # Never broadcast
+
+
+def test_history_since_gives_up_once_frames_are_gone():
+    history = history_of(size=3)
+    assert history.since(2) is None
+    assert history.since(4) == [(3, "d6"), (4, "d8"), (5, "d10")]
+    assert FrameHistory().since(0) is None
+
+
+def test_history_after_follows_broadcasts_during_a_resume():
+    history = history_of(size=3)
+    assert history.after(5) == []
+    assert history.after(3) == [(4, "d8"), (5, "d10")]
+    assert history.after(2) == [(3, "d6"), (4, "d8"), (5, "d10")]
+    assert history.after(1) is None  # Frame 2 was dropped
+    assert FrameHistory().after(0) == []
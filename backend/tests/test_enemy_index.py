@@ -0,0 +1,67 @@
+import math
+from itertools import islice
+
+from models.enemy import create_enemy
+from models.enemy_index import ProgressIndex
+from models.game import Game
+from simulate import SimulationClock, play_match
+
+PATH = [{"x": 0.0, "y": 0.0}, {"x": 20.0, "y": 0.0}]
+
+
+def enemy(enemy_id: str, distance: float, enemy_type: str = "basic"):
+    spawned = create_enemy(enemy_type, enemy_id, PATH, 0.0)
+    spawned.distance_traveled = distance
+    return spawned
+
+
+def test_index_stays_sorted_by_progress():
+    index = ProgressIndex()
+    enemies = [enemy(str(i), distance) for i, distance in enumerate([5.0, 1.0, 3.0, 1.0, 8.0])]
+    for spawned in enemies:
+        index.add(spawned)
+    assert index.progress == [1.0, 1.0, 3.0, 5.0, 8.0]
+
+    # Enemies move at different speeds; refresh restores the order
+    enemies[1].distance_traveled = 9.0
+    enemies[4].distance_traveled = 8.5
+    index.refresh()
+    assert index.progress == [1.0, 3.0, 5.0, 8.5, 9.0]
+    assert [e.route_offset + e.distance_traveled for e in index.enemies] == index.progress
+
+    index.remove_many({"0", "3"})
+    assert [e.id for e in index.enemies] == ["2", "4", "1"]
+    assert index.progress == [3.0, 8.5, 9.0]
+    assert list(index.span(3.0, 8.5)) == [0, 1]
+    assert list(index.span(4.0, 4.5)) == []
+
+
+def test_route_offsets_separate_roads():
+    index = ProgressIndex()
+    near = enemy("near", 2.0)
+    far = enemy("far", 1.0)
+    far.set_route(1, 50.0)
+    index.add(far)
+    index.add(near)
+    assert [e.id for e in index.enemies] == ["near", "far"]
+    assert [index.enemies[i].id for i in index.span(50.0, 60.0)] == ["far"]
+
+
+def test_towers_target_what_a_full_scan_finds():
+    """Coverage lookups on the index agree with checking every enemy's distance, furthest first"""
+    checked = 0
+    for seed in range(2):
+        build = ["basic", "sniper", "cannon", "aoe"]
+        for game in islice(play_match(Game(seed=seed, clock=SimulationClock()), build), 1500):
+            index = game.enemy_index
+            for tower in game.towers.values():
+                found = list(tower.iter_targets(index))
+                in_range = {e.id for e in game.enemies.values() if e.is_alive and tower.is_in_range(e.x, e.y)}
+                # Coverage ends are computed, so enemies right on the edge of the range may go either way
+                near_range = {e.id for e in game.enemies.values() if e.is_alive
+                              and math.hypot(tower.x - e.x, tower.y - e.y) <= tower.range + 1e-6}
+                assert in_range <= {e.id for e in found} <= near_range
+                progress = [e.route_offset + e.distance_traveled for e in found]
+                assert progress == sorted(progress, reverse=True)
+                checked += len(found)
+    assert checked > 0
@@ -0,0 +1,34 @@
+from itertools import islice
+
+from models.enemy import EnemyPool, TankEnemy, create_enemy
+from models.game import Game
+from simulate import SimulationClock, play_match
+
+PATH = [{"x": 0.0, "y": 0.0}, {"x": 20.0, "y": 0.0}]
+OTHER_PATH = [{"x": 5.0, "y": 5.0}, {"x": 5.0, "y": 15.0}]
+
+
+def test_released_enemy_comes_back_as_new():
+    pool = EnemyPool()
+    enemy = pool.acquire("tank", "t1", PATH, 1.0)
+    enemy.scale_health(2.5)
+    enemy.set_route(1, 40.0)
+    enemy.move(3.0)
+    enemy.take_damage(1000.0, "cannon")
+    assert not enemy.is_alive
+    pool.release(enemy)
+    assert pool.free_count() == 1
+
+    assert type(pool.acquire("fast", "f1", PATH, 2.0)) is not TankEnemy  # Pooled per type
+    reused = pool.acquire("tank", "t2", OTHER_PATH, 9.0)
+    assert reused is enemy and pool.free_count() == 0
+    assert vars(reused) == vars(create_enemy("tank", "t2", OTHER_PATH, 9.0))
+
+
+def test_game_recycles_the_enemies_it_removes():
+    game = Game(seed=1, clock=SimulationClock())
+    spawned = {}  # Holding on to every instance, so ids are not reused
+    for _ in islice(play_match(game, ["basic", "sniper", "cannon", "aoe"]), 1500):
+        spawned.update((id(enemy), enemy) for enemy in game.enemies.values())
+    assert game.enemies_killed + game.enemies_leaked > len(spawned)  # Instances lived several lives
+    assert game.enemy_pool.free_count() > 0
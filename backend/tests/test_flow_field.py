@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from models.flow_field import FlowField
+from models.game import Game
+from models.game_map import GameMap
+
+
+def grid_neighbors(size: int, costs):
+    """4-neighbourhood of a size x size grid; stepping costs the mean of both cells"""
+    def neighbors(cell):
+        x, y = cell
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < size and 0 <= ny < size:
+                yield (nx, ny), (costs[cell] + costs[(nx, ny)]) / 2
+    return neighbors
+
+
+def assert_same_as_computed(field: FlowField):
+    fresh = FlowField(field.exits, field.neighbors)
+    fresh.blocked = set(field.blocked)
+    fresh.compute()
+    assert field.distance == pytest.approx(fresh.distance)
+    for cell, next_cell in field.next_cell.items():
+        if next_cell is not None:  # Ties may pick another neighbour, never a longer way
+            step = dict(field.neighbors(cell))[next_cell]
+            assert field.distance[cell] == pytest.approx(field.distance[next_cell] + step)
+
+
+def test_blocking_cells_repairs_the_field_like_a_full_compute():
+    rng = random.Random(7)
+    size = 16
+    cells = [(x, y) for x in range(size) for y in range(size)]
+    for _ in range(5):
+        costs = {cell: rng.choice((1.0, 1.0, 1.5, 3.0)) for cell in cells}
+        field = FlowField([(0, 0), (size - 1, size // 2)], grid_neighbors(size, costs))
+        for cell in rng.sample(cells, 120):  # Enough to cut parts of the grid off
+            field.block(cell)
+            assert_same_as_computed(field)
+        assert len(field.distance) < size * size - 120
+
+
+def test_blocking_maze_cells_repairs_the_field_like_a_full_compute():
+    game_map = GameMap(seed=3, roads=2, maze=True)
+    rng = random.Random(3)
+    for y, x in rng.sample([(y, x) for y in range(20) for x in range(20)], 80):
+        game_map.flow_field.block((x, y))
+        assert_same_as_computed(game_map.flow_field)
+
+
+def test_placement_cutting_a_spawn_off_is_refused():
+    game_map = GameMap(seed=1, maze=True)
+    spawn = game_map.spawns[0]
+    ways_out = sorted({cell for cell, _ in game_map._maze_neighbors(spawn)})
+    assert len(ways_out) > 1
+    for x, y in ways_out[:-1]:
+        assert game_map.can_place_tower(x, y)
+        game_map.block_cell(x, y)
+    last = ways_out[-1]
+    assert not game_map.can_place_tower(*last)
+    assert game_map.flow_field.is_reachable(spawn)
+
+    game = Game(seed=1, maze=True)
+    game.game_map = game_map
+    game.add_player("p1")
+    game.players["p1"].money = 10 ** 6
+    result = game.place_tower("p1", *last, "basic")
+    assert not result["success"] and "block" in result["message"]
+
+
+def test_routes_are_rebuilt_around_a_placed_tower():
+    game = Game(seed=2, maze=True)
+    game.add_player("p1")
+    game.players["p1"].money = 10 ** 6
+    game_map = game.game_map
+    route = game_map.routes[0]
+    cell = next(c for c in route.cells[2:-2] if game_map.can_place_tower(*c))
+    result = game.place_tower("p1", *cell, "basic")
+    assert result["success"]
+
+    rerouted = game_map.routes[0].cells
+    assert rerouted != route.cells and cell not in rerouted
+    assert rerouted[0] == game_map.spawns[0] and rerouted[-1] in game_map.exits
+    for a, b in zip(rerouted, rerouted[1:]):
+        assert b in dict(game_map._maze_neighbors(a))
+    assert game_map.path_length == sum(r.length for r in game_map.routes)
+    tower = game.towers[result["tower"]["id"]]
+    assert tower.path_intervals == game_map.compute_path_coverage(tower.x, tower.y, tower.range)
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from frame_compression import RECENT_FRAMES, ZstdCodec, deflate_protocol, sample_frames, zstandard
+from metrics import CompressionStats
+
+needs_zstd = pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+
+
+class Room:
+    """Stands in for a room: the codec only keys its cache on it"""
+
+
+class BytesSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+
+@needs_zstd
+def test_broadcast_is_compressed_once_per_room():
+    stats = CompressionStats()
+    codec = ZstdCodec(stats)
+    room, other = Room(), Room()
+    sockets = [BytesSocket() for _ in range(5)]
+    frame = '{"type": "game_delta", "base_tick": 4}'
+
+    async def broadcast(room, text, sockets):
+        for socket in sockets:
+            await codec.wrap(socket, room).send_text(text)
+
+    asyncio.run(broadcast(room, frame, sockets))
+    assert stats.frames == 1
+    assert len({data for socket in sockets for data in socket.sent}) == 1
+
+    asyncio.run(broadcast(other, frame, sockets[:1]))  # Another room compresses its own copy
+    assert stats.frames == 2
+    equal_text = "".join(frame)  # Same characters, another broadcast
+    asyncio.run(broadcast(room, equal_text, sockets[:1]))
+    assert stats.frames == 3
+
+    # Only the last few frames of a room are kept
+    for i in range(RECENT_FRAMES):
+        codec.compress(room, f'{{"tick": {i}}}')
+    codec.compress(room, frame)
+    assert stats.frames == 3 + RECENT_FRAMES + 1
+
+
+@needs_zstd
+def test_frames_round_trip_with_a_trained_dictionary(tmp_path):
+    dictionary = zstandard.train_dictionary(4096, sample_frames(2, 3))
+    path = tmp_path / "frames.dict"
+    path.write_bytes(dictionary.as_bytes())
+    codec = ZstdCodec.load(CompressionStats(), str(path))
+    assert codec.dictionary_id == dictionary.dict_id() != 0
+    assert codec.accepts(dictionary.dict_id()) and not codec.accepts(0)
+
+    client = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(path.read_bytes()))
+    plain = ZstdCodec(CompressionStats())
+    held_out = sample_frames(1, 2, first_seed=5)
+    trained_size = plain_size = 0
+    for frame in held_out:
+        text = frame.decode("utf-8")
+        data = codec.compress(Room(), text)
+        assert client.decompress(data).decode("utf-8") == text
+        trained_size += len(data)
+        plain_size += len(plain.compress(Room(), text))
+    assert trained_size < plain_size
+
+
+def test_deflate_protocol_offers_the_tuned_extension():
+    uvicorn = pytest.importorskip("uvicorn")
+    from uvicorn.server import ServerState
+
+    stats = CompressionStats()
+    protocol_class = deflate_protocol(stats, window_bits=10, mem_level=4)
+    if protocol_class is None:
+        pytest.skip("This uvicorn cannot be tuned")
+
+    async def app(scope, receive, send):
+        pass
+
+    async def connect(per_message_deflate: bool):
+        config = uvicorn.Config(app, ws_per_message_deflate=per_message_deflate)
+        config.load()
+        return protocol_class(config=config, server_state=ServerState(), app_state={}).conn.available_extensions
+
+    (factory,) = asyncio.run(connect(True))
+    assert factory.server_max_window_bits == 10
+    assert asyncio.run(connect(False)) == []
+
+    from websockets.frames import Frame, Opcode
+    _, extension = factory.process_request_params([], [])
+    extension.encode(Frame(Opcode.TEXT, b'{"type": "game_update"}' * 20))
+    extension.encode(Frame(Opcode.PING, b""))
+    assert stats.frames == 1 and stats.compressed_bytes < stats.raw_bytes
@@ -0,0 +1,86 @@
+from models.game import Game
+from models.ledger import TeamLedger
+from models.player import Player
+from simulate import SimulationClock, rank_cells
+
+
+def started_game(*player_ids: str) -> Game:
+    game = Game(seed=1, clock=SimulationClock())
+    for player_id in player_ids:
+        game.add_player(player_id)
+    game.start_game()
+    return game
+
+
+def step(game: Game):
+    game.clock.advance(0.1)
+    game.update(0.1)
+
+
+def test_tick_settles_like_crediting_every_player_per_event():
+    game = started_game("p1", "p2")
+    expected = Player("p1")
+    for reward in (8, 25, 15):
+        game.ledger.record_kill(reward)
+        expected.defeat_enemy(reward)
+    game.ledger.record_leak(3)
+    expected.lose_life(3)
+    game.ledger.add_bonus(60, 100)
+    expected.add_money(60)
+    expected.add_points(100)
+
+    step(game)
+    for player in game.players.values():
+        assert (player.money, player.points, player.lives, player.enemies_defeated) == \
+            (expected.money, expected.points, expected.lives, expected.enemies_defeated)
+    assert not game.ledger.has_pending()
+
+    before = [p.to_dict() for p in game.players.values()]
+    game.ledger.settle(game.players.values())  # Nothing left to settle twice
+    assert [p.to_dict() for p in game.players.values()] == before
+
+
+def test_settle_is_skipped_without_events():
+    ledger = TeamLedger()
+    player = Player("p1")
+    player.money = 10
+    ledger.settle([player])
+    assert player.money == 10
+    ledger.record_leak(25)
+    ledger.settle([player])
+    assert player.lives == 0 and not player.is_active
+    assert not ledger.has_pending()
+
+
+def test_players_spend_their_own_money():
+    game = started_game("p1", "p2")
+    cells = iter(rank_cells(game, "cannon"))
+    p1, p2 = game.players["p1"], game.players["p2"]
+
+    assert game.place_tower("p1", *next(cells), "cannon")["success"]
+    assert game.place_tower("p1", *next(cells), "cannon")["success"]
+    assert (p1.money, p2.money) == (100, 500)
+    result = game.place_tower("p1", *next(cells), "cannon")
+    assert not result["success"] and "money" in result["message"]  # The teammate's money does not help
+    assert (p1.money, p2.money) == (100, 500)
+    assert game.place_tower("p2", *next(cells), "cannon")["success"]
+    assert (p1.money, p2.money) == (100, 300)
+
+    # Shared rewards reach everyone alike, whatever they spent
+    game.ledger.record_kill(150)
+    step(game)
+    assert (p1.money, p2.money) == (250, 450)
+    assert game.place_tower("p1", *next(cells), "cannon")["success"]
+    assert (p1.money, p2.money) == (50, 450)
+
+
+def test_game_is_over_once_shared_leaks_take_every_life():
+    game = started_game("p1", "p2")
+    game.players["p2"].lives = 5
+    game.ledger.record_leak(5)
+    step(game)
+    assert not game.players["p2"].is_active and game.players["p1"].lives == 15
+    assert not game.game_over
+    game.ledger.record_leak(15)
+    step(game)
+    assert game.game_over
@@ -0,0 +1,18 @@
+import asyncio
+import socket
+import time
+
+from loadtest import LoadWorker
+
+
+def unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_failures_count_in_the_step_they_happen():
+    worker = LoadWorker(f"ws://127.0.0.1:{unused_port()}", 0, action_interval=5.0, wave_interval=30.0)
+    results = asyncio.run(worker.run([3, 5, 5], 0.3, time.time()))
+    assert [step["failed"] for step in results] == [3, 2, 0]
+    assert [step["connected"] for step in results] == [0, 0, 0]
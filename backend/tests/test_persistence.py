@@ -0,0 +1,65 @@
+import asyncio
+
+from models.player import Player
+from persistence.service import PersistenceService
+from persistence.store import MemoryStore
+
+
+def player(player_id: str, points: int) -> Player:
+    recorded = Player(player_id)
+    recorded.points = points
+    return recorded
+
+
+def test_queued_result_is_replaced_by_a_later_one():
+    async def scenario():
+        store = MemoryStore()
+        service = PersistenceService(store)
+        await service.start()
+        service.record_player("m1", player("p1", 10), 2)
+        service.record_player("m1", player("p2", 5), 2)
+        service.record_player("m1", player("p1", 40), 3)
+        await service.flush()
+        assert [(m["player_id"], m["points"], m["wave"]) for m in store.matches] == [("p1", 40, 3), ("p2", 5, 2)]
+        await service.stop()
+
+    asyncio.run(scenario())
+
+
+def test_player_coming_back_to_a_match_is_recorded_again():
+    async def scenario():
+        store = MemoryStore()
+        service = PersistenceService(store)
+        await service.start()
+        service.record_player("m1", player("p1", 10), 2)
+        await service.flush()
+        service.record_player("m1", player("p1", 25), 6)  # Left, returned, and the match ended
+        await service.stop()
+        assert [m["points"] for m in store.matches] == [10, 25]
+        assert store.players["p1"]["matches_played"] == 2
+        assert store.players["p1"]["total_points"] == 35
+        assert service.leaderboard()[0]["player_id"] == "p1"
+
+    asyncio.run(scenario())
+
+
+def test_flush_writes_in_batches():
+    async def scenario():
+        store = MemoryStore()
+        batches = []
+        write_batch = store.write_batch
+
+        def recording(records):
+            batches.append(len(records))
+            write_batch(records)
+
+        store.write_batch = recording
+        service = PersistenceService(store, batch_size=3)
+        await service.start()
+        for i in range(7):
+            service.record_player("m1", player(f"p{i}", i), 1)
+        await service.stop()
+        assert batches == [3, 3, 1]
+        assert [m["player_id"] for m in store.matches] == [f"p{i}" for i in range(7)]
+
+    asyncio.run(scenario())
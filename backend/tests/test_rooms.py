@@ -0,0 +1,178 @@
+import asyncio
+import json
+from itertools import islice
+
+import pytest
+
+from metrics import ServerMetrics
+from models.game import Game
+from rooms import Room, RoomCapacityError, RoomManager
+from simulate import PLAYER_ID, SimulationClock, build_phase, play_match
+from snapshots import SnapshotStore
+from test_delta import apply_delta
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+
+def test_frames_carry_every_attack_since_the_previous_frame():
+    async def scenario():
+        game = Game(seed=1, clock=SimulationClock())
+        room = Room("r", game, ServerMetrics(0.05), broadcast_every=2)
+        socket = RecordingSocket()
+        await room.join(PLAYER_ID, socket, room.claim(PLAYER_ID, None))
+
+        fired = 0
+        next_record = game.attack_log.next_record
+
+        def counted():
+            nonlocal fired
+            fired += 1
+            return next_record()
+
+        game.attack_log.next_record = counted
+        for _ in islice(play_match(game, ["basic", "sniper", "cannon", "aoe"], tick=0.05), 1000):
+            await room.broadcast_tick(game.clock.now)
+        return fired, socket.sent
+
+    fired, sent = asyncio.run(scenario())
+    client = None
+    seen = 0
+    for message in sent[1:]:
+        if message["type"] == "game_update":
+            client = message["state"]
+        else:
+            client = apply_delta(client, message)
+        seen += len(client["recent_attacks"])
+    assert fired > 50
+    assert seen == fired
+
+
+def test_resume_token_survives_hibernation(tmp_path):
+    async def scenario():
+        manager = RoomManager(ServerMetrics(0.05), SnapshotStore(str(tmp_path)))
+        room = await manager.open("r")
+        token = room.claim("p1", None)
+        await room.join("p1", RecordingSocket(), token)
+        room.game.start_game()
+        room.players.disconnect("p1")
+        room.hold("p1")
+        room.pause()
+        await manager.hibernate(room)
+
+        rehydrated = await manager.open("r")
+        assert rehydrated is not room and "p1" in rehydrated.away
+        assert rehydrated.claim("p1", None) is None  # Nobody takes the seat without the token
+        assert rehydrated.claim("p1", "guess") is None
+        assert rehydrated.claim("p1", token) == token
+        assert "p1" not in rehydrated.away
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def outcome(game: Game):
+    """What a match looks like, without the random enemy and tower ids"""
+    player = game.players[PLAYER_ID]
+    return (game.tick, game.current_wave, game.enemies_killed, game.enemies_leaked, player.money, player.lives,
+            sorted((type(e).__name__, e.distance_traveled, e.current_health) for e in game.enemies.values()),
+            sorted((t.x, t.y, type(t).__name__, t.last_attack_time) for t in game.towers.values()))
+
+
+def test_hibernated_room_comes_back_as_it_was(tmp_path):
+    async def scenario():
+        clock = SimulationClock()
+        manager = RoomManager(ServerMetrics(0.05), SnapshotStore(str(tmp_path)))
+        room = await manager.open("r", seed=4, clock=clock, endless=True)
+        game = room.game
+        for _ in play_match(game, ["basic", "cannon", "aoe"]):  # Into a wave with enemies on the road and more to come
+            if game.current_wave >= 3 and game.enemies and game.wave_director.pending:
+                break
+        assert game.wave_director.pending and not game.game_over
+        room.pause()
+        clock.advance(50.0)
+        before = game.to_dict()
+        await manager.hibernate(room)
+        assert manager.get("r") is None
+        assert await manager.hibernated_count() == 1
+
+        rehydrated = await manager.open("r")
+        assert await manager.hibernated_count() == 0
+        assert rehydrated.paused and rehydrated.game is not game
+        assert rehydrated.game.to_dict() == before
+
+        # Both copies play on exactly alike
+        copy = rehydrated.game
+        room.resume()
+        rehydrated.resume()
+        for _ in range(600):
+            for match in (game, copy):
+                match.clock.advance(0.1)
+                match.update(0.1)
+            assert outcome(copy) == outcome(game)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_idle_rooms_are_discarded_or_hibernated(tmp_path):
+    async def scenario():
+        manager = RoomManager(ServerMetrics(0.05), SnapshotStore(str(tmp_path)), hibernate_after=60,
+                              check_interval=0)
+        empty = await manager.open("empty")
+        started = await manager.open("started")
+        started.game.start_game()
+        built = await manager.open("built")
+        built.game.add_player(PLAYER_ID)
+        build_phase(built.game, ["basic"], {"next": 0, "ranked": {}, "cost": {}})
+        finished = await manager.open("finished")
+        finished.game.start_game()
+        finished.game.game_over = True
+
+        await manager.maintain()  # Nobody connected: everything pauses
+        assert all(room.paused for room in manager)
+        await manager.maintain()
+        assert sorted(room.room_id for room in manager) == ["built", "started"]  # Nothing to come back to in the rest
+        assert await manager.hibernated_count() == 0
+
+        started.paused_since -= 60
+        await manager.maintain()
+        assert [room.room_id for room in manager] == ["built"]
+        assert await manager.hibernated_count() == 1
+        assert (await manager.open("empty")).game is not empty.game  # Discarded rooms start over
+        assert (await manager.open("started")).game.game_started
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_room_limit_hibernates_the_longest_paused_room(tmp_path):
+    async def scenario():
+        manager = RoomManager(ServerMetrics(0.05), SnapshotStore(str(tmp_path)), max_rooms=3)
+        rooms = [await manager.open(room_id) for room_id in "abc"]
+        for room in rooms:
+            room.game.start_game()
+        rooms[1].pause()
+        rooms[0].pause()
+        await manager.open("d")
+        assert sorted(room.room_id for room in manager) == ["a", "c", "d"]  # b was paused first
+
+        await manager.open("e")  # a is the only paused room left
+        assert sorted(room.room_id for room in manager) == ["c", "d", "e"]
+        assert await manager.hibernated_count() == 2
+
+        with pytest.raises(RoomCapacityError):
+            await manager.open("f")  # Every room left is running
+        assert len(manager) == 3
+        assert (await manager.open("c")) is rooms[2]  # Rooms in memory can still be joined
+        await manager.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+from itertools import islice
+
+from models.game import Game
+from models.scheduler import TowerScheduler
+from models.tower import TerrainType, create_tower
+from simulate import PLAYER_ID, SimulationClock, play_match
+
+
+class VisitEveryTower(Game):
+    """The game as it ran before the scheduler: every tower looks for a target every tick"""
+
+    def _update_towers(self, current_time: float):
+        index = self.enemy_index
+        if not index:
+            return
+        for tower in self.towers.values():
+            tower.attack(index.enemies, current_time, index, self.damage_resolver, self.attack_log)
+        self.damage_resolver.resolve()
+
+
+def play(game_class, seed: int, ticks: int, build):
+    """Per-tick outcome of a seeded match; ids are random, so enemies and attacks are compared by value"""
+    outcome = []
+    for game in islice(play_match(game_class(seed=seed, clock=SimulationClock()), build), ticks):
+        player = game.players[PLAYER_ID]
+        outcome.append((
+            game.current_wave, game.enemies_killed, game.enemies_leaked, player.money, player.lives,
+            sorted((e.distance_traveled, e.current_health) for e in game.enemies.values()),
+            [(game.towers[a.tower_id].x, game.towers[a.tower_id].y, a.type, a.damage) for a in game.attack_log],
+        ))
+        game.attack_log.reset()
+    return outcome
+
+
+def test_scheduled_towers_play_like_visiting_every_tower():
+    for seed, build in ((0, ["basic", "sniper", "cannon", "aoe"]), (5, ["cannon", "aoe"])):
+        scheduled = play(Game, seed, 2500, build)
+        visited = play(VisitEveryTower, seed, 2500, build)
+        assert scheduled == visited
+        assert scheduled[-1][1] > 0  # Enemies were killed along the way
+
+
+def test_due_hands_out_ready_towers_in_placement_order():
+    scheduler = TowerScheduler()
+    towers = [create_tower("basic", x, 0, TerrainType.PLAINS, f"t{x}") for x in range(3)]
+    for tower in reversed(towers):
+        scheduler.add(tower)
+    now = 100.0
+    assert [t.id for t in scheduler.due(now)] == ["t2", "t1", "t0"]
+
+    towers[1].last_attack_time = now
+    scheduler.reschedule(towers[1])
+    assert [t.id for t in scheduler.due(now)] == ["t2", "t0"]
+    cooldown = towers[1].stats.attack_cooldown
+    assert [t.id for t in scheduler.due(now + cooldown - 0.01)] == ["t2", "t0"]
+    assert [t.id for t in scheduler.due(now + cooldown)] == ["t2", "t1", "t0"]
@@ -0,0 +1,16 @@
+import simulate
+from simulate import run_match
+
+
+def test_match_plays_one_row_per_wave():
+    rows = run_match((0, "basic,sniper,cannon,aoe", 4, 0.1, 1, False, False))
+    assert [row["wave"] for row in rows] == [1, 2, 3, 4][:len(rows)]
+    assert rows and not any(row["timed_out"] for row in rows)
+    assert all(set(row) == set(simulate.COLUMNS) for row in rows)
+
+
+def test_wave_over_the_time_limit_ends_the_match(monkeypatch):
+    monkeypatch.setattr(simulate, "MAX_WAVE_TIME", 2.0)
+    rows = run_match((0, "basic,sniper,cannon,aoe", 4, 0.1, 1, False, False))
+    assert len(rows) == 1
+    assert rows[0]["wave"] == 1 and rows[0]["timed_out"]
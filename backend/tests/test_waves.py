@@ -0,0 +1,59 @@
+import pickle
+
+from models.waves import ENEMY_COSTS, MAX_WAVE_ENEMIES, EndlessWaves, ScriptedWaves
+
+
+def wave(director, number: int, strength: float = 0.0):
+    director.start_wave(number, strength)
+    return director.due(float("inf"), 10 ** 6)
+
+
+def threat(spawns) -> float:
+    return sum(ENEMY_COSTS[enemy_type] * health for enemy_type, health in spawns)
+
+
+def test_scripted_waves_keep_the_classic_size():
+    assert [len(wave(ScriptedWaves(), number)) for number in (1, 5, 20)] == [7, 15, 45]
+
+
+def test_endless_waves_stay_bounded_while_threat_grows():
+    sizes = []
+    threats = []
+    for number in (1, 10, 50, 100, 300, 1000):
+        director = EndlessWaves(seed=1)
+        director.pressure = 2.0
+        spawns = wave(director, number, strength=15.0 + 10.0 * number)
+        sizes.append(len(spawns))
+        threats.append(threat(spawns))
+    assert max(sizes) <= MAX_WAVE_ENEMIES
+    assert sizes[0] < sizes[1] < MAX_WAVE_ENEMIES
+    assert threats == sorted(threats)
+    assert threats[-1] > 100 * threats[1]
+
+
+def test_capped_wave_spends_its_budget_on_health():
+    director = EndlessWaves(seed=2)
+    spawns = wave(director, 200, strength=2015.0)
+    budget = director.budget(200, 2015.0)
+    assert MAX_WAVE_ENEMIES * 0.8 <= len(spawns) <= MAX_WAVE_ENEMIES  # The random mix may cost more than average
+    assert spawns[0][1] > director.health_multiplier(200)
+    assert abs(threat(spawns) / director.health_multiplier(200) - budget) < 0.1 * budget
+
+
+def test_snapshot_resumes_the_wave_where_it_stopped():
+    director = EndlessWaves(seed=3)
+    director.start_wave(120, 1200.0)
+    first = director.due(5.0, 10 ** 6)
+    restored = pickle.loads(pickle.dumps(director))
+    assert restored.due(float("inf"), 10 ** 6) == director.due(float("inf"), 10 ** 6)
+    assert first
+
+
+def test_snapshot_between_waves_keeps_the_next_wave():
+    director = EndlessWaves(seed=4)
+    director.start_wave(3, 50.0)
+    director.due(float("inf"), 10 ** 6)
+    director.end_wave(0, 5)  # Pressure drops after the wave was streamed
+    restored = pickle.loads(pickle.dumps(director))
+    assert restored.rng.getstate() == director.rng.getstate()
+    assert wave(restored, 4, 60.0) == wave(director, 4, 60.0)
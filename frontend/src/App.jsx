@@ -3,34 +3,105 @@ import GameCanvas from './components/GameCanvas'
 import TowerMenu from './components/TowerMenu'
 import PlayerStats from './components/PlayerStats'
 import WaveInfo from './components/WaveInfo'
+import { createGameStore, useGameStore } from './store/gameStore'
 import './App.css'
 
+// ?room=<id> joins a specific room, ?spectate watches it read-only;
+// ?roads=<n>, ?maze and ?endless set up the game when this player creates the room
+const urlParams = new URLSearchParams(window.location.search)
+const ROOM = urlParams.get('room') || 'default'
+const SPECTATING = urlParams.has('spectate')
+const ROOM_OPTIONS = [
+  urlParams.has('roads') ? `&roads=${encodeURIComponent(urlParams.get('roads'))}` : '',
+  urlParams.has('maze') ? '&maze=true' : '',
+  urlParams.has('endless') ? '&endless=true' : ''
+].join('')
+
+// Reconnect backoff after the connection drops
+const RECONNECT_DELAY = 1000
+const MAX_RECONNECT_DELAY = 10000
+
+// Player id and resume token survive reloads of this tab, so a dropped or
+// reloaded client gets its place in the room back within the grace period
+const SESSION_KEY = `td-session-${ROOM}`
+const loadSession = () => JSON.parse(sessionStorage.getItem(SESSION_KEY) || 'null') || {}
+
 function App() {
-  const [playerId] = useState(() => Math.random().toString(36).substring(7))
+  const [playerId] = useState(() => loadSession().playerId || Math.random().toString(36).substring(7))
   const [ws, setWs] = useState(null)
-  const [gameState, setGameState] = useState(null)
+  const [store] = useState(createGameStore)
   const [connected, setConnected] = useState(false)
   const [selectedTower, setSelectedTower] = useState('basic')
-  const [selectedTowerForUpgrade, setSelectedTowerForUpgrade] = useState(null)
+  const [selectedTowerId, setSelectedTowerId] = useState(null)
   const [message, setMessage] = useState(null)
 
-  // WebSocket connection
+  // Each selector keeps its value's identity until that part of the state
+  // changes, so the app only re-renders for what it displays
+  const towers = useGameStore(store, state => state?.towers)
+  const currentPlayer = useGameStore(store, state => state?.players?.[playerId])
+  const currentWave = useGameStore(store, state => state?.current_wave || 0)
+  const waveInProgress = useGameStore(store, state => state?.wave_in_progress || false)
+  const timeToNextWave = useGameStore(store, state => Math.ceil(state?.time_to_next_wave || 0))
+  const enemiesCount = useGameStore(store, state => Object.keys(state?.enemies || {}).length)
+  const gameOver = useGameStore(store, state => state?.game_over || false)
+  const selectedTowerForUpgrade = (selectedTowerId && towers?.[selectedTowerId]) || null
+
+  // WebSocket connection, re-established with the resume token when it drops
   useEffect(() => {
-    console.log('🔌 Connecting to WebSocket with playerId:', playerId)
-    const websocket = new WebSocket(`ws://localhost:8000/ws/${playerId}`)
-    
-    websocket.onopen = () => {
+    let websocket = null
+    let closed = false
+    let reconnectTimer = null
+    let reconnectDelay = RECONNECT_DELAY
+    let token = loadSession().token
+
+    const connect = () => {
+      console.log('🔌 Connecting to WebSocket with playerId:', playerId)
+      const path = SPECTATING ? `ws/spectate/${playerId}` : `ws/${playerId}`
+      const lastTick = store.getState()?.tick
+      const resume = token && !SPECTATING
+        ? `&token=${encodeURIComponent(token)}${lastTick !== undefined ? `&last_tick=${lastTick}` : ''}`
+        : ''
+      websocket = new WebSocket(`ws://localhost:8000/${path}?room=${encodeURIComponent(ROOM)}${ROOM_OPTIONS}${resume}`)
+      websocket.onopen = onOpen
+      websocket.onmessage = onMessage
+      websocket.onclose = onClose
+      websocket.onerror = onError
+      setWs(websocket)
+    }
+
+    const onOpen = () => {
       console.log('✅ Connected to server')
+      reconnectDelay = RECONNECT_DELAY
       setConnected(true)
       showMessage('Connected to server', 'success')
     }
 
-    websocket.onmessage = (event) => {
+    const rememberToken = (resumeToken) => {
+      token = resumeToken
+      sessionStorage.setItem(SESSION_KEY, JSON.stringify({ playerId, token }))
+    }
+
+    // Set while waiting for a keyframe after a delta that did not apply
+    let resyncing = false
+
+    const onMessage = (event) => {
       const data = JSON.parse(event.data)
       console.log('📨 Received:', data.type)
+      if (data.resume_token) rememberToken(data.resume_token)
       
-      if (data.type === 'init' || data.type === 'state_update' || data.type === 'game_update') {
-        setGameState(data.state)
+      if (data.type === 'resumed') {
+        // The missed frames follow; the state we hold stays valid
+        resyncing = false
+        showMessage('Reconnected', 'success')
+      } else if (data.type === 'game_delta') {
+        if (!store.applyDelta(data) && !resyncing) {
+          resyncing = true
+          websocket.send(JSON.stringify({ action: 'get_state' }))
+        }
+      } else if (data.state) {
+        // Full state: init, keyframe, reply to get_state or a broadcast after an action
+        resyncing = false
+        store.replace(data.state)
         
         // Handle events
         if (data.events) {
@@ -55,21 +126,34 @@ function App() {
       }
     }
 
-    websocket.onclose = () => {
+    const onClose = (event) => {
       console.log('❌ Disconnected from server')
       setConnected(false)
-      showMessage('Disconnected from server', 'error')
+      if (closed) return
+      if (event.code === 1008) {
+        // Our player id belongs to someone else's session; start over as a new player
+        sessionStorage.removeItem(SESSION_KEY)
+        window.location.reload()
+        return
+      }
+      showMessage('Disconnected from server, reconnecting...', 'error')
+      reconnectTimer = setTimeout(connect, reconnectDelay)
+      reconnectDelay = Math.min(reconnectDelay * 2, MAX_RECONNECT_DELAY)
     }
 
-    websocket.onerror = (error) => {
+    const onError = (error) => {
       console.error('WebSocket error:', error)
       showMessage('Connection error', 'error')
     }
 
-    setWs(websocket)
+    connect()
 
-    return () => websocket.close()
-  }, [playerId])
+    return () => {
+      closed = true
+      clearTimeout(reconnectTimer)
+      websocket.close()
+    }
+  }, [playerId, store])
 
   const handleGameEvents = (events) => {
     if (events.wave_complete) {
@@ -89,18 +173,19 @@ function App() {
   }
 
   const sendAction = useCallback((action, data = {}) => {
+    if (SPECTATING) return
     if (ws && ws.readyState === WebSocket.OPEN) {
       ws.send(JSON.stringify({ action, ...data }))
     }
   }, [ws])
 
   const handleCellClick = useCallback((x, y) => {
-    if (!gameState) return
+    if (!towers) return
 
     // Check if clicking on existing tower for upgrade
-    const tower = Object.values(gameState.towers).find(t => t.x === x && t.y === y)
+    const tower = Object.values(towers).find(t => t.x === x && t.y === y)
     if (tower) {
-      setSelectedTowerForUpgrade(tower)
+      setSelectedTowerId(tower.id)
       return
     }
 
@@ -112,28 +197,27 @@ function App() {
         tower_type: selectedTower
       })
     }
-  }, [gameState, selectedTower, sendAction])
+  }, [towers, selectedTower, sendAction])
 
   const handleUpgradeTower = useCallback((towerId, upgradePath) => {
     sendAction('upgrade_tower', {
       tower_id: towerId,
       upgrade_path: upgradePath
     })
-    setSelectedTowerForUpgrade(null)
+    setSelectedTowerId(null)
   }, [sendAction])
 
   const handleStartWave = useCallback(() => {
     sendAction('start_wave')
   }, [sendAction])
 
-  const currentPlayer = gameState?.players?.[playerId]
-
   return (
     <div className="app">
       <div className="app-header">
         <h1>🏰 Tower Defense</h1>
         {!connected && <div className="connection-status">Connecting...</div>}
         {connected && <div className="connection-status connected">●  Connected</div>}
+        {SPECTATING && <div className="connection-status">👁 Spectating</div>}
       </div>
 
       {message && (
@@ -145,14 +229,15 @@ function App() {
       <div className="game-container">
         <div className="game-main">
           <WaveInfo
-            currentWave={gameState?.current_wave || 0}
-            waveInProgress={gameState?.wave_in_progress || false}
-            enemyCount={Object.keys(gameState?.enemies || {}).length}
+            currentWave={currentWave}
+            waveInProgress={waveInProgress}
+            timeToNextWave={timeToNextWave}
+            enemiesCount={enemiesCount}
             onStartWave={handleStartWave}
           />
 
           <GameCanvas
-            gameState={gameState}
+            store={store}
             onCellClick={handleCellClick}
             selectedTower={selectedTower}
           />
@@ -199,7 +284,7 @@ function App() {
               </div>
               <button
                 className="close-button"
-                onClick={() => setSelectedTowerForUpgrade(null)}
+                onClick={() => setSelectedTowerId(null)}
               >
                 Close
               </button>
@@ -208,11 +293,11 @@ function App() {
         </div>
       </div>
 
-      {gameState?.game_over && (
+      {gameOver && (
         <div className="game-over-overlay">
           <div className="game-over-panel">
             <h2>Game Over!</h2>
-            <p>Wave: {gameState.current_wave}</p>
+            <p>Wave: {currentWave}</p>
             <p>Score: {currentPlayer?.points || 0}</p>
             <button onClick={() => window.location.reload()}>Play Again</button>
           </div>
@@ -1,5 +1,7 @@
-import { useEffect, useRef, useState } from 'react'
+import { useEffect, useMemo, useRef, useState } from 'react'
 import PropTypes from 'prop-types'
+import { buildRoadGeometry, interpolateEnemies } from '../utils/interpolation'
+import { useGameStore } from '../store/gameStore'
 
 const COLORS = {
   plains: '#90EE90',
@@ -7,6 +9,7 @@ const COLORS = {
   lake: '#4169E1',
   road: '#696969',
   roadBorder: '#555555',
+  route: '#FFFFFF90',
   grid: '#00000020',
   towerBasic: '#FF6B6B',
   towerSniper: '#4ECDC4',
@@ -21,11 +24,55 @@ const COLORS = {
   selected: '#FFFF0080'
 }
 
-function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpgrade }) {
+// Offscreen canvas holding a pre-rendered layer, repainted only when one of its deps changes
+function renderLayer(layer, deps, width, height, paint) {
+  if (layer.canvas && layer.deps && deps.every((dep, i) => dep === layer.deps[i])) return layer.canvas
+
+  if (!layer.canvas) layer.canvas = document.createElement('canvas')
+  layer.canvas.width = width
+  layer.canvas.height = height
+  const ctx = layer.canvas.getContext('2d')
+  ctx.clearRect(0, 0, width, height)
+  paint(ctx)
+  layer.deps = deps
+  return layer.canvas
+}
+
+function GameCanvas({ store, onCellClick, selectedTower, selectedTowerForUpgrade }) {
   const canvasRef = useRef(null)
   const [hoveredCell, setHoveredCell] = useState(null)
   const [canvasSize, setCanvasSize] = useState({ width: 600, height: 600 })
   const animationFrameRef = useRef(null)
+  const snapshotsRef = useRef({ prev: null, latest: null })
+  const layersRef = useRef({ terrain: {}, towers: {} })
+
+  // Only the map and towers re-render the component; both keep their identity
+  // in the store until they change
+  const gameMap = useGameStore(store, state => state?.game_map)
+  const towers = useGameStore(store, state => state?.towers)
+
+  // Keep the last two snapshots; the render loop interpolates between them
+  useEffect(() => {
+    const onChange = () => {
+      const state = store.getState()
+      if (!state) return
+
+      const snapshots = snapshotsRef.current
+      const simTime = state.sim_time ?? performance.now() / 1000
+      if (snapshots.latest && snapshots.latest.simTime === simTime) {
+        snapshots.latest = { ...snapshots.latest, state }
+        return
+      }
+      snapshots.prev = snapshots.latest
+      snapshots.latest = { state, simTime, receivedAt: performance.now() / 1000 }
+    }
+
+    onChange()
+    return store.subscribe(onChange)
+  }, [store])
+
+  // One geometry per route enemies can take
+  const routeGeometries = useMemo(() => (gameMap ? gameMap.routes.map(buildRoadGeometry) : []), [gameMap])
 
   // Calculate canvas size based on window
   useEffect(() => {
@@ -41,25 +88,31 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
     return () => window.removeEventListener('resize', updateSize)
   }, [])
 
-  // Main render function
+  // Main render function; runs every animation frame and reads the newest state from refs
   useEffect(() => {
-    if (!gameState || !gameState.game_map || !canvasRef.current) return
+    if (!gameMap || !canvasRef.current) return
 
     const canvas = canvasRef.current
     const ctx = canvas.getContext('2d')
-    const map = gameState.game_map
-    const gridSize = map.grid_size
-    const cellSize = canvasSize.width / gridSize
 
     const render = () => {
+      const state = store.getState()
+      const gridSize = gameMap.grid_size
+      const cellSize = canvasSize.width / gridSize
+      const { prev, latest } = snapshotsRef.current
+      const layers = layersRef.current
+
       // Clear canvas
       ctx.clearRect(0, 0, canvas.width, canvas.height)
 
-      // Draw terrain
-      drawTerrain(ctx, map, cellSize, gridSize)
-
-      // Draw grid
-      drawGrid(ctx, cellSize, gridSize)
+      // Draw terrain and grid from the cached layer
+      ctx.drawImage(renderLayer(layers.terrain, [canvas.width, canvas.height, gameMap], canvas.width, canvas.height, layerCtx => {
+        drawTerrain(layerCtx, gameMap, cellSize, gridSize)
+        drawGrid(layerCtx, cellSize, gridSize)
+        if (gameMap.maze) {
+          drawRoutes(layerCtx, gameMap.routes, cellSize)
+        }
+      }), 0, 0)
 
       // Draw range indicator for hovered cell or selected tower
       if (hoveredCell) {
@@ -70,15 +123,18 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
                           cellSize, null, selectedTowerForUpgrade.range)
       }
 
-      // Draw towers
-      drawTowers(ctx, gameState.towers, cellSize, selectedTowerForUpgrade)
+      // Draw towers from the cached layer
+      const towerDeps = [canvas.width, canvas.height, towers, selectedTowerForUpgrade?.id]
+      ctx.drawImage(renderLayer(layers.towers, towerDeps, canvas.width, canvas.height, layerCtx => {
+        drawTowers(layerCtx, towers, cellSize, selectedTowerForUpgrade)
+      }), 0, 0)
 
-      // Draw enemies
-      drawEnemies(ctx, gameState.enemies, cellSize)
+      // Draw enemies, interpolated along the road between snapshots
+      drawEnemies(ctx, interpolateEnemies(prev, latest, performance.now() / 1000, routeGeometries), cellSize)
 
       // Draw attacks
-      if (gameState.recent_attacks) {
-        drawAttacks(ctx, gameState.recent_attacks, cellSize)
+      if (state.recent_attacks) {
+        drawAttacks(ctx, state.recent_attacks, towers, cellSize)
       }
 
       // Draw hover highlight
@@ -96,7 +152,7 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
         cancelAnimationFrame(animationFrameRef.current)
       }
     }
-  }, [gameState, hoveredCell, selectedTower, selectedTowerForUpgrade, canvasSize])
+  }, [store, gameMap, towers, routeGeometries, hoveredCell, selectedTower, selectedTowerForUpgrade, canvasSize])
 
   const drawTerrain = (ctx, map, cellSize, gridSize) => {
     for (let y = 0; y < gridSize; y++) {
@@ -143,6 +199,24 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
     }
   }
 
+  // In maze mode enemies leave the road, so show where they will walk
+  const drawRoutes = (ctx, routes, cellSize) => {
+    ctx.strokeStyle = COLORS.route
+    ctx.lineWidth = 2
+    ctx.setLineDash([cellSize * 0.2, cellSize * 0.2])
+    routes.forEach(route => {
+      ctx.beginPath()
+      route.forEach((cell, i) => {
+        const x = (cell.x + 0.5) * cellSize
+        const y = (cell.y + 0.5) * cellSize
+        if (i === 0) ctx.moveTo(x, y)
+        else ctx.lineTo(x, y)
+      })
+      ctx.stroke()
+    })
+    ctx.setLineDash([])
+  }
+
   const drawRangeIndicator = (ctx, x, y, cellSize, towerType, range = null) => {
     if (range === null) {
       // Estimate range based on tower type
@@ -205,7 +279,7 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
   const drawEnemies = (ctx, enemies, cellSize) => {
     if (!enemies) return
 
-    Object.values(enemies).forEach(enemy => {
+    enemies.forEach(enemy => {
       if (!enemy.is_alive) return
 
       const centerX = (enemy.x + 0.5) * cellSize
@@ -242,9 +316,18 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
     })
   }
 
-  const drawAttacks = (ctx, attacks, cellSize) => {
+  const drawAttacks = (ctx, attacks, towers, cellSize) => {
     attacks.forEach(attack => {
-      if (attack.type === 'aoe' && attack.targets) {
+      if (attack.type === 'aoe' && attack.center) {
+        // Draw one splash around the impact point
+        const x = (attack.center.x + 0.5) * cellSize
+        const y = (attack.center.y + 0.5) * cellSize
+
+        ctx.fillStyle = '#FFA50060'
+        ctx.beginPath()
+        ctx.arc(x, y, (attack.radius || 1.5) * cellSize, 0, Math.PI * 2)
+        ctx.fill()
+      } else if (attack.type === 'aoe' && attack.targets) {
         // Draw AoE explosion
         attack.targets.forEach(target => {
           const x = (target.x + 0.5) * cellSize
@@ -257,7 +340,7 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
         })
       } else if (attack.target) {
         // Draw projectile line
-        const tower = Object.values(gameState.towers || {}).find(t => t.id === attack.tower_id)
+        const tower = (towers || {})[attack.tower_id]
         if (tower) {
           ctx.strokeStyle = '#FFFF0080'
           ctx.lineWidth = 2
@@ -271,33 +354,35 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
   }
 
   const handleCanvasClick = (e) => {
+    if (!gameMap) return
     const canvas = canvasRef.current
     const rect = canvas.getBoundingClientRect()
     const x = e.clientX - rect.left
     const y = e.clientY - rect.top
     
-    const cellSize = canvasSize.width / gameState.game_map.grid_size
+    const cellSize = canvasSize.width / gameMap.grid_size
     const cellX = Math.floor(x / cellSize)
     const cellY = Math.floor(y / cellSize)
 
-    if (cellX >= 0 && cellX < gameState.game_map.grid_size && 
-        cellY >= 0 && cellY < gameState.game_map.grid_size) {
+    if (cellX >= 0 && cellX < gameMap.grid_size && 
+        cellY >= 0 && cellY < gameMap.grid_size) {
       onCellClick(cellX, cellY)
     }
   }
 
   const handleCanvasMouseMove = (e) => {
+    if (!gameMap) return
     const canvas = canvasRef.current
     const rect = canvas.getBoundingClientRect()
     const x = e.clientX - rect.left
     const y = e.clientY - rect.top
     
-    const cellSize = canvasSize.width / gameState.game_map.grid_size
+    const cellSize = canvasSize.width / gameMap.grid_size
     const cellX = Math.floor(x / cellSize)
     const cellY = Math.floor(y / cellSize)
 
-    if (cellX >= 0 && cellX < gameState.game_map.grid_size && 
-        cellY >= 0 && cellY < gameState.game_map.grid_size) {
+    if (cellX >= 0 && cellX < gameMap.grid_size && 
+        cellY >= 0 && cellY < gameMap.grid_size) {
       setHoveredCell({ x: cellX, y: cellY })
     } else {
       setHoveredCell(null)
@@ -327,7 +412,7 @@ function GameCanvas({ gameState, onCellClick, selectedTower, selectedTowerForUpg
 }
 
 GameCanvas.propTypes = {
-  gameState: PropTypes.object.isRequired,
+  store: PropTypes.object.isRequired,
   onCellClick: PropTypes.func.isRequired,
   selectedTower: PropTypes.string,
   selectedTowerForUpgrade: PropTypes.object
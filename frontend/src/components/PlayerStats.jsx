@@ -1,3 +1,4 @@
+import { memo } from 'react'
 import PropTypes from 'prop-types'
 import './PlayerStats.css'
 
@@ -65,4 +66,4 @@ PlayerStats.propTypes = {
   })
 }
 
-export default PlayerStats
+export default memo(PlayerStats)
@@ -1,3 +1,4 @@
+import { memo } from 'react'
 import PropTypes from 'prop-types'
 import './TowerMenu.css'
 
@@ -83,4 +84,4 @@ TowerMenu.propTypes = {
   playerMoney: PropTypes.number.isRequired
 }
 
-export default TowerMenu
+export default memo(TowerMenu)
@@ -1,3 +1,4 @@
+import { memo } from 'react'
 import PropTypes from 'prop-types'
 import './WaveInfo.css'
 
@@ -40,4 +41,4 @@ WaveInfo.propTypes = {
   enemiesCount: PropTypes.number.isRequired
 }
 
-export default WaveInfo
+export default memo(WaveInfo)
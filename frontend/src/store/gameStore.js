@@ -0,0 +1,86 @@
+import { useSyncExternalStore } from 'react'
+
+// Client copy of the game state, updated from full snapshots and server deltas.
+// Every update keeps the references of whatever did not change, so a component
+// selecting one slice (a player, the tower map, the wave number) only re-renders
+// when that slice actually changed.
+
+// Reuse `prev` wherever `next` holds equal data
+function share(prev, next) {
+  if (prev === next) return prev
+  if (typeof prev !== 'object' || typeof next !== 'object' || prev === null || next === null) return next
+
+  if (Array.isArray(next)) {
+    if (!Array.isArray(prev)) return next
+    let same = prev.length === next.length
+    const out = next.map((value, i) => {
+      const shared = share(prev[i], value)
+      if (shared !== prev[i]) same = false
+      return shared
+    })
+    return same ? prev : out
+  }
+
+  if (Array.isArray(prev)) return next
+  let same = Object.keys(prev).length === Object.keys(next).length
+  const out = {}
+  for (const key in next) {
+    out[key] = share(prev[key], next[key])
+    if (out[key] !== prev[key]) same = false
+  }
+  return same ? prev : out
+}
+
+// Entity map after a delta; untouched entities keep their identity
+function applyEntityDelta(entities, delta) {
+  const next = { ...entities }
+  const upsert = delta.upsert || {}
+  for (const id in upsert) {
+    next[id] = next[id] ? { ...next[id], ...upsert[id] } : upsert[id]
+  }
+  for (const id of delta.remove || []) {
+    delete next[id]
+  }
+  return next
+}
+
+export function createGameStore() {
+  let state = null
+  const listeners = new Set()
+
+  const emit = () => listeners.forEach(listener => listener())
+
+  return {
+    getState: () => state,
+
+    subscribe(listener) {
+      listeners.add(listener)
+      return () => listeners.delete(listener)
+    },
+
+    // Full snapshot (init, keyframe or state_update)
+    replace(nextState) {
+      state = share(state, nextState)
+      emit()
+    },
+
+    // game_delta message; returns false when it does not follow the state we hold
+    applyDelta(delta) {
+      if (!state || state.tick !== delta.base_tick) return false
+
+      const next = { ...state, ...delta.changes }
+      for (const key in delta.entities || {}) {
+        next[key] = applyEntityDelta(state[key] || {}, delta.entities[key])
+      }
+      state = next
+      emit()
+      return true
+    }
+  }
+}
+
+// Subscribe a component to one slice of the store; the selector must return
+// either a primitive or a reference taken from the state
+export function useGameStore(store, selector) {
+  return useSyncExternalStore(store.subscribe, () => selector(store.getState()))
+}
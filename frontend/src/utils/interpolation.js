@@ -0,0 +1,85 @@
+// Smooth enemy movement between server snapshots.
+// Positions are rendered slightly in the past so there is usually a snapshot on
+// each side to interpolate between; when the next one is late we predict ahead
+// along the road for a short while instead of freezing.
+
+export const INTERPOLATION_DELAY = 0.2 // seconds, one broadcast interval at 5 Hz
+export const MAX_EXTRAPOLATION = 0.5 // seconds we predict past the latest snapshot
+
+// Route waypoints (cell centers, same coordinates as enemy.x/y) with cumulative length
+export function buildRoadGeometry(roadPath) {
+  if (!roadPath || roadPath.length === 0) return null
+
+  const points = roadPath.map(cell => ({ x: cell.x + 0.5, y: cell.y + 0.5 }))
+  const lengths = [0]
+  for (let i = 1; i < points.length; i++) {
+    const dx = points[i].x - points[i - 1].x
+    const dy = points[i].y - points[i - 1].y
+    lengths.push(lengths[i - 1] + Math.hypot(dx, dy))
+  }
+  return { points, lengths, total: lengths[lengths.length - 1] }
+}
+
+// Position on the road after travelling `progress` cells from the start
+export function pointAtProgress(geometry, progress) {
+  const { points, lengths, total } = geometry
+  if (progress <= 0) return points[0]
+  if (progress >= total) return points[points.length - 1]
+
+  // Binary search for the segment containing progress
+  let lo = 0
+  let hi = lengths.length - 1
+  while (hi - lo > 1) {
+    const mid = (lo + hi) >> 1
+    if (lengths[mid] <= progress) lo = mid
+    else hi = mid
+  }
+
+  const segment = lengths[hi] - lengths[lo]
+  const t = segment > 0 ? (progress - lengths[lo]) / segment : 0
+  return {
+    x: points[lo].x + (points[hi].x - points[lo].x) * t,
+    y: points[lo].y + (points[hi].y - points[lo].y) * t
+  }
+}
+
+const clamp = (value, min, max) => Math.min(max, Math.max(min, value))
+
+// Enemies of the latest snapshot moved to where they should be at `now` (seconds).
+// `geometries` holds one road geometry per map route, indexed by enemy.route
+export function interpolateEnemies(prev, latest, now, geometries) {
+  if (!latest) return []
+
+  const enemies = latest.state.enemies || {}
+  const renderTime = latest.simTime + (now - latest.receivedAt) - INTERPOLATION_DELAY
+  const span = prev ? latest.simTime - prev.simTime : 0
+  const result = []
+
+  for (const id in enemies) {
+    const enemy = enemies[id]
+    if (!enemy.is_alive) continue
+
+    const before = prev && prev.state.enemies ? prev.state.enemies[id] : null
+    let progress
+    let ahead = 0
+
+    if (before && span > 0 && renderTime < latest.simTime) {
+      const t = clamp((renderTime - prev.simTime) / span, 0, 1)
+      progress = before.distance_traveled + (enemy.distance_traveled - before.distance_traveled) * t
+    } else {
+      ahead = clamp(renderTime - latest.simTime, -INTERPOLATION_DELAY, MAX_EXTRAPOLATION)
+      progress = Math.max(0, enemy.distance_traveled + enemy.speed * ahead)
+    }
+
+    const geometry = geometries[enemy.route || 0]
+    if (geometry) {
+      const point = pointAtProgress(geometry, progress)
+      result.push({ ...enemy, x: point.x, y: point.y })
+    } else {
+      // No road available: fall back to the velocity the server sent
+      result.push({ ...enemy, x: enemy.x + (enemy.vx || 0) * ahead, y: enemy.y + (enemy.vy || 0) * ahead })
+    }
+  }
+
+  return result
+}